@@ -0,0 +1,55 @@
+"""Acompanhamento dos alertas de estoque gravados pelas movimentações.
+
+Cada saída (ou lote, estorno, ajuste de inventário) que leva um produto
+abaixo do ponto de pedido, abaixo do estoque mínimo ou a zero grava um
+alerta no banco. Este comando lista os alertas com id maior que --desde
+e, com --seguir, continua imprimindo os novos conforme são gravados.
+
+Uso:
+    python alertas.py --banco deposito.db [--desde 0] [--seguir] [--intervalo 2]
+"""
+import argparse
+import os
+import time
+
+from gerenciador import GerenciadorLeitura
+
+
+def imprimir_alerta(alerta):
+    print(f"#{alerta.id:<8} {alerta.data}  {alerta.tipo:<14} {alerta.quantidade:>8} / {alerta.ponto_pedido:<8} "
+          f"{alerta.produto_id:>8}  {alerta.nome}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lista e acompanha os alertas de estoque")
+    parser.add_argument("--banco", default="deposito.db")
+    parser.add_argument("--desde", type=int, default=0, help="Só alertas com id maior que este")
+    parser.add_argument("--seguir", action="store_true", help="Continua mostrando os novos alertas")
+    parser.add_argument("--intervalo", type=float, default=2.0, help="Segundos entre as consultas com --seguir")
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.banco):
+        parser.error(f"{args.banco} não existe")
+    
+    deposito = GerenciadorLeitura(args.banco)
+    ultimo = args.desde
+    
+    print(f"{'ALERTA':<9} {'DATA':<19}  {'TIPO':<14} {'QTD':>8} / {'PONTO':<8} {'ID':>8}  PRODUTO")
+    try:
+        while True:
+            # Cada consulta só lê os alertas novos (busca pela chave primária)
+            alertas = deposito.alertas_desde(ultimo)
+            for alerta in alertas:
+                imprimir_alerta(alerta)
+            if alertas:
+                ultimo = alertas[-1].id
+                continue
+            if not args.seguir:
+                break
+            time.sleep(args.intervalo)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Gerador de carga multiprocesso para o banco SQLite compartilhado.
+
+Simula várias estações usando o mesmo arquivo: cada processo executa uma
+mistura de registrar_entrada, registrar_saida, buscar_produto_por_nome e
+consultas de relatório. Ao final mede vazão, latências, erros de
+"database is locked" e divergências entre produtos.quantidade e o saldo
+das movimentações (atualizações perdidas).
+
+Uso:
+    python carga_concorrente.py --processos 5 --duracao 30 --banco carga.db --preparar
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import time
+from typing import Dict, List
+
+from gerenciador import GerenciadorDeposito
+
+
+MIX_PADRAO = "entrada=30,saida=30,busca=25,relatorio=15"
+
+
+class GerenciadorCarga(GerenciadorDeposito):
+    """GerenciadorDeposito com tempo de espera por lock configurável"""
+    
+    def __init__(self, db_name: str, timeout: float):
+        self.timeout = timeout
+        super().__init__(db_name)
+    
+    def conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_name, timeout=self.timeout)
+
+
+def preparar_banco(db_name: str, produtos: int, wal: bool):
+    for sufixo in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(db_name + sufixo):
+            os.remove(db_name + sufixo)
+    
+    deposito = GerenciadorCarga(db_name, 5.0)
+    if wal:
+        deposito.definir_modo_journal("WAL")
+    
+    for i in range(produtos):
+        deposito.adicionar_produto(f"PRODUTO CARGA {i:06d}", 1000, categoria=f"CAT{i % 20:02d}",
+                                   codigo_barras=f"789{i:010d}")
+
+
+def _parse_mix(texto: str) -> Dict[str, int]:
+    mix = {}
+    for parte in texto.split(","):
+        operacao, _, peso = parte.partition("=")
+        mix[operacao.strip()] = int(peso)
+    
+    desconhecidas = set(mix) - {"entrada", "saida", "busca", "relatorio"}
+    if desconhecidas:
+        raise ValueError(f"Operações desconhecidas no mix: {', '.join(sorted(desconhecidas))}")
+    return mix
+
+
+def _trabalhador(indice: int, db_name: str, duracao: float, mix: Dict[str, int], timeout: float,
+                 barreira, resultados):
+    deposito = GerenciadorCarga(db_name, timeout)
+    aleatorio = random.Random(indice)
+    
+    conn = deposito.conectar()
+    ids = [linha[0] for linha in conn.execute("SELECT id FROM produtos")]
+    conn.close()
+    
+    operacoes = list(mix)
+    pesos = [mix[operacao] for operacao in operacoes]
+    latencias = {operacao: [] for operacao in operacoes}
+    recusadas = {operacao: 0 for operacao in operacoes}
+    bloqueios = 0
+    outros_erros = 0
+    
+    barreira.wait()
+    fim = time.perf_counter() + duracao
+    
+    while time.perf_counter() < fim:
+        operacao = aleatorio.choices(operacoes, pesos)[0]
+        produto_id = aleatorio.choice(ids)
+        inicio = time.perf_counter()
+        
+        try:
+            if operacao == "entrada":
+                sucesso = deposito.registrar_entrada(produto_id, aleatorio.randint(1, 5), "CARGA")
+            elif operacao == "saida":
+                sucesso = deposito.registrar_saida(produto_id, aleatorio.randint(1, 5), "CARGA")
+            elif operacao == "busca":
+                sucesso = deposito.buscar_produto_por_nome(f"{aleatorio.randint(0, 999):03d}", 50) is not None
+            else:
+                deposito.relatorio_estoque()
+                sucesso = deposito.produtos_estoque_baixo() is not None
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e) or "busy" in str(e):
+                bloqueios += 1
+            else:
+                outros_erros += 1
+            continue
+        except sqlite3.Error:
+            outros_erros += 1
+            continue
+        
+        latencias[operacao].append(time.perf_counter() - inicio)
+        if not sucesso:
+            recusadas[operacao] += 1
+    
+    resultados.put({
+        'processo': indice,
+        'latencias': latencias,
+        'recusadas': recusadas,
+        'bloqueios': bloqueios,
+        'outros_erros': outros_erros,
+    })
+
+
+def verificar_consistencia(db_name: str) -> List[tuple]:
+    """Produtos cujo estoque difere do saldo das movimentações (mais o saldo arquivado)"""
+    deposito = GerenciadorCarga(db_name, 30.0)
+    return [(produto_id, estoque, saldo)
+            for produto_id, _, estoque, saldo in deposito.verificar_consistencia()['divergencias']]
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+
+def montar_relatorio(parciais: List[dict], duracao: float, processos: int, divergencias: List[tuple]) -> dict:
+    relatorio = {
+        'processos': processos,
+        'duracao_s': round(duracao, 2),
+        'operacoes': {},
+        'bloqueios': sum(p['bloqueios'] for p in parciais),
+        'outros_erros': sum(p['outros_erros'] for p in parciais),
+        'divergencias': len(divergencias),
+        'exemplos_divergencias': [
+            {'produto_id': d[0], 'estoque': d[1], 'saldo_movimentacoes': d[2]} for d in divergencias[:10]
+        ],
+    }
+    
+    total = 0
+    for operacao in parciais[0]['latencias'] if parciais else []:
+        valores = sorted(v for p in parciais for v in p['latencias'][operacao])
+        total += len(valores)
+        relatorio['operacoes'][operacao] = {
+            'quantidade': len(valores),
+            'por_segundo': round(len(valores) / duracao, 1),
+            'recusadas': sum(p['recusadas'][operacao] for p in parciais),
+            'p50_ms': round(_percentil(valores, 0.50), 2),
+            'p95_ms': round(_percentil(valores, 0.95), 2),
+            'p99_ms': round(_percentil(valores, 0.99), 2),
+            'max_ms': round(valores[-1] * 1000 if valores else 0.0, 2),
+        }
+    
+    relatorio['total_operacoes'] = total
+    relatorio['operacoes_por_segundo'] = round(total / duracao, 1)
+    return relatorio
+
+
+def imprimir_relatorio(relatorio: dict):
+    print(f"\nProcessos: {relatorio['processos']} | Duração: {relatorio['duracao_s']}s")
+    print(f"Total: {relatorio['total_operacoes']} operações ({relatorio['operacoes_por_segundo']} op/s)\n")
+    
+    print(f"{'OPERACAO':<10} {'QTD':>8} {'OP/S':>9} {'RECUS.':>7} {'P50 ms':>8} {'P95 ms':>8} "
+          f"{'P99 ms':>8} {'MAX ms':>9}")
+    for operacao, dados in relatorio['operacoes'].items():
+        print(f"{operacao:<10} {dados['quantidade']:>8} {dados['por_segundo']:>9} {dados['recusadas']:>7} "
+              f"{dados['p50_ms']:>8} {dados['p95_ms']:>8} {dados['p99_ms']:>8} {dados['max_ms']:>9}")
+    
+    print(f"\nErros 'database is locked': {relatorio['bloqueios']}")
+    print(f"Outros erros: {relatorio['outros_erros']}")
+    print(f"Divergências estoque x movimentações: {relatorio['divergencias']}")
+    for exemplo in relatorio['exemplos_divergencias']:
+        print(f"  produto {exemplo['produto_id']}: estoque {exemplo['estoque']}, "
+              f"movimentações {exemplo['saldo_movimentacoes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de concorrência entre processos no banco do depósito")
+    parser.add_argument("--banco", default="carga_concorrente.db")
+    parser.add_argument("--processos", type=int, default=5)
+    parser.add_argument("--duracao", type=float, default=30, help="Segundos de carga")
+    parser.add_argument("--mix", default=MIX_PADRAO, help=f"Pesos das operações (padrão: {MIX_PADRAO})")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Espera máxima por lock do SQLite (s)")
+    parser.add_argument("--preparar", action="store_true", help="Recria o banco com produtos de teste")
+    parser.add_argument("--produtos", type=int, default=1000, help="Produtos criados com --preparar")
+    parser.add_argument("--wal", action="store_true", help="Usa journal_mode=WAL ao preparar o banco")
+    parser.add_argument("--json", help="Grava o relatório neste arquivo JSON")
+    args = parser.parse_args()
+    
+    mix = _parse_mix(args.mix)
+    
+    if args.preparar:
+        print(f"Preparando {args.banco} com {args.produtos} produtos...")
+        preparar_banco(args.banco, args.produtos, args.wal)
+    elif not os.path.exists(args.banco):
+        parser.error(f"{args.banco} não existe; use --preparar")
+    
+    barreira = multiprocessing.Barrier(args.processos + 1)
+    resultados = multiprocessing.Queue()
+    processos = [
+        multiprocessing.Process(
+            target=_trabalhador,
+            args=(i, args.banco, args.duracao, mix, args.timeout, barreira, resultados)
+        )
+        for i in range(args.processos)
+    ]
+    for processo in processos:
+        processo.start()
+    
+    barreira.wait()
+    print(f"Carga iniciada: {args.processos} processos por {args.duracao}s...")
+    inicio = time.perf_counter()
+    
+    parciais = [resultados.get() for _ in processos]
+    duracao = time.perf_counter() - inicio
+    for processo in processos:
+        processo.join()
+    
+    relatorio = montar_relatorio(parciais, duracao, args.processos, verificar_consistencia(args.banco))
+    imprimir_relatorio(relatorio)
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+        print(f"\nRelatório gravado em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Verificação de consistência entre o estoque e as movimentações.
+
+Confere se produtos.quantidade de cada produto, e o estoque de cada
+localização, é igual ao saldo das movimentações (mais o saldo já arquivado)
+e, com --reparar, corrige os divergentes. Com --incremental só confere os
+produtos movimentados desde a última verificação sem divergências pendentes.
+
+Uso:
+    python consistencia.py --banco deposito.db [--incremental] [--reparar]
+
+Sai com código 1 se restarem divergências sem reparo.
+"""
+import argparse
+import json
+import os
+import sys
+
+from gerenciador import GerenciadorDeposito
+
+
+def imprimir_resultado(resultado: dict):
+    modo = "incremental" if resultado['incremental'] else "completa"
+    print(f"Verificação {modo}: {resultado['verificados']} produto(s) até a movimentação "
+          f"#{resultado['ultima_movimentacao']}")
+    print(f"Divergências: {len(resultado['divergencias'])} no estoque, "
+          f"{len(resultado['divergencias_locais'])} nas localizações | Reparadas: {resultado['reparados']}")
+    
+    if resultado['divergencias']:
+        print(f"\n{'ID':>8} {'ESTOQUE':>10} {'SALDO':>10}  PRODUTO")
+        for produto_id, nome, estoque, saldo in resultado['divergencias']:
+            print(f"{produto_id:>8} {estoque:>10} {saldo:>10}  {nome}")
+    
+    if resultado['divergencias_locais']:
+        print(f"\n{'ID':>8} {'LOCAL':<12} {'ESTOQUE':>10} {'SALDO':>10}  PRODUTO")
+        for produto_id, nome, local, estoque, saldo in resultado['divergencias_locais']:
+            print(f"{produto_id:>8} {local or '-':<12} {estoque:>10} {saldo:>10}  {nome}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confere o estoque dos produtos com o saldo das movimentações")
+    parser.add_argument("--banco", default="deposito.db")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Só confere produtos movimentados desde a última verificação")
+    parser.add_argument("--reparar", action="store_true",
+                        help="Ajusta o estoque e as localizações dos divergentes para o saldo das movimentações")
+    parser.add_argument("--json", help="Grava o resultado neste arquivo JSON")
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.banco):
+        parser.error(f"{args.banco} não existe")
+    
+    deposito = GerenciadorDeposito(args.banco)
+    resultado = deposito.verificar_consistencia(args.incremental, args.reparar)
+    imprimir_resultado(resultado)
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"\nResultado gravado em {args.json}")
+    
+    if resultado['pendentes']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,323 +1,364 @@
 import sqlite3
+import csv
 from datetime import datetime, date, timedelta
-from typing import List, Optional, Tuple
 import sys
-import shutil
+import os
+import importlib.util
 
 try:
     from PyQt5.QtWidgets import (
         QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
         QTabWidget, QLabel, QLineEdit, QPushButton, QTableWidget,
         QTableWidgetItem, QMessageBox, QDialog, QTextEdit, QGroupBox,
-        QFormLayout, QHeaderView, QFileDialog, QDateEdit, QGridLayout
+        QFormLayout, QHeaderView, QFileDialog, QDateEdit, QGridLayout, QSpinBox,
+        QProgressBar, QCheckBox
     )
-    from PyQt5.QtCore import Qt, QDate
+    from PyQt5.QtCore import Qt, QDate, QThread, QTimer, pyqtSignal
     from PyQt5.QtGui import QFont
 except ImportError:
     print("ERRO: PyQt5 não está instalado!")
     print("Instale com: pip install PyQt5")
     sys.exit(1)
 
+from gerenciador import GerenciadorDeposito, AgregadorMovimentacoes
+from exportacao import GerenciadorExportacoes, montar_relatorio
 
-class GerenciadorDeposito:
-    def __init__(self, db_name: str = "deposito.db"):
-        self.db_name = db_name
-        self.criar_tabelas()
-    
-    def conectar(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_name)
-    
-    def criar_tabelas(self):
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS produtos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                descricao TEXT,
-                categoria TEXT,
-                quantidade INTEGER NOT NULL DEFAULT 0,
-                localizacao TEXT,
-                codigo_barras TEXT,
-                data_cadastro TEXT NOT NULL
-            )
-        """)
-        
-        # Migração: adicionar coluna codigo_barras se não existir
-        cursor.execute("PRAGMA table_info(produtos)")
-        colunas = [coluna[1] for coluna in cursor.fetchall()]
-        if 'codigo_barras' not in colunas:
-            cursor.execute("ALTER TABLE produtos ADD COLUMN codigo_barras TEXT")
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS movimentacoes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                produto_id INTEGER NOT NULL,
-                tipo TEXT NOT NULL,
-                quantidade INTEGER NOT NULL,
-                data_movimentacao TEXT NOT NULL,
-                observacao TEXT,
-                FOREIGN KEY (produto_id) REFERENCES produtos(id)
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
+
+# Cores usadas pelos relatórios de exportacao.montar_relatorio
+CORES_RELATORIO = {'vermelho': Qt.red, 'verde': Qt.darkGreen, 'azul': Qt.blue}
+
+
+class WorkerRestauracao(QThread):
+    """Valida e prepara o backup fora da thread da interface"""
+    concluido = pyqtSignal(bool, str)
     
-    def adicionar_produto(self, nome: str, quantidade: int = 0, 
-                         descricao: str = "", categoria: str = "", 
-                         localizacao: str = "", codigo_barras: str = "") -> int:
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        data_atual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        cursor.execute("""
-            INSERT INTO produtos (nome, descricao, categoria, quantidade, localizacao, codigo_barras, data_cadastro)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (nome.upper(), descricao.upper(), categoria.upper(), quantidade, localizacao.upper(), codigo_barras, data_atual))
-        
-        produto_id = cursor.lastrowid
-        
-        if quantidade > 0:
-            cursor.execute("""
-                INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao)
-                VALUES (?, 'ENTRADA', ?, ?, 'Estoque inicial')
-            """, (produto_id, quantidade, data_atual))
-        
-        conn.commit()
-        conn.close()
-        
-        return produto_id
+    def __init__(self, deposito, arquivo):
+        super().__init__()
+        self.deposito = deposito
+        self.arquivo = arquivo
     
-    def listar_produtos(self, categoria: Optional[str] = None) -> List[Tuple]:
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        if categoria:
-            cursor.execute("""
-                SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras
-                FROM produtos WHERE categoria = ?
-                ORDER BY nome
-            """, (categoria,))
-        else:
-            cursor.execute("""
-                SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras
-                FROM produtos ORDER BY nome
-            """)
+    def run(self):
+        valido, mensagem = self.deposito.validar_backup(self.arquivo)
+        if not valido:
+            self.concluido.emit(False, mensagem)
+            return
         
-        produtos = cursor.fetchall()
-        conn.close()
+        try:
+            preparado = self.deposito.preparar_restauracao(self.arquivo)
+        except (sqlite3.Error, OSError) as e:
+            self.concluido.emit(False, f"Erro ao preparar restauração: {e}")
+            return
         
-        return produtos
+        self.concluido.emit(True, preparado)
+
+
+class WorkerArquivamento(QThread):
+    """Arquiva movimentações antigas fora da thread da interface"""
+    concluido = pyqtSignal(bool, str)
     
-    def buscar_produto(self, produto_id: int) -> Optional[Tuple]:
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras, data_cadastro
-            FROM produtos WHERE id = ?
-        """, (produto_id,))
-        
-        produto = cursor.fetchone()
-        conn.close()
-        
-        return produto
+    def __init__(self, deposito, meses):
+        super().__init__()
+        self.deposito = deposito
+        self.meses = meses
     
-    def buscar_produto_por_nome(self, termo: str) -> List[Tuple]:
-        """Busca produtos por nome ou código de barras"""
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras
-            FROM produtos 
-            WHERE nome LIKE ? OR codigo_barras LIKE ?
-            ORDER BY nome
-        """, (f"%{termo}%", f"%{termo}%"))
-        
-        produtos = cursor.fetchall()
-        conn.close()
+    def run(self):
+        try:
+            arquivadas = self.deposito.arquivar_movimentacoes(self.meses)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            self.concluido.emit(False, str(e))
+            return
         
-        return produtos
+        self.concluido.emit(True, f"{arquivadas} movimentação(ões) arquivada(s).")
+
+
+class WorkerConsistencia(QThread):
+    """Verifica (e opcionalmente repara) o estoque fora da thread da interface"""
+    concluido = pyqtSignal(bool, object)
+    
+    def __init__(self, deposito, incremental, reparar):
+        super().__init__()
+        self.deposito = deposito
+        self.incremental = incremental
+        self.reparar = reparar
     
-    def atualizar_produto(self, produto_id: int, **kwargs):
-        campos_permitidos = ['nome', 'descricao', 'categoria', 'localizacao', 'codigo_barras']
-        campos = []
-        valores = []
+    def run(self):
+        try:
+            resultado = self.deposito.verificar_consistencia(self.incremental, self.reparar)
+        except sqlite3.Error as e:
+            self.concluido.emit(False, str(e))
+            return
         
-        for campo, valor in kwargs.items():
-            if campo in campos_permitidos:
-                campos.append(f"{campo} = ?")
-                valores.append(valor)
+        self.concluido.emit(True, resultado)
+
+
+class DialogMovimentacao(QDialog):
+    def __init__(self, parent, produto_id, produto_nome, tipo, qtd_atual=None):
+        super().__init__(parent)
+        self.produto_id = produto_id
+        self.tipo = tipo
+        self.deposito = parent.deposito
+        self.parent = parent
         
-        if not campos:
-            return False
+        self.setWindowTitle(f"{tipo} - {produto_nome}")
+        self.setModal(True)
+        self.setMinimumWidth(400)
         
-        valores.append(produto_id)
+        layout = QVBoxLayout()
         
-        conn = self.conectar()
-        cursor = conn.cursor()
+        titulo = QLabel(f"Produto: {produto_nome}")
+        titulo.setFont(QFont("Arial", 12, QFont.Bold))
+        layout.addWidget(titulo)
         
-        query = f"UPDATE produtos SET {', '.join(campos)} WHERE id = ?"
-        cursor.execute(query, valores)
+        if qtd_atual is not None:
+            qtd_label = QLabel(f"Quantidade atual: {qtd_atual}")
+            layout.addWidget(qtd_label)
         
-        conn.commit()
-        linhas_afetadas = cursor.rowcount
-        conn.close()
+        if tipo == "SAIDA":
+            locais = self.deposito.locais_do_produto(produto_id)
+            if locais:
+                locais_label = QLabel("Por localização: " + ", ".join(
+                    f"{local or 'sem localização'} {quantidade}" for local, quantidade in locais
+                ))
+                locais_label.setWordWrap(True)
+                layout.addWidget(locais_label)
         
-        return linhas_afetadas > 0
-    
-    def registrar_entrada(self, produto_id: int, quantidade: int, 
-                         observacao: str = "") -> bool:
-        conn = self.conectar()
-        cursor = conn.cursor()
+        form_layout = QFormLayout()
         
-        cursor.execute("SELECT quantidade FROM produtos WHERE id = ?", (produto_id,))
-        resultado = cursor.fetchone()
+        self.qtd_input = QLineEdit()
+        form_layout.addRow("Quantidade:", self.qtd_input)
         
-        if not resultado:
-            conn.close()
-            return False
+        self.obs_input = QLineEdit()
+        form_layout.addRow("Observação:", self.obs_input)
         
-        quantidade_atual = resultado[0]
-        nova_quantidade = quantidade_atual + quantidade
+        # Vazio: localização do produto (na saída, completada pelas demais)
+        self.local_input = QLineEdit()
+        self.local_input.setPlaceholderText(
+            "Localização do produto e, se faltar, as demais" if tipo == "SAIDA" else "Localização do produto"
+        )
+        form_layout.addRow("Localização:", self.local_input)
         
-        cursor.execute("UPDATE produtos SET quantidade = ? WHERE id = ?", (nova_quantidade, produto_id))
+        layout.addLayout(form_layout)
         
-        data_atual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("""
-            INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao)
-            VALUES (?, 'ENTRADA', ?, ?, ?)
-        """, (produto_id, quantidade, data_atual, observacao))
+        btn_confirmar = QPushButton("Confirmar")
+        btn_confirmar.clicked.connect(self.confirmar)
+        layout.addWidget(btn_confirmar)
         
-        conn.commit()
-        conn.close()
+        self.setLayout(layout)
+    
+    def confirmar(self):
+        try:
+            quantidade = int(self.qtd_input.text())
+            observacao = self.obs_input.text().strip()
+            local = self.local_input.text().strip() or None
+            
+            if self.tipo == "ENTRADA":
+                sucesso = self.deposito.registrar_entrada(self.produto_id, quantidade, observacao, local)
+            else:
+                sucesso = self.deposito.registrar_saida(self.produto_id, quantidade, observacao, local)
+            
+            if sucesso:
+                QMessageBox.information(self, "Sucesso", f"{self.tipo} registrada com sucesso!")
+                self.accept()
+            else:
+                if self.tipo != "SAIDA":
+                    msg = "Erro ao registrar!"
+                elif local:
+                    msg = "Quantidade insuficiente na localização!"
+                else:
+                    msg = "Quantidade insuficiente em estoque!"
+                QMessageBox.critical(self, "Erro", msg)
         
-        return True
+        except ValueError:
+            QMessageBox.critical(self, "Erro", "Digite uma quantidade válida!")
+
+
+class DialogSessaoLeitura(QDialog):
+    """Entradas/saídas por leitor: as leituras se acumulam por produto e são gravadas em uma transação.
+    
+    O estoque de cada produto (o da localização informada, se houver) é lido
+    uma vez, na primeira leitura; as saídas são conferidas contra essa
+    fotografia e, de novo, pelo banco ao gravar. A sessão é gravada inteira
+    ou não é gravada.
+    """
     
-    def registrar_saida(self, produto_id: int, quantidade: int, 
-                       observacao: str = "") -> bool:
-        conn = self.conectar()
-        cursor = conn.cursor()
+    def __init__(self, parent, tipo):
+        super().__init__(parent)
+        self.tipo = tipo
+        self.deposito = parent.deposito
+        # codigo_barras -> produto_id e produto_id -> [linha, nome, estoque, quantidade]
+        self.codigos = {}
+        self.itens = {}
         
-        cursor.execute("SELECT quantidade FROM produtos WHERE id = ?", (produto_id,))
-        resultado = cursor.fetchone()
+        self.setWindowTitle(f"Leitura de {tipo.capitalize()}s")
+        self.setModal(True)
+        self.setMinimumSize(700, 500)
         
-        if not resultado:
-            conn.close()
-            return False
+        layout = QVBoxLayout()
         
-        quantidade_atual = resultado[0]
+        form_layout = QFormLayout()
         
-        if quantidade_atual < quantidade:
-            conn.close()
-            return False
+        leitura_layout = QHBoxLayout()
+        self.codigo_input = QLineEdit()
+        self.codigo_input.setPlaceholderText("Leia ou digite o código de barras e tecle Enter")
+        self.codigo_input.returnPressed.connect(self.ler_codigo)
+        leitura_layout.addWidget(self.codigo_input)
+        leitura_layout.addWidget(QLabel("Qtd. por leitura:"))
+        self.qtd_leitura = QSpinBox()
+        self.qtd_leitura.setRange(1, 100000)
+        leitura_layout.addWidget(self.qtd_leitura)
+        form_layout.addRow("Código de Barras:", leitura_layout)
         
-        nova_quantidade = quantidade_atual - quantidade
+        self.obs_input = QLineEdit()
+        form_layout.addRow("Observação:", self.obs_input)
         
-        cursor.execute("UPDATE produtos SET quantidade = ? WHERE id = ?", (nova_quantidade, produto_id))
+        # Vazio: localização de cada produto; fixa a partir da primeira leitura
+        self.local_input = QLineEdit()
+        self.local_input.setPlaceholderText("Localização do produto")
+        form_layout.addRow("Localização:", self.local_input)
         
-        data_atual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("""
-            INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao)
-            VALUES (?, 'SAIDA', ?, ?, ?)
-        """, (produto_id, quantidade, data_atual, observacao))
+        layout.addLayout(form_layout)
         
-        conn.commit()
-        conn.close()
+        self.label_ultima_leitura = QLabel("")
+        self.label_ultima_leitura.setFont(QFont("Arial", 11, QFont.Bold))
+        layout.addWidget(self.label_ultima_leitura)
         
-        return True
-    
-    def listar_movimentacoes(self, produto_id: Optional[int] = None, 
-                            data_inicio: Optional[str] = None, 
-                            data_fim: Optional[str] = None) -> List[Tuple]:
-        conn = self.conectar()
-        cursor = conn.cursor()
+        self.tabela_itens = QTableWidget()
+        self.tabela_itens.setColumnCount(5)
+        self.tabela_itens.setHorizontalHeaderLabels(['ID', 'Produto', 'Código de Barras', 'Estoque', 'Quantidade'])
+        self.tabela_itens.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabela_itens.setSelectionBehavior(QTableWidget.SelectRows)
+        self.tabela_itens.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.tabela_itens)
         
-        query = """
-            SELECT m.id, p.nome, m.tipo, m.quantidade, m.data_movimentacao, m.observacao
-            FROM movimentacoes m
-            JOIN produtos p ON m.produto_id = p.id
-            WHERE 1=1
-        """
-        params = []
+        self.label_total = QLabel("0 produto(s) / 0 item(ns)")
+        layout.addWidget(self.label_total)
         
-        if produto_id:
-            query += " AND m.produto_id = ?"
-            params.append(produto_id)
+        btn_layout = QHBoxLayout()
         
-        if data_inicio:
-            query += " AND DATE(m.data_movimentacao) >= ?"
-            params.append(data_inicio)
+        btn_remover = QPushButton("Remover Linha")
+        btn_remover.clicked.connect(self.remover_linha)
+        btn_layout.addWidget(btn_remover)
         
-        if data_fim:
-            query += " AND DATE(m.data_movimentacao) <= ?"
-            params.append(data_fim)
+        btn_gravar = QPushButton(f"Gravar {tipo.capitalize()}s")
+        btn_gravar.clicked.connect(self.gravar)
+        btn_layout.addWidget(btn_gravar)
         
-        query += " ORDER BY m.data_movimentacao DESC LIMIT 500"
+        btn_cancelar = QPushButton("Cancelar")
+        btn_cancelar.clicked.connect(self.reject)
+        btn_layout.addWidget(btn_cancelar)
         
-        cursor.execute(query, params)
-        movimentacoes = cursor.fetchall()
-        conn.close()
+        layout.addLayout(btn_layout)
         
-        return movimentacoes
+        self.setLayout(layout)
+        self.codigo_input.setFocus()
     
-    def produtos_estoque_baixo(self, limite: int = 10) -> List[Tuple]:
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, nome, categoria, quantidade, localizacao
-            FROM produtos
-            WHERE quantidade <= ?
-            ORDER BY quantidade ASC
-        """, (limite,))
+    def ler_codigo(self):
+        codigo = self.codigo_input.text().strip()
+        quantidade = self.qtd_leitura.value()
+        self.codigo_input.clear()
+        self.qtd_leitura.setValue(1)
+        if not codigo:
+            return
         
-        produtos = cursor.fetchall()
-        conn.close()
+        # Só a primeira leitura de cada código consulta o banco
+        produto_id = self.codigos.get(codigo)
+        if produto_id is None:
+            produto = self.deposito.buscar_produto_por_codigo_barras(codigo)
+            if not produto:
+                QApplication.beep()
+                self.label_ultima_leitura.setText(f"Código não encontrado: {codigo}")
+                return
+            produto_id = produto[0]
+            self.codigos[codigo] = produto_id
+            if produto_id not in self.itens:
+                # As saídas de uma localização só contam com o saldo dela; sem localização
+                # a saída pode usar o estoque de todas
+                local = self.local_input.text().strip().upper()
+                estoque = produto[4]
+                if local:
+                    estoque = dict(self.deposito.locais_do_produto(produto_id)).get(local, 0)
+                self.local_input.setEnabled(False)
+                
+                linha = self.tabela_itens.rowCount()
+                self.tabela_itens.insertRow(linha)
+                for j, valor in enumerate((produto[0], produto[1], codigo, estoque)):
+                    self.tabela_itens.setItem(linha, j, QTableWidgetItem(str(valor)))
+                self.itens[produto_id] = [linha, produto[1], estoque, 0]
+        
+        item = self.itens[produto_id]
+        if self.tipo == "SAIDA" and item[3] + quantidade > item[2]:
+            QApplication.beep()
+            self.label_ultima_leitura.setText(f"Estoque insuficiente: {item[1]} ({item[2]} em estoque)")
+            return
         
-        return produtos
+        item[3] += quantidade
+        self.tabela_itens.setItem(item[0], 4, QTableWidgetItem(str(item[3])))
+        self.tabela_itens.selectRow(item[0])
+        self.label_ultima_leitura.setText(f"+{quantidade} {item[1]} (total {item[3]})")
+        self.atualizar_total()
+    
+    def atualizar_total(self):
+        produtos = sum(1 for item in self.itens.values() if item[3] > 0)
+        itens = sum(item[3] for item in self.itens.values())
+        self.label_total.setText(f"{produtos} produto(s) / {itens} item(ns)")
     
-    def relatorio_estoque(self) -> dict:
-        conn = self.conectar()
-        cursor = conn.cursor()
+    def remover_linha(self):
+        linha = self.tabela_itens.currentRow()
+        if linha < 0:
+            return
         
-        cursor.execute("SELECT COUNT(*) FROM produtos")
-        total_produtos = cursor.fetchone()[0]
+        self.remover_produtos({int(self.tabela_itens.item(linha, 0).text())})
+        self.atualizar_total()
+        self.codigo_input.setFocus()
+    
+    def remover_produtos(self, produtos_ids):
+        # Uma nova leitura desses produtos volta a consultar o estoque no banco
+        for linha in sorted((self.itens.pop(produto_id)[0] for produto_id in produtos_ids), reverse=True):
+            self.tabela_itens.removeRow(linha)
+        self.codigos = {codigo: p for codigo, p in self.codigos.items() if p not in produtos_ids}
+        for linha, produto_id in enumerate(self.itens):
+            self.itens[produto_id][0] = linha
+        self.local_input.setEnabled(not self.itens)
+    
+    def gravar(self):
+        pendentes = [(produto_id, item) for produto_id, item in self.itens.items() if item[3] > 0]
+        if not pendentes:
+            QMessageBox.warning(self, "Atenção", "Nenhum produto lido!")
+            return
         
-        cursor.execute("SELECT SUM(quantidade) FROM produtos")
-        total_itens = cursor.fetchone()[0] or 0
+        observacao = self.obs_input.text().strip()
+        local = self.local_input.text().strip().upper() or None
         
-        cursor.execute("""
-            SELECT categoria, COUNT(*), SUM(quantidade)
-            FROM produtos
-            GROUP BY categoria
-        """)
-        por_categoria = cursor.fetchall()
+        # Uma transação e um lote: a sessão inteira pode ser estornada de uma vez,
+        # e um item recusado impede a gravação dos demais
+        resultados = self.deposito.registrar_movimentacoes_lote(
+            [(produto_id, self.tipo, item[3], observacao) for produto_id, item in pendentes], local=local,
+            atomico=True
+        )
         
-        conn.close()
+        recusados = [item[1] for (_, item), sucesso in zip(pendentes, resultados) if not sucesso]
+        if not recusados:
+            QMessageBox.information(self, "Sucesso", f"{len(pendentes)} {self.tipo.lower()}(s) registrada(s)!")
+            self.accept()
+            return
         
-        return {
-            'total_produtos': total_produtos,
-            'total_itens': total_itens,
-            'por_categoria': por_categoria
-        }
+        # Nada foi gravado: a sessão continua aberta para corrigir os recusados
+        msg = "Estoque insuficiente" if self.tipo == "SAIDA" else "Não foi possível registrar"
+        QMessageBox.critical(
+            self, "Erro",
+            f"Nenhuma {self.tipo.lower()} foi registrada. {msg}:\n\n" + "\n".join(recusados[:20])
+        )
 
 
-class DialogMovimentacao(QDialog):
-    def __init__(self, parent, produto_id, produto_nome, tipo, qtd_atual=None):
+class DialogTransferencia(QDialog):
+    def __init__(self, parent, produto_id, produto_nome, localizacao):
         super().__init__(parent)
         self.produto_id = produto_id
-        self.tipo = tipo
         self.deposito = parent.deposito
-        self.parent = parent
         
-        self.setWindowTitle(f"{tipo} - {produto_nome}")
+        self.setWindowTitle(f"Transferência - {produto_nome}")
         self.setModal(True)
-        self.setMinimumWidth(400)
+        self.setMinimumWidth(450)
         
         layout = QVBoxLayout()
         
@@ -325,12 +366,29 @@ class DialogMovimentacao(QDialog):
         titulo.setFont(QFont("Arial", 12, QFont.Bold))
         layout.addWidget(titulo)
         
-        if qtd_atual is not None:
-            qtd_label = QLabel(f"Quantidade atual: {qtd_atual}")
-            layout.addWidget(qtd_label)
+        locais = self.deposito.locais_do_produto(produto_id)
+        self.tabela_locais = QTableWidget(len(locais), 2)
+        self.tabela_locais.setHorizontalHeaderLabels(['Localização', 'Quantidade'])
+        self.tabela_locais.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabela_locais.setSelectionBehavior(QTableWidget.SelectRows)
+        self.tabela_locais.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        for i, (local, quantidade) in enumerate(locais):
+            self.tabela_locais.setItem(i, 0, QTableWidgetItem(local or "(sem localização)"))
+            self.tabela_locais.setItem(i, 1, QTableWidgetItem(str(quantidade)))
+        self.tabela_locais.cellClicked.connect(
+            lambda linha, _: self.origem_input.setText(locais[linha][0])
+        )
+        layout.addWidget(self.tabela_locais)
         
         form_layout = QFormLayout()
         
+        self.origem_input = QLineEdit()
+        self.origem_input.setText(localizacao or "")
+        form_layout.addRow("Origem:", self.origem_input)
+        
+        self.destino_input = QLineEdit()
+        form_layout.addRow("Destino:", self.destino_input)
+        
         self.qtd_input = QLineEdit()
         form_layout.addRow("Quantidade:", self.qtd_input)
         
@@ -339,7 +397,7 @@ class DialogMovimentacao(QDialog):
         
         layout.addLayout(form_layout)
         
-        btn_confirmar = QPushButton("Confirmar")
+        btn_confirmar = QPushButton("Transferir")
         btn_confirmar.clicked.connect(self.confirmar)
         layout.addWidget(btn_confirmar)
         
@@ -348,27 +406,27 @@ class DialogMovimentacao(QDialog):
     def confirmar(self):
         try:
             quantidade = int(self.qtd_input.text())
-            observacao = self.obs_input.text().strip()
-            
-            if self.tipo == "ENTRADA":
-                sucesso = self.deposito.registrar_entrada(self.produto_id, quantidade, observacao)
-            else:
-                sucesso = self.deposito.registrar_saida(self.produto_id, quantidade, observacao)
-            
-            if sucesso:
-                QMessageBox.information(self, "Sucesso", f"{self.tipo} registrada com sucesso!")
-                self.parent.atualizar_lista_produtos()
-                self.parent.atualizar_movimentacoes()
-                self.accept()
-            else:
-                msg = "Quantidade insuficiente em estoque!" if self.tipo == "SAÍDA" else "Erro ao registrar!"
-                QMessageBox.critical(self, "Erro", msg)
-        
         except ValueError:
             QMessageBox.critical(self, "Erro", "Digite uma quantidade válida!")
+            return
+        
+        origem = self.origem_input.text().strip().upper()
+        destino = self.destino_input.text().strip().upper()
+        if origem == destino:
+            QMessageBox.warning(self, "Atenção", "Origem e destino devem ser diferentes!")
+            return
+        
+        if self.deposito.transferir(self.produto_id, origem, destino, quantidade, self.obs_input.text().strip()):
+            QMessageBox.information(self, "Sucesso", "Transferência registrada com sucesso!")
+            self.accept()
+        else:
+            QMessageBox.critical(self, "Erro", "Quantidade insuficiente na origem!")
 
 
 class DialogEditarProduto(QDialog):
+    # Edições exibidas no histórico; o restante fica no relatório de alterações de cadastro
+    MAX_EDICOES = 200
+    
     def __init__(self, parent, produto_id):
         super().__init__(parent)
         self.produto_id = produto_id
@@ -419,6 +477,21 @@ class DialogEditarProduto(QDialog):
         self.descricao_input.setText(produto[2] or "")
         form_layout.addRow("Descrição:", self.descricao_input)
         
+        # Em branco: vale o ponto de pedido padrão do depósito
+        estoque_minimo, ponto_pedido = self.deposito.limites_estoque(produto_id)
+        
+        self.estoque_minimo_input = QLineEdit()
+        self.estoque_minimo_input.setText("" if estoque_minimo is None else str(estoque_minimo))
+        self.estoque_minimo_input.setPlaceholderText("Opcional")
+        form_layout.addRow("Estoque Mínimo:", self.estoque_minimo_input)
+        
+        self.ponto_pedido_input = QLineEdit()
+        self.ponto_pedido_input.setText("" if ponto_pedido is None else str(ponto_pedido))
+        self.ponto_pedido_input.setPlaceholderText(
+            f"Padrão: estoque mínimo ou {self.deposito.PONTO_PEDIDO_PADRAO}"
+        )
+        form_layout.addRow("Ponto de Pedido:", self.ponto_pedido_input)
+        
         qtd_info = QLabel(f"Quantidade atual: {produto[4]}")
         qtd_info.setStyleSheet("color: #0066cc; font-weight: bold;")
         form_layout.addRow("", qtd_info)
@@ -441,8 +514,36 @@ class DialogEditarProduto(QDialog):
         
         layout.addLayout(btn_layout)
         
+        historico_group = QGroupBox("Histórico de Alterações")
+        historico_layout = QVBoxLayout()
+        
+        self.tabela_historico = QTableWidget()
+        self.tabela_historico.setColumnCount(5)
+        self.tabela_historico.setHorizontalHeaderLabels(['Data', 'Usuário', 'Campo', 'Antes', 'Depois'])
+        self.tabela_historico.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabela_historico.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        historico_layout.addWidget(self.tabela_historico)
+        
+        historico_group.setLayout(historico_layout)
+        layout.addWidget(historico_group)
+        
+        self.carregar_historico()
+        
         self.setLayout(layout)
     
+    def carregar_historico(self):
+        # Uma linha por campo alterado, da edição mais recente para a mais antiga
+        linhas = [
+            (data, usuario or "", campo, str(antes), str(depois))
+            for data, usuario, alteracoes in self.deposito.historico_produto(self.produto_id, self.MAX_EDICOES)
+            for campo, (antes, depois) in alteracoes.items()
+        ]
+        
+        self.tabela_historico.setRowCount(len(linhas))
+        for i, linha in enumerate(linhas):
+            for j, valor in enumerate(linha):
+                self.tabela_historico.setItem(i, j, QTableWidgetItem(valor))
+    
     def salvar(self):
         nome = self.nome_input.text().strip()
         categoria = self.categoria_input.text().strip()
@@ -454,89 +555,392 @@ class DialogEditarProduto(QDialog):
             QMessageBox.critical(self, "Erro", "Nome do produto é obrigatório!")
             return
         
-        sucesso = self.deposito.atualizar_produto(
-            self.produto_id,
-            nome=nome.upper(),
-            categoria=categoria.upper(),
-            localizacao=localizacao.upper(),
-            descricao=descricao.upper(),
-            codigo_barras=codigo_barras
-        )
+        limites = {}
+        for campo, entrada in (('estoque_minimo', self.estoque_minimo_input),
+                               ('ponto_pedido', self.ponto_pedido_input)):
+            texto = entrada.text().strip()
+            if texto and not texto.isdigit():
+                QMessageBox.critical(self, "Erro", "Estoque mínimo e ponto de pedido devem ser números inteiros!")
+                return
+            limites[campo] = int(texto) if texto else None
+        
+        try:
+            sucesso = self.deposito.atualizar_produto(
+                self.produto_id,
+                nome=nome.upper(),
+                categoria=categoria.upper(),
+                localizacao=localizacao.upper(),
+                descricao=descricao.upper(),
+                codigo_barras=codigo_barras,
+                **limites
+            )
+        except ValueError as e:
+            QMessageBox.critical(self, "Erro", str(e))
+            return
         
         if sucesso:
             QMessageBox.information(self, "Sucesso", "Produto atualizado com sucesso!")
-            self.parent.atualizar_lista_produtos()
             self.accept()
         else:
             QMessageBox.critical(self, "Erro", "Erro ao atualizar produto!")
 
 
-class InterfaceDeposito(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.deposito = GerenciadorDeposito()
-        self.init_ui()
+class DialogInventario(QDialog):
+    """Inventário físico: contagens por coletor, digitação ou arquivo e ajuste em lote"""
     
-    def init_ui(self):
-        self.setWindowTitle("🍁️ Sistema de Gerenciamento de Depósito")
-        self.setGeometry(100, 100, 1200, 700)
-        
-        # Estilo global para botões
-        self.setStyleSheet("""
-            QPushButton {
-                background-color: #C0C0C0;
-                color: black;
-                border: 1px solid #A0A0A0;
-                padding: 5px 15px;
-                border-radius: 3px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #D3D3D3;
-            }
-            QPushButton:pressed {
-                background-color: #A8A8A8;
-            }
-        """)
+    # O relatório completo fica na aba Relatórios; aqui só as maiores divergências
+    MAX_LINHAS_DIVERGENCIAS = 1000
+    
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.deposito = parent.deposito
+        self.parent = parent
+        self.inventario_id = None
         
-        central_widget = QWidget()
-        self.setCentralWidget(central_widget)
+        self.setWindowTitle("Inventário Físico")
+        self.setModal(True)
+        self.setMinimumSize(800, 600)
         
         layout = QVBoxLayout()
-        central_widget.setLayout(layout)
         
-        self.tabs = QTabWidget()
-        layout.addWidget(self.tabs)
+        self.label_inventario = QLabel("")
+        self.label_inventario.setFont(QFont("Arial", 12, QFont.Bold))
+        layout.addWidget(self.label_inventario)
+        
+        self.btn_iniciar = QPushButton("Iniciar Inventário")
+        self.btn_iniciar.clicked.connect(self.iniciar)
+        layout.addWidget(self.btn_iniciar)
+        
+        # Coletor: cada leitura soma a quantidade; digitação substitui a contagem
+        self.group_contagem = QGroupBox("Contagem")
+        contagem_layout = QFormLayout()
+        
+        leitura_layout = QHBoxLayout()
+        self.codigo_input = QLineEdit()
+        self.codigo_input.setPlaceholderText("Leia ou digite o código de barras e tecle Enter")
+        self.codigo_input.returnPressed.connect(self.ler_codigo)
+        leitura_layout.addWidget(self.codigo_input)
+        leitura_layout.addWidget(QLabel("Qtd. por leitura:"))
+        self.qtd_leitura = QSpinBox()
+        self.qtd_leitura.setRange(1, 100000)
+        leitura_layout.addWidget(self.qtd_leitura)
+        contagem_layout.addRow("Código de Barras:", leitura_layout)
+        
+        digitacao_layout = QHBoxLayout()
+        self.id_input = QLineEdit()
+        self.id_input.setPlaceholderText("ID do produto")
+        digitacao_layout.addWidget(self.id_input)
+        digitacao_layout.addWidget(QLabel("Quantidade contada:"))
+        self.qtd_contada = QSpinBox()
+        self.qtd_contada.setRange(0, 10000000)
+        digitacao_layout.addWidget(self.qtd_contada)
+        btn_gravar = QPushButton("Gravar Contagem")
+        btn_gravar.clicked.connect(self.gravar_contagem)
+        digitacao_layout.addWidget(btn_gravar)
+        contagem_layout.addRow("Digitação:", digitacao_layout)
+        
+        btn_importar = QPushButton("Importar Arquivo (CSV: código;quantidade)")
+        btn_importar.clicked.connect(self.importar_arquivo)
+        contagem_layout.addRow("Arquivo:", btn_importar)
+        
+        self.label_ultima_leitura = QLabel("")
+        self.label_ultima_leitura.setStyleSheet("color: #7f8c8d; font-style: italic;")
+        contagem_layout.addRow(self.label_ultima_leitura)
+        
+        self.group_contagem.setLayout(contagem_layout)
+        layout.addWidget(self.group_contagem)
+        
+        # Divergências entre o contado e o estoque atual
+        divergencias_layout = QHBoxLayout()
+        self.label_divergencias = QLabel("")
+        divergencias_layout.addWidget(self.label_divergencias)
+        divergencias_layout.addStretch()
+        self.zerar_nao_contados = QCheckBox("Zerar produtos não contados")
+        self.zerar_nao_contados.toggled.connect(self.atualizar_divergencias)
+        divergencias_layout.addWidget(self.zerar_nao_contados)
+        btn_atualizar = QPushButton("Atualizar Divergências")
+        btn_atualizar.clicked.connect(self.atualizar_divergencias)
+        divergencias_layout.addWidget(btn_atualizar)
+        layout.addLayout(divergencias_layout)
+        
+        self.tabela_divergencias = QTableWidget()
+        self.tabela_divergencias.setColumnCount(6)
+        self.tabela_divergencias.setHorizontalHeaderLabels(
+            ['ID', 'PRODUTO', 'LOCALIZACAO', 'ESTOQUE', 'CONTADO', 'DIFERENCA']
+        )
+        self.tabela_divergencias.setEditTriggers(QTableWidget.NoEditTriggers)
+        header = self.tabela_divergencias.horizontalHeader()
+        for col in range(6):
+            header.setSectionResizeMode(col, QHeaderView.Stretch if col == 1 else QHeaderView.ResizeToContents)
+        layout.addWidget(self.tabela_divergencias)
         
-        self.criar_aba_dashboard()
-        self.criar_aba_produtos()
-        self.criar_aba_movimentacoes()
-        self.criar_aba_relatorios()
-        self.criar_aba_manutencao()
-        self.criar_aba_sobre()
+        acoes_layout = QHBoxLayout()
+        self.btn_efetivar = QPushButton("Efetivar Ajustes")
+        self.btn_efetivar.clicked.connect(self.efetivar)
+        self.btn_efetivar.setStyleSheet("background-color: #27ae60; color: white; font-weight: bold; padding: 8px;")
+        acoes_layout.addWidget(self.btn_efetivar)
+        
+        self.btn_cancelar = QPushButton("Cancelar Inventário")
+        self.btn_cancelar.clicked.connect(self.cancelar)
+        acoes_layout.addWidget(self.btn_cancelar)
+        layout.addLayout(acoes_layout)
+        
+        self.setLayout(layout)
+        self.carregar()
     
-    def criar_aba_produtos(self):
-        tab = QWidget()
-        layout = QVBoxLayout()
+    def carregar(self):
+        inventario = self.deposito.inventario_aberto()
+        self.inventario_id = inventario[0] if inventario else None
+        
+        aberto = self.inventario_id is not None
+        self.btn_iniciar.setVisible(not aberto)
+        for widget in (self.group_contagem, self.btn_efetivar, self.btn_cancelar, self.zerar_nao_contados):
+            widget.setEnabled(aberto)
+        
+        if aberto:
+            descricao = f" - {inventario[1]}" if inventario[1] else ""
+            self.label_inventario.setText(
+                f"Inventário #{inventario[0]}{descricao} (aberto em {inventario[2]}) - "
+                f"{inventario[3]} produto(s) contado(s)"
+            )
+            self.codigo_input.setFocus()
+        else:
+            self.label_inventario.setText("Nenhum inventário aberto.")
         
-        form_group = QGroupBox("Cadastro de Produto")
-        form_layout = QGridLayout()
+        self.atualizar_divergencias()
+    
+    def iniciar(self):
+        try:
+            self.deposito.abrir_inventario(f"Inventário de {datetime.now().strftime('%d/%m/%Y')}")
+        except ValueError as e:
+            QMessageBox.warning(self, "Atenção", str(e))
+        self.carregar()
+    
+    def ler_codigo(self):
+        codigo = self.codigo_input.text().strip()
+        if not codigo:
+            return
         
-        form_layout.addWidget(QLabel("Nome:"), 0, 0)
-        self.nome_input = QLineEdit()
-        form_layout.addWidget(self.nome_input, 0, 1)
+        produto = self.deposito.contar_codigo_barras(self.inventario_id, codigo, self.qtd_leitura.value())
+        if produto:
+            self.label_ultima_leitura.setText(f"+{self.qtd_leitura.value()} {produto[1]}")
+        else:
+            self.label_ultima_leitura.setText(f"Código não encontrado: {codigo}")
         
-        form_layout.addWidget(QLabel("Categoria:"), 0, 2)
-        self.categoria_input = QLineEdit()
-        form_layout.addWidget(self.categoria_input, 0, 3)
+        self.codigo_input.clear()
+        self.qtd_leitura.setValue(1)
+    
+    def gravar_contagem(self):
+        try:
+            produto_id = int(self.id_input.text())
+        except ValueError:
+            QMessageBox.critical(self, "Erro", "Digite um ID de produto válido!")
+            return
         
-        form_layout.addWidget(QLabel("Quantidade:"), 1, 0)
-        self.quantidade_input = QLineEdit()
-        form_layout.addWidget(self.quantidade_input, 1, 1)
+        produto = self.deposito.buscar_produto(produto_id)
+        if not produto:
+            QMessageBox.critical(self, "Erro", "Produto não encontrado!")
+            return
         
-        form_layout.addWidget(QLabel("Localização:"), 1, 2)
-        self.localizacao_input = QLineEdit()
-        form_layout.addWidget(self.localizacao_input, 1, 3)
+        self.deposito.registrar_contagens(self.inventario_id, [(produto_id, self.qtd_contada.value())])
+        self.label_ultima_leitura.setText(f"{produto[1]}: {self.qtd_contada.value()}")
+        self.id_input.clear()
+        self.qtd_contada.setValue(0)
+    
+    def importar_arquivo(self):
+        arquivo, _ = QFileDialog.getOpenFileName(
+            self,
+            "Importar Contagens",
+            "",
+            "Arquivo CSV (*.csv *.txt)"
+        )
+        
+        if not arquivo:
+            return
+        
+        try:
+            contados, nao_encontrados = self.deposito.importar_contagens(self.inventario_id, arquivo)
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao importar:\n{str(e)}")
+            return
+        
+        mensagem = f"{contados} produto(s) contado(s) a partir do arquivo."
+        if nao_encontrados:
+            mensagem += (f"\n\n{len(nao_encontrados)} código(s) não encontrado(s):\n"
+                         + "\n".join(nao_encontrados[:20]))
+        QMessageBox.information(self, "Importação", mensagem)
+        self.carregar()
+    
+    def atualizar_divergencias(self):
+        if self.inventario_id is None:
+            self.tabela_divergencias.setRowCount(0)
+            self.label_divergencias.setText("")
+            return
+        
+        diferencas = self.deposito.diferencas_inventario(
+            self.inventario_id, incluir_nao_contados=self.zerar_nao_contados.isChecked()
+        )
+        exibidas = diferencas[:self.MAX_LINHAS_DIVERGENCIAS]
+        
+        self.tabela_divergencias.setRowCount(len(exibidas))
+        for i, d in enumerate(exibidas):
+            for j, valor in enumerate(d):
+                item = QTableWidgetItem(f"{valor:+d}" if j == 5 else str(valor))
+                if j != 1 and j != 2:
+                    item.setTextAlignment(Qt.AlignCenter)
+                if j == 5:
+                    item.setForeground(Qt.darkGreen if valor > 0 else Qt.red)
+                    item.setFont(QFont("Arial", 10, QFont.Bold))
+                self.tabela_divergencias.setItem(i, j, item)
+        
+        texto = f"Divergências: {len(diferencas)} produto(s)"
+        if len(diferencas) > len(exibidas):
+            texto += f" (exibindo as {len(exibidas)} maiores)"
+        self.label_divergencias.setText(texto)
+    
+    def efetivar(self):
+        zerar = self.zerar_nao_contados.isChecked()
+        aviso = "\n\nProdutos não contados ficarão com estoque ZERO." if zerar else ""
+        resposta = QMessageBox.question(
+            self,
+            "Confirmação",
+            f"O estoque dos produtos contados será substituído pela contagem, com "
+            f"movimentações de AJUSTE.{aviso}\n\nDeseja continuar?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        
+        if resposta == QMessageBox.No:
+            return
+        
+        inventario_id = self.inventario_id
+        try:
+            ajustes = self.deposito.efetivar_inventario(inventario_id, zerar)
+        except (sqlite3.Error, ValueError) as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao efetivar inventário:\n{str(e)}")
+            return
+        
+        QMessageBox.information(self, "Sucesso", f"Inventário efetivado!\n\n{ajustes} ajuste(s) lançado(s).")
+        
+        # Relatório de divergências na aba Relatórios, de onde pode ser exportado
+        self.parent.exibir_relatorio('inventario', {'inventario_id': inventario_id})
+        self.parent.tabs.setCurrentWidget(self.parent.aba_relatorios)
+        self.accept()
+    
+    def cancelar(self):
+        resposta = QMessageBox.question(
+            self,
+            "Confirmação",
+            "As contagens deste inventário serão descartadas e o estoque não será alterado.\n\nDeseja continuar?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        
+        if resposta == QMessageBox.No:
+            return
+        
+        self.deposito.cancelar_inventario(self.inventario_id)
+        self.carregar()
+
+
+class InterfaceDeposito(QMainWindow):
+    # Emitido pelo ouvinte do GerenciadorDeposito, que pode rodar em outra thread
+    alteracoes_recebidas = pyqtSignal(list, list)
+    # Emitido pelo ouvinte de alertas, com os AlertaEstoque novos
+    alertas_recebidos = pyqtSignal(list)
+    LIMITE_ATUALIZACAO_PARCIAL = 500
+    MAX_ALERTAS_EXIBIDOS = 50
+    TIPOS_ALERTA = {'ESTOQUE_BAIXO': "Estoque baixo", 'ABAIXO_MINIMO': "Abaixo do mínimo",
+                    'SEM_ESTOQUE': "Sem estoque"}
+    
+    def __init__(self):
+        super().__init__()
+        self.deposito = GerenciadorDeposito()
+        self.agregador = AgregadorMovimentacoes(self.deposito, dias=30)
+        self.linhas_produtos = {}
+        self.produtos_filtrados = False
+        self.movimentacoes_exibidas = set()
+        self.movimentacoes_ate_hoje = True
+        self.relatorio_atual = None
+        self.dashboard_desatualizado = False
+        self.exportacoes = GerenciadorExportacoes(self.deposito.db_name)
+        self.exportacoes_pendentes = {}
+        self.deposito.iniciar_indice_busca()
+        self.init_ui()
+        
+        self.alteracoes_recebidas.connect(self.aplicar_alteracoes)
+        self.deposito.adicionar_ouvinte(self.alteracoes_recebidas.emit)
+        self.alertas_recebidos.connect(self.mostrar_alertas)
+        self.deposito.adicionar_ouvinte_alertas(self.alertas_recebidos.emit)
+        
+        # Detecta movimentações feitas por outras estações no mesmo banco
+        self.monitor = self.deposito.criar_monitor()
+        self.timer_alteracoes = QTimer(self)
+        self.timer_alteracoes.timeout.connect(self.verificar_alteracoes)
+        self.timer_alteracoes.start(2000)
+    
+    def init_ui(self):
+        self.setWindowTitle("🍁️ Sistema de Gerenciamento de Depósito")
+        self.setGeometry(100, 100, 1200, 700)
+        
+        # Estilo global para botões
+        self.setStyleSheet("""
+            QPushButton {
+                background-color: #C0C0C0;
+                color: black;
+                border: 1px solid #A0A0A0;
+                padding: 5px 15px;
+                border-radius: 3px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #D3D3D3;
+            }
+            QPushButton:pressed {
+                background-color: #A8A8A8;
+            }
+        """)
+        
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        
+        layout = QVBoxLayout()
+        central_widget.setLayout(layout)
+        
+        self.tabs = QTabWidget()
+        layout.addWidget(self.tabs)
+        
+        self.criar_aba_dashboard()
+        self.criar_aba_produtos()
+        self.criar_aba_movimentacoes()
+        self.criar_aba_relatorios()
+        self.criar_aba_manutencao()
+        self.criar_aba_sobre()
+        
+        self.tabs.currentChanged.connect(self.ao_trocar_aba)
+    
+    def criar_aba_produtos(self):
+        tab = QWidget()
+        layout = QVBoxLayout()
+        
+        form_group = QGroupBox("Cadastro de Produto")
+        form_layout = QGridLayout()
+        
+        form_layout.addWidget(QLabel("Nome:"), 0, 0)
+        self.nome_input = QLineEdit()
+        form_layout.addWidget(self.nome_input, 0, 1)
+        
+        form_layout.addWidget(QLabel("Categoria:"), 0, 2)
+        self.categoria_input = QLineEdit()
+        form_layout.addWidget(self.categoria_input, 0, 3)
+        
+        form_layout.addWidget(QLabel("Quantidade:"), 1, 0)
+        self.quantidade_input = QLineEdit()
+        form_layout.addWidget(self.quantidade_input, 1, 1)
+        
+        form_layout.addWidget(QLabel("Localização:"), 1, 2)
+        self.localizacao_input = QLineEdit()
+        form_layout.addWidget(self.localizacao_input, 1, 3)
         
         form_layout.addWidget(QLabel("Código de Barras:"), 2, 0)
         self.codigo_barras_input = QLineEdit()
@@ -573,6 +977,13 @@ class InterfaceDeposito(QMainWindow):
         self.busca_input.setPlaceholderText("Digite o nome ou código de barras")
         busca_layout.addWidget(self.busca_input)
         
+        # Só busca quando a digitação pausa; cada tecla reinicia a espera
+        self.timer_busca = QTimer(self)
+        self.timer_busca.setSingleShot(True)
+        self.timer_busca.setInterval(150)
+        self.timer_busca.timeout.connect(self.buscar_ao_digitar)
+        self.busca_input.textChanged.connect(self.timer_busca.start)
+        
         btn_buscar = QPushButton("Buscar")
         btn_buscar.clicked.connect(self.buscar_produtos)
         busca_layout.addWidget(btn_buscar)
@@ -601,6 +1012,18 @@ class InterfaceDeposito(QMainWindow):
         btn_saida.clicked.connect(self.abrir_saida)
         acoes_layout.addWidget(btn_saida)
         
+        btn_leitura_entrada = QPushButton("Leitura de Entradas")
+        btn_leitura_entrada.clicked.connect(lambda: DialogSessaoLeitura(self, "ENTRADA").exec_())
+        acoes_layout.addWidget(btn_leitura_entrada)
+        
+        btn_leitura_saida = QPushButton("Leitura de Saidas")
+        btn_leitura_saida.clicked.connect(lambda: DialogSessaoLeitura(self, "SAIDA").exec_())
+        acoes_layout.addWidget(btn_leitura_saida)
+        
+        btn_transferir = QPushButton("Transferir")
+        btn_transferir.clicked.connect(self.abrir_transferencia)
+        acoes_layout.addWidget(btn_transferir)
+        
         btn_editar = QPushButton("Editar Produto")
         btn_editar.clicked.connect(self.editar_produto)
         acoes_layout.addWidget(btn_editar)
@@ -648,11 +1071,24 @@ class InterfaceDeposito(QMainWindow):
             ['ID', 'Produto', 'Tipo', 'Quantidade', 'Data', 'Observação']
         )
         self.tabela_movimentacoes.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tabela_movimentacoes.setSelectionBehavior(QTableWidget.SelectRows)
+        self.tabela_movimentacoes.setSelectionMode(QTableWidget.ExtendedSelection)
         layout.addWidget(self.tabela_movimentacoes)
         
+        acoes_layout = QHBoxLayout()
         btn_atualizar = QPushButton("Atualizar")
         btn_atualizar.clicked.connect(self.atualizar_movimentacoes)
-        layout.addWidget(btn_atualizar)
+        acoes_layout.addWidget(btn_atualizar)
+        
+        btn_estornar = QPushButton("Estornar Selecionadas")
+        btn_estornar.clicked.connect(self.estornar_selecionadas)
+        acoes_layout.addWidget(btn_estornar)
+        
+        btn_estornar_lote = QPushButton("Estornar Lote")
+        btn_estornar_lote.clicked.connect(self.estornar_lote)
+        acoes_layout.addWidget(btn_estornar_lote)
+        
+        layout.addLayout(acoes_layout)
         
         tab.setLayout(layout)
         self.tabs.addTab(tab, "Movimentações")
@@ -689,6 +1125,31 @@ class InterfaceDeposito(QMainWindow):
         
         layout.addLayout(btn_layout)
         
+        data_layout = QHBoxLayout()
+        data_layout.addWidget(QLabel("Data:"))
+        self.data_estoque = QDateEdit()
+        self.data_estoque.setCalendarPopup(True)
+        self.data_estoque.setDate(QDate.currentDate())
+        data_layout.addWidget(self.data_estoque)
+        
+        btn_estoque_data = QPushButton("Estoque em Data")
+        btn_estoque_data.clicked.connect(self.mostrar_estoque_em_data)
+        data_layout.addWidget(btn_estoque_data)
+        
+        btn_alteracoes = QPushButton("Alterações de Cadastro desde a Data")
+        btn_alteracoes.clicked.connect(self.mostrar_alteracoes_cadastro)
+        data_layout.addWidget(btn_alteracoes)
+        
+        # Estoque baixo / em estoque por localização
+        self.check_por_local = QCheckBox("Por localização")
+        data_layout.addWidget(self.check_por_local)
+        self.local_relatorio = QLineEdit()
+        self.local_relatorio.setPlaceholderText("Todas as localizações")
+        data_layout.addWidget(self.local_relatorio)
+        data_layout.addStretch()
+        
+        layout.addLayout(data_layout)
+        
         # Botões de exportação
         export_layout = QHBoxLayout()
         
@@ -702,8 +1163,48 @@ class InterfaceDeposito(QMainWindow):
         btn_pdf.setStyleSheet("background-color: #e74c3c; color: white; font-weight: bold; padding: 8px;")
         export_layout.addWidget(btn_pdf)
         
+        btn_tudo = QPushButton("Exportar Tudo (Excel)")
+        btn_tudo.clicked.connect(self.exportar_tudo_para_excel)
+        btn_tudo.setStyleSheet("background-color: #2980b9; color: white; font-weight: bold; padding: 8px;")
+        export_layout.addWidget(btn_tudo)
+        
+        # Período do razão de movimentações da exportação completa
+        export_layout.addWidget(QLabel("Movimentações de:"))
+        self.periodo_inicio = QDateEdit()
+        self.periodo_inicio.setCalendarPopup(True)
+        self.periodo_inicio.setDate(QDate.currentDate().addDays(-365))
+        export_layout.addWidget(self.periodo_inicio)
+        export_layout.addWidget(QLabel("até:"))
+        self.periodo_fim = QDateEdit()
+        self.periodo_fim.setCalendarPopup(True)
+        self.periodo_fim.setDate(QDate.currentDate())
+        export_layout.addWidget(self.periodo_fim)
+        
         layout.addLayout(export_layout)
         
+        # Etiquetas: geradas no pool de exportação, acompanhadas na lista de exportações
+        etiquetas_layout = QHBoxLayout()
+        etiquetas_layout.addWidget(QLabel("Etiquetas:"))
+        self.etiquetas_categoria = QLineEdit()
+        self.etiquetas_categoria.setPlaceholderText("Categoria")
+        etiquetas_layout.addWidget(self.etiquetas_categoria)
+        self.etiquetas_local = QLineEdit()
+        self.etiquetas_local.setPlaceholderText("Localização")
+        etiquetas_layout.addWidget(self.etiquetas_local)
+        self.etiquetas_busca = QLineEdit()
+        self.etiquetas_busca.setPlaceholderText("Nome ou código de barras")
+        etiquetas_layout.addWidget(self.etiquetas_busca)
+        etiquetas_layout.addWidget(QLabel("Cópias:"))
+        self.etiquetas_copias = QSpinBox()
+        self.etiquetas_copias.setRange(1, 1000)
+        etiquetas_layout.addWidget(self.etiquetas_copias)
+        
+        btn_etiquetas = QPushButton("Gerar Etiquetas (PDF)")
+        btn_etiquetas.clicked.connect(self.gerar_etiquetas)
+        etiquetas_layout.addWidget(btn_etiquetas)
+        
+        layout.addLayout(etiquetas_layout)
+        
         # Info do relatório
         self.info_relatorio = QLabel("")
         self.info_relatorio.setFont(QFont("Arial", 11, QFont.Bold))
@@ -731,10 +1232,38 @@ class InterfaceDeposito(QMainWindow):
         """)
         layout.addWidget(self.tabela_relatorio)
         
+        # Exportações em andamento (executadas em outros processos)
+        group_exportacoes = QGroupBox("Exportações")
+        exportacoes_layout = QVBoxLayout()
+        
+        self.tabela_exportacoes = QTableWidget()
+        self.tabela_exportacoes.setColumnCount(4)
+        self.tabela_exportacoes.setHorizontalHeaderLabels(['ARQUIVO', 'FORMATO', 'PROGRESSO', 'STATUS'])
+        self.tabela_exportacoes.setSelectionBehavior(QTableWidget.SelectRows)
+        self.tabela_exportacoes.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabela_exportacoes.setMaximumHeight(130)
+        header = self.tabela_exportacoes.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.Stretch)
+        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
+        exportacoes_layout.addWidget(self.tabela_exportacoes)
+        
+        btn_cancelar_exportacao = QPushButton("Cancelar Exportação")
+        btn_cancelar_exportacao.clicked.connect(self.cancelar_exportacao)
+        exportacoes_layout.addWidget(btn_cancelar_exportacao, alignment=Qt.AlignRight)
+        
+        group_exportacoes.setLayout(exportacoes_layout)
+        layout.addWidget(group_exportacoes)
+        
+        self.timer_exportacoes = QTimer(self)
+        self.timer_exportacoes.setInterval(300)
+        self.timer_exportacoes.timeout.connect(self.atualizar_exportacoes)
+        
         tab.setLayout(layout)
+        self.aba_relatorios = tab
         self.tabs.addTab(tab, "Relatórios")
     
-    
     def criar_aba_dashboard(self):
         tab = QWidget()
         layout = QVBoxLayout()
@@ -782,6 +1311,17 @@ class InterfaceDeposito(QMainWindow):
         self.label_sem_estoque.setStyleSheet("color: #e74c3c;")
         alertas_layout.addWidget(self.label_sem_estoque)
         
+        # Alertas gravados pelas saídas (desta e das outras estações), do mais novo ao mais antigo
+        self.tabela_alertas = QTableWidget()
+        self.tabela_alertas.setColumnCount(4)
+        self.tabela_alertas.setHorizontalHeaderLabels(['Data', 'Produto', 'Situação', 'Qtd / Ponto'])
+        self.tabela_alertas.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabela_alertas.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tabela_alertas.verticalHeader().setVisible(False)
+        alertas_layout.addWidget(self.tabela_alertas)
+        for alerta in reversed(self.deposito.alertas_recentes(self.MAX_ALERTAS_EXIBIDOS)):
+            self.inserir_alerta(alerta)
+        
         alertas_group.setLayout(alertas_layout)
         grid_layout.addWidget(alertas_group, 0, 1)
         
@@ -879,52 +1419,61 @@ class InterfaceDeposito(QMainWindow):
         
         tab.setLayout(layout)
         self.tabs.addTab(tab, "Dashboard")
+        self.aba_dashboard = tab
         
         # Carregar dados iniciais
         self.atualizar_dashboard()
     
     def atualizar_dashboard(self):
         """Atualiza todos os dados do dashboard"""
-        conn = self.deposito.conectar()
-        cursor = conn.cursor()
+        # Todas as contagens no mesmo instante do banco: os totais batem com a soma das categorias
+        with self.deposito.sessao_relatorio() as leitor:
+            conn = leitor.conectar()
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT COUNT(*) FROM produtos")
+            total_produtos = cursor.fetchone()[0]
+            
+            cursor.execute("SELECT SUM(quantidade) FROM produtos")
+            total_itens = cursor.fetchone()[0] or 0
+            
+            # Só os produtos em alerta são lidos (índice parcial do ponto de pedido)
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(quantidade > 0), 0),
+                       COALESCE(SUM(quantidade > 0 AND quantidade < estoque_minimo), 0),
+                       COALESCE(SUM(quantidade = 0), 0)
+                FROM produtos
+                WHERE {leitor.CONDICAO_ESTOQUE_BAIXO}
+            """)
+            estoque_baixo, abaixo_minimo, sem_estoque = cursor.fetchone()
+            
+            cursor.execute("""
+                SELECT c.nome, COUNT(*) as produtos, SUM(p.quantidade) as itens
+                FROM produtos p
+                LEFT JOIN categorias c ON c.id = p.categoria_id
+                GROUP BY p.categoria_id
+                ORDER BY produtos DESC
+            """)
+            categorias = cursor.fetchall()
         
         # ========== RESUMO GERAL ==========
-        # Total de produtos
-        cursor.execute("SELECT COUNT(*) FROM produtos")
-        total_produtos = cursor.fetchone()[0]
         self.label_total_produtos.setText(f"Total de Produtos: {total_produtos}")
-        
-        # Total de itens em estoque
-        cursor.execute("SELECT SUM(quantidade) FROM produtos")
-        total_itens = cursor.fetchone()[0] or 0
         self.label_total_itens.setText(f"Total de Itens em Estoque: {total_itens}")
         
         # ========== ALERTAS ==========
-        # Produtos com estoque baixo
-        cursor.execute("SELECT COUNT(*) FROM produtos WHERE quantidade > 0 AND quantidade <= 10")
-        estoque_baixo = cursor.fetchone()[0]
-        self.label_estoque_baixo.setText(f"Produtos com Estoque Baixo (≤10): {estoque_baixo}")
-        
-        # Produtos sem estoque
-        cursor.execute("SELECT COUNT(*) FROM produtos WHERE quantidade = 0")
-        sem_estoque = cursor.fetchone()[0]
+        self.label_estoque_baixo.setText(
+            f"Produtos com Estoque Baixo (≤ ponto de pedido): {estoque_baixo} ({abaixo_minimo} abaixo do mínimo)"
+        )
         self.label_sem_estoque.setText(f"Produtos Sem Estoque: {sem_estoque}")
         
         # ========== MOVIMENTAÇÕES DOS ÚLTIMOS 30 DIAS ==========
-        data_limite = (date.today() - timedelta(days=30)).strftime('%Y-%m-%d')
+        # Só as movimentações novas desde a última atualização são somadas
+        self.agregador.atualizar()
         
-        cursor.execute("""
-            SELECT SUM(quantidade) FROM movimentacoes 
-            WHERE tipo = 'ENTRADA' AND DATE(data_movimentacao) >= ?
-        """, (data_limite,))
-        entradas = cursor.fetchone()[0] or 0
+        entradas = self.agregador.entradas
         self.label_entradas_mes.setText(f"Total de Entradas: {entradas}")
         
-        cursor.execute("""
-            SELECT SUM(quantidade) FROM movimentacoes 
-            WHERE tipo = 'SAIDA' AND DATE(data_movimentacao) >= ?
-        """, (data_limite,))
-        saidas = cursor.fetchone()[0] or 0
+        saidas = self.agregador.saidas
         self.label_saidas_mes.setText(f"Total de Saídas: {saidas}")
         
         saldo = entradas - saidas
@@ -933,14 +1482,6 @@ class InterfaceDeposito(QMainWindow):
         self.label_saldo_mes.setStyleSheet(f"color: {cor_saldo};")
         
         # ========== CATEGORIAS ==========
-        cursor.execute("""
-            SELECT categoria, COUNT(*) as produtos, SUM(quantidade) as itens
-            FROM produtos
-            GROUP BY categoria
-            ORDER BY produtos DESC
-        """)
-        categorias = cursor.fetchall()
-        
         self.label_total_categorias.setText(f"Total de Categorias: {len(categorias)}")
         
         self.tabela_categorias.setRowCount(len(categorias))
@@ -957,20 +1498,7 @@ class InterfaceDeposito(QMainWindow):
             self.tabela_categorias.setItem(i, 2, item_itens)
         
         # ========== TOP 10 PRODUTOS MAIS MOVIMENTADOS ==========
-        cursor.execute("""
-            SELECT 
-                p.nome,
-                COALESCE(SUM(CASE WHEN m.tipo = 'ENTRADA' THEN m.quantidade ELSE 0 END), 0) as entradas,
-                COALESCE(SUM(CASE WHEN m.tipo = 'SAIDA' THEN m.quantidade ELSE 0 END), 0) as saidas,
-                COALESCE(SUM(m.quantidade), 0) as total
-            FROM produtos p
-            INNER JOIN movimentacoes m ON p.id = m.produto_id
-            WHERE DATE(m.data_movimentacao) >= ?
-            GROUP BY p.id, p.nome
-            ORDER BY total DESC
-            LIMIT 10
-        """, (data_limite,))
-        top_produtos = cursor.fetchall()
+        top_produtos = self.agregador.top_produtos(10)
         
         self.tabela_top_produtos.setRowCount(len(top_produtos))
         for i, prod in enumerate(top_produtos):
@@ -994,13 +1522,26 @@ class InterfaceDeposito(QMainWindow):
             item_total.setFont(QFont("Arial", 10, QFont.Bold))
             self.tabela_top_produtos.setItem(i, 3, item_total)
         
-        conn.close()
-        
         # Atualizar rodapé
+        self.dashboard_desatualizado = False
         self.label_ultima_atualizacao.setText(
             f"Última atualização: {datetime.now().strftime('%d/%m/%Y às %H:%M:%S')}"
         )
     
+    def marcar_dashboard_desatualizado(self):
+        """Os totais do dashboard varrem o catálogo inteiro: com gravações de outras
+        estações eles só são recalculados ao clicar em Atualizar ou ao voltar à aba"""
+        if self.dashboard_desatualizado:
+            return
+        self.dashboard_desatualizado = True
+        self.label_ultima_atualizacao.setText(
+            self.label_ultima_atualizacao.text() + " — há alterações de outras estações; clique em Atualizar"
+        )
+    
+    def ao_trocar_aba(self, indice):
+        if self.dashboard_desatualizado and self.tabs.widget(indice) is self.aba_dashboard:
+            self.atualizar_dashboard()
+    
     def criar_aba_manutencao(self):
         tab = QWidget()
         layout = QVBoxLayout()
@@ -1028,13 +1569,80 @@ class InterfaceDeposito(QMainWindow):
         desc2 = QLabel("Restaure o banco de dados a partir de um backup anterior.")
         restaurar_layout.addWidget(desc2)
         
-        btn_restaurar = QPushButton("Restaurar Backup")
-        btn_restaurar.clicked.connect(self.restaurar_backup)
-        restaurar_layout.addWidget(btn_restaurar)
+        self.btn_restaurar = QPushButton("Restaurar Backup")
+        self.btn_restaurar.clicked.connect(self.restaurar_backup)
+        restaurar_layout.addWidget(self.btn_restaurar)
+        
+        self.label_status_restauracao = QLabel("")
+        self.label_status_restauracao.setStyleSheet("color: #7f8c8d; font-style: italic;")
+        restaurar_layout.addWidget(self.label_status_restauracao)
         
         restaurar_group.setLayout(restaurar_layout)
         layout.addWidget(restaurar_group)
         
+        arquivar_group = QGroupBox("Arquivar Movimentações Antigas")
+        arquivar_layout = QVBoxLayout()
+        
+        desc3 = QLabel("Move movimentações antigas para arquivos anuais ao lado do banco de dados.\n"
+                       "Copie também esses arquivos ao fazer backup.")
+        arquivar_layout.addWidget(desc3)
+        
+        horizonte_layout = QHBoxLayout()
+        horizonte_layout.addWidget(QLabel("Manter no banco os últimos (meses):"))
+        self.meses_arquivamento = QSpinBox()
+        self.meses_arquivamento.setRange(GerenciadorDeposito.MESES_MINIMOS_ARQUIVAMENTO, 240)
+        self.meses_arquivamento.setValue(24)
+        horizonte_layout.addWidget(self.meses_arquivamento)
+        horizonte_layout.addStretch()
+        arquivar_layout.addLayout(horizonte_layout)
+        
+        self.btn_arquivar = QPushButton("Arquivar Movimentações")
+        self.btn_arquivar.clicked.connect(self.arquivar_movimentacoes)
+        arquivar_layout.addWidget(self.btn_arquivar)
+        
+        arquivar_group.setLayout(arquivar_layout)
+        layout.addWidget(arquivar_group)
+        
+        inventario_group = QGroupBox("Inventário Físico")
+        inventario_layout = QVBoxLayout()
+        
+        desc4 = QLabel("Registre as contagens do inventário e ajuste o estoque de todos os produtos de uma vez.")
+        inventario_layout.addWidget(desc4)
+        
+        btn_inventario = QPushButton("Abrir Inventário")
+        btn_inventario.clicked.connect(self.abrir_inventario)
+        inventario_layout.addWidget(btn_inventario)
+        
+        inventario_group.setLayout(inventario_layout)
+        layout.addWidget(inventario_group)
+        
+        consistencia_group = QGroupBox("Consistência do Estoque")
+        consistencia_layout = QVBoxLayout()
+        
+        desc5 = QLabel("Confere o estoque de cada produto com o saldo das suas movimentações.\n"
+                       "Verificar Alterações só confere os produtos movimentados desde a última verificação.")
+        consistencia_layout.addWidget(desc5)
+        
+        self.check_reparar = QCheckBox("Corrigir o estoque dos produtos divergentes")
+        consistencia_layout.addWidget(self.check_reparar)
+        
+        botoes_consistencia = QHBoxLayout()
+        self.btn_verificar_tudo = QPushButton("Verificar Tudo")
+        self.btn_verificar_tudo.clicked.connect(lambda: self.verificar_consistencia(False))
+        botoes_consistencia.addWidget(self.btn_verificar_tudo)
+        
+        self.btn_verificar_alteracoes = QPushButton("Verificar Alterações")
+        self.btn_verificar_alteracoes.clicked.connect(lambda: self.verificar_consistencia(True))
+        botoes_consistencia.addWidget(self.btn_verificar_alteracoes)
+        consistencia_layout.addLayout(botoes_consistencia)
+        
+        self.label_consistencia = QLabel("")
+        self.label_consistencia.setStyleSheet("color: #7f8c8d; font-style: italic;")
+        consistencia_layout.addWidget(self.label_consistencia)
+        
+        consistencia_group.setLayout(consistencia_layout)
+        layout.addWidget(consistencia_group)
+        
         layout.addStretch()
         
         tab.setLayout(layout)
@@ -1100,7 +1708,9 @@ Licença GPLv3""")
             
             QMessageBox.information(self, "Sucesso", f"Produto cadastrado com ID: {produto_id}")
             self.limpar_campos_produto()
-            self.atualizar_lista_produtos()
+            # Sem filtro a lista já foi recarregada pelo ouvinte da escrita
+            if self.produtos_filtrados:
+                self.limpar_busca()
             
         except ValueError:
             QMessageBox.critical(self, "Erro", "Digite um valor valido para quantidade!")
@@ -1113,18 +1723,26 @@ Licença GPLv3""")
         self.descricao_input.clear()
         self.codigo_barras_input.clear()
     
-    def atualizar_lista_produtos(self):
-        produtos = self.deposito.listar_produtos()
+    def preencher_linha_produto(self, i, p):
+        self.tabela_produtos.setItem(i, 0, QTableWidgetItem(str(p[0])))  # ID
+        self.tabela_produtos.setItem(i, 1, QTableWidgetItem(p[1]))  # Nome
+        self.tabela_produtos.setItem(i, 2, QTableWidgetItem(p[3] or ""))  # Categoria
+        self.tabela_produtos.setItem(i, 3, QTableWidgetItem(str(p[4])))  # Quantidade
+        self.tabela_produtos.setItem(i, 4, QTableWidgetItem(p[5] or ""))  # Localização
+        self.tabela_produtos.setItem(i, 5, QTableWidgetItem(p[6] or ""))  # Código de Barras
+        self.tabela_produtos.setItem(i, 6, QTableWidgetItem(p[2] or ""))  # Descrição
+    
+    def preencher_tabela_produtos(self, produtos):
         self.tabela_produtos.setRowCount(len(produtos))
+        self.linhas_produtos = {}
         
         for i, p in enumerate(produtos):
-            self.tabela_produtos.setItem(i, 0, QTableWidgetItem(str(p[0])))  # ID
-            self.tabela_produtos.setItem(i, 1, QTableWidgetItem(p[1]))  # Nome
-            self.tabela_produtos.setItem(i, 2, QTableWidgetItem(p[3] or ""))  # Categoria
-            self.tabela_produtos.setItem(i, 3, QTableWidgetItem(str(p[4])))  # Quantidade
-            self.tabela_produtos.setItem(i, 4, QTableWidgetItem(p[5] or ""))  # Localização
-            self.tabela_produtos.setItem(i, 5, QTableWidgetItem(p[6] or ""))  # Código de Barras
-            self.tabela_produtos.setItem(i, 6, QTableWidgetItem(p[2] or ""))  # Descrição
+            self.preencher_linha_produto(i, p)
+            self.linhas_produtos[p[0]] = i
+    
+    def atualizar_lista_produtos(self):
+        self.preencher_tabela_produtos(self.deposito.listar_produtos())
+        self.produtos_filtrados = False
     
     def buscar_produtos(self):
         termo = self.busca_input.text().strip()
@@ -1139,21 +1757,25 @@ Licença GPLv3""")
             QMessageBox.information(self, "Busca", "Nenhum produto encontrado!")
             return
         
-        self.tabela_produtos.setRowCount(len(produtos))
-        
-        for i, p in enumerate(produtos):
-            self.tabela_produtos.setItem(i, 0, QTableWidgetItem(str(p[0])))  # ID
-            self.tabela_produtos.setItem(i, 1, QTableWidgetItem(p[1]))  # Nome
-            self.tabela_produtos.setItem(i, 2, QTableWidgetItem(p[3] or ""))  # Categoria
-            self.tabela_produtos.setItem(i, 3, QTableWidgetItem(str(p[4])))  # Quantidade
-            self.tabela_produtos.setItem(i, 4, QTableWidgetItem(p[5] or ""))  # Localização
-            self.tabela_produtos.setItem(i, 5, QTableWidgetItem(p[6] or ""))  # Código de Barras
-            self.tabela_produtos.setItem(i, 6, QTableWidgetItem(p[2] or ""))  # Descrição
+        self.preencher_tabela_produtos(produtos)
+        self.produtos_filtrados = True
         
         QMessageBox.information(self, "Busca", f"{len(produtos)} produto(s) encontrado(s)!")
     
+    def buscar_ao_digitar(self):
+        termo = self.busca_input.text().strip()
+        
+        if not termo:
+            if self.produtos_filtrados:
+                self.atualizar_lista_produtos()
+            return
+        
+        self.preencher_tabela_produtos(self.deposito.buscar_produtos_prefixo(termo, 200))
+        self.produtos_filtrados = True
+    
     def limpar_busca(self):
         self.busca_input.clear()
+        self.timer_busca.stop()
         self.atualizar_lista_produtos()
     
     def abrir_entrada(self):
@@ -1163,9 +1785,12 @@ Licença GPLv3""")
             return
         
         produto_id = int(self.tabela_produtos.item(row, 0).text())
-        produto_nome = self.tabela_produtos.item(row, 1).text()
+        produto = self.deposito.buscar_produto(produto_id)
+        if not produto:
+            QMessageBox.warning(self, "Atenção", "Produto não encontrado!")
+            return
         
-        dialog = DialogMovimentacao(self, produto_id, produto_nome, "ENTRADA")
+        dialog = DialogMovimentacao(self, produto_id, produto[1], "ENTRADA")
         dialog.exec_()
     
     def abrir_saida(self):
@@ -1175,10 +1800,27 @@ Licença GPLv3""")
             return
         
         produto_id = int(self.tabela_produtos.item(row, 0).text())
-        produto_nome = self.tabela_produtos.item(row, 1).text()
-        quantidade_atual = int(self.tabela_produtos.item(row, 3).text())
+        produto = self.deposito.buscar_produto(produto_id)
+        if not produto:
+            QMessageBox.warning(self, "Atenção", "Produto não encontrado!")
+            return
         
-        dialog = DialogMovimentacao(self, produto_id, produto_nome, "SAIDA", quantidade_atual)
+        dialog = DialogMovimentacao(self, produto_id, produto[1], "SAIDA", produto[4])
+        dialog.exec_()
+    
+    def abrir_transferencia(self):
+        row = self.tabela_produtos.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Atenção", "Selecione um produto!")
+            return
+        
+        produto_id = int(self.tabela_produtos.item(row, 0).text())
+        produto = self.deposito.buscar_produto(produto_id)
+        if not produto:
+            QMessageBox.warning(self, "Atenção", "Produto não encontrado!")
+            return
+        
+        dialog = DialogTransferencia(self, produto_id, produto[1], produto[5])
         dialog.exec_()
     
     def editar_produto(self):
@@ -1201,11 +1843,138 @@ Licença GPLv3""")
         )
         
         self.tabela_movimentacoes.setRowCount(len(movimentacoes))
+        self.movimentacoes_ate_hoje = True
+        self.movimentacoes_exibidas = {m[0] for m in movimentacoes}
         
         for i, m in enumerate(movimentacoes):
             for j, valor in enumerate(m):
                 self.tabela_movimentacoes.setItem(i, j, QTableWidgetItem(str(valor) if valor else ""))
     
+    def movimentacoes_selecionadas(self):
+        linhas = sorted({indice.row() for indice in self.tabela_movimentacoes.selectedIndexes()})
+        return [int(self.tabela_movimentacoes.item(linha, 0).text()) for linha in linhas
+                if self.tabela_movimentacoes.item(linha, 0)]
+    
+    def estornar_selecionadas(self):
+        ids = self.movimentacoes_selecionadas()
+        if not ids:
+            QMessageBox.warning(self, "Atenção", "Selecione as movimentações a estornar!")
+            return
+        
+        self.confirmar_estorno(ids)
+    
+    def estornar_lote(self):
+        ids = self.movimentacoes_selecionadas()
+        if len(ids) != 1:
+            QMessageBox.warning(self, "Atenção", "Selecione uma movimentação do lote!")
+            return
+        
+        lote = self.deposito.movimentacoes_do_lote(ids[0])
+        if not lote:
+            QMessageBox.information(self, "Estorno", "Não há movimentações a estornar neste lote!")
+            return
+        
+        self.confirmar_estorno(lote)
+    
+    def confirmar_estorno(self, ids):
+        resposta = QMessageBox.question(
+            self,
+            "Confirmação",
+            f"Estornar {len(ids)} movimentação(ões)? O estoque será corrigido em uma única operação.",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if resposta == QMessageBox.No:
+            return
+        
+        try:
+            estornos = self.deposito.estornar_movimentacoes(ids)
+        except ValueError as e:
+            QMessageBox.critical(self, "Erro", f"Nenhuma movimentação foi estornada.\n\n{e}")
+            return
+        
+        QMessageBox.information(self, "Sucesso", f"{len(estornos)} movimentação(ões) estornada(s)!")
+    
+    def inserir_alerta(self, alerta):
+        self.tabela_alertas.insertRow(0)
+        valores = [alerta.data, f"{alerta.produto_id} - {alerta.nome}", self.TIPOS_ALERTA.get(alerta.tipo, alerta.tipo),
+                   f"{alerta.quantidade} / {alerta.ponto_pedido}"]
+        for j, valor in enumerate(valores):
+            self.tabela_alertas.setItem(0, j, QTableWidgetItem(valor))
+        if self.tabela_alertas.rowCount() > self.MAX_ALERTAS_EXIBIDOS:
+            self.tabela_alertas.removeRow(self.MAX_ALERTAS_EXIBIDOS)
+    
+    def mostrar_alertas(self, alertas):
+        """Notificação não modal: a leitura de códigos de barras não é interrompida"""
+        for alerta in alertas:
+            self.inserir_alerta(alerta)
+        
+        ultimo = alertas[-1]
+        mensagem = f"⚠️ {self.TIPOS_ALERTA.get(ultimo.tipo, ultimo.tipo)}: {ultimo.nome} ({ultimo.quantidade} un.)"
+        if len(alertas) > 1:
+            mensagem += f" e mais {len(alertas) - 1} alerta(s)"
+        self.statusBar().showMessage(mensagem, 15000)
+    
+    def aplicar_alteracoes(self, produtos_ids, movimentacoes_ids):
+        """Atualiza só as linhas afetadas por uma escrita, sem recarregar as tabelas"""
+        # Escritas em massa (ajuste de inventário): recarregar é mais rápido que linha a linha
+        if len(produtos_ids) > self.LIMITE_ATUALIZACAO_PARCIAL and not self.produtos_filtrados:
+            self.atualizar_lista_produtos()
+            produtos_ids = []
+        
+        novos_produtos = False
+        for produto_id in produtos_ids:
+            linha = self.linhas_produtos.get(produto_id)
+            if linha is None:
+                novos_produtos = True
+                continue
+            produto = self.deposito.buscar_produto(produto_id)
+            if produto:
+                self.preencher_linha_produto(linha, produto)
+        
+        # Produto cadastrado em outra estação: a lista completa precisa entrar em ordem
+        if novos_produtos and not self.produtos_filtrados:
+            self.atualizar_lista_produtos()
+        
+        # A mesma movimentação pode chegar pelo ouvinte e pelo monitor
+        movimentacoes_ids = [i for i in movimentacoes_ids if i not in self.movimentacoes_exibidas]
+        if not movimentacoes_ids or not self.movimentacoes_ate_hoje:
+            return
+        
+        # Os ids são crescentes: só as 500 mais recentes chegariam a ficar na tabela
+        movimentacoes_ids = sorted(movimentacoes_ids)[-500:]
+        
+        novas = self.deposito.buscar_movimentacoes(movimentacoes_ids)
+        for m in reversed(novas):
+            self.tabela_movimentacoes.insertRow(0)
+            for j, valor in enumerate(m):
+                self.tabela_movimentacoes.setItem(0, j, QTableWidgetItem(str(valor) if valor else ""))
+            self.movimentacoes_exibidas.add(m[0])
+        
+        # Mantém o mesmo limite de linhas de listar_movimentacoes
+        while self.tabela_movimentacoes.rowCount() > 500:
+            ultima = self.tabela_movimentacoes.rowCount() - 1
+            self.movimentacoes_exibidas.discard(int(self.tabela_movimentacoes.item(ultima, 0).text()))
+            self.tabela_movimentacoes.removeRow(ultima)
+    
+    def verificar_alteracoes(self):
+        alteracoes = self.monitor.verificar()
+        if alteracoes is None:
+            return
+        
+        produtos_ids, movimentacoes_ids = alteracoes
+        if produtos_ids is None:
+            self.deposito.iniciar_indice_busca()
+            self.atualizar_lista_produtos()
+            self.atualizar_movimentacoes()
+        else:
+            self.deposito.indice.atualizar(produtos_ids)
+            self.aplicar_alteracoes(produtos_ids, movimentacoes_ids)
+        
+        # Alertas gravados pelas outras estações chegam pelo ouvinte de alertas
+        self.deposito.publicar_alertas()
+        self.marcar_dashboard_desatualizado()
+    
     def filtrar_movimentacoes(self):
         data_inicio = self.data_inicio.date().toString("yyyy-MM-dd")
         data_fim = self.data_fim.date().toString("yyyy-MM-dd")
@@ -1221,6 +1990,8 @@ Licença GPLv3""")
             return
         
         self.tabela_movimentacoes.setRowCount(len(movimentacoes))
+        self.movimentacoes_ate_hoje = self.data_fim.date() >= QDate.currentDate()
+        self.movimentacoes_exibidas = {m[0] for m in movimentacoes}
         
         for i, m in enumerate(movimentacoes):
             for j, valor in enumerate(m):
@@ -1234,33 +2005,19 @@ Licença GPLv3""")
         self.atualizar_movimentacoes()
     
     def gerar_relatorio(self):
-        relatorio = self.deposito.relatorio_estoque()
+        with self.deposito.sessao_relatorio() as leitor:
+            relatorio = montar_relatorio(leitor, 'geral')
+        self.relatorio_atual = ('geral', {})
         
         # Configurar tabela
         self.tabela_relatorio.clear()
         self.tabela_relatorio.setColumnCount(2)
-        self.tabela_relatorio.setHorizontalHeaderLabels(['METRICA', 'VALOR'])
-        
-        # Dados do resumo
-        dados_resumo = [
-            ['Total de Produtos Cadastrados', str(relatorio['total_produtos'])],
-            ['Total de Itens em Estoque', str(relatorio['total_itens'])],
-            ['', ''],  # Linha em branco
-            ['CATEGORIA', 'PRODUTOS / ITENS'],
-        ]
-        
-        # Adicionar categorias
-        if relatorio['por_categoria']:
-            for cat in relatorio['por_categoria']:
-                categoria = cat[0] or "Sem categoria"
-                dados_resumo.append([categoria, f"{cat[1]} produto(s) / {cat[2]} item(ns)"])
-        else:
-            dados_resumo.append(['Sem categorias', '-'])
+        self.tabela_relatorio.setHorizontalHeaderLabels(relatorio.cabecalhos)
         
         # Preencher tabela
-        self.tabela_relatorio.setRowCount(len(dados_resumo))
+        self.tabela_relatorio.setRowCount(len(relatorio.linhas))
         
-        for i, linha in enumerate(dados_resumo):
+        for i, linha in enumerate(relatorio.linhas):
             for j, valor in enumerate(linha):
                 item = QTableWidgetItem(valor)
                 
@@ -1279,226 +2036,84 @@ Licença GPLv3""")
         self.tabela_relatorio.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
         self.tabela_relatorio.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
         
-        self.info_relatorio.setText(f"RELATÓRIO GERAL DO ESTOQUE - Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+        self.info_relatorio.setText(relatorio.titulo)
     
-    def mostrar_estoque_baixo(self):
-        produtos = self.deposito.produtos_estoque_baixo(10)
-        
-        # Configurar tabela
-        self.tabela_relatorio.clear()
-        self.tabela_relatorio.setColumnCount(5)
-        self.tabela_relatorio.setHorizontalHeaderLabels(['ID', 'PRODUTO', 'CATEGORIA', 'QUANTIDADE', 'LOCALIZACAO'])
-        
-        if not produtos:
-            self.tabela_relatorio.setRowCount(1)
-            item = QTableWidgetItem("Nenhum produto com estoque baixo!")
-            item.setTextAlignment(Qt.AlignCenter)
-            item.setFont(QFont("Arial", 11, QFont.Bold))
-            self.tabela_relatorio.setItem(0, 0, item)
-            self.tabela_relatorio.setSpan(0, 0, 1, 5)
+    def exibir_relatorio(self, tipo, parametros=None):
+        if tipo == 'estoque_em':
+            # O leitor não grava fechamentos; os meses pendentes são fechados antes.
+            # O estoque em data pode precisar de qualquer arquivo anual ("")
+            self.deposito.fechar_meses()
+            data_inicio = ""
         else:
-            self.tabela_relatorio.setRowCount(len(produtos))
-            
-            for i, p in enumerate(produtos):
-                # ID
-                item_id = QTableWidgetItem(str(p[0]))
-                item_id.setTextAlignment(Qt.AlignCenter)
-                self.tabela_relatorio.setItem(i, 0, item_id)
-                
-                # Nome
-                self.tabela_relatorio.setItem(i, 1, QTableWidgetItem(p[1]))
-                
-                # Categoria
-                self.tabela_relatorio.setItem(i, 2, QTableWidgetItem(p[2] or 'N/A'))
-                
-                # Quantidade (destacada em vermelho)
-                item_qtd = QTableWidgetItem(str(p[3]))
-                item_qtd.setTextAlignment(Qt.AlignCenter)
-                item_qtd.setForeground(Qt.red)
-                item_qtd.setFont(QFont("Arial", 10, QFont.Bold))
-                self.tabela_relatorio.setItem(i, 3, item_qtd)
-                
-                # Localização
-                self.tabela_relatorio.setItem(i, 4, QTableWidgetItem(p[4] or 'N/A'))
+            data_inicio = None
         
-        # Configurar larguras dinâmicas das colunas
-        header = self.tabela_relatorio.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)  # ID
-        header.setSectionResizeMode(1, QHeaderView.Stretch)  # PRODUTO
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)  # CATEGORIA
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)  # QUANTIDADE
-        header.setSectionResizeMode(4, QHeaderView.ResizeToContents)  # LOCALIZACAO
-        
-        self.info_relatorio.setText(f"PRODUTOS COM ESTOQUE BAIXO (<= 10) - Total: {len(produtos)} produto(s)")
-    
-    def mostrar_produtos_em_estoque(self):
-        conn = self.deposito.conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, nome, categoria, quantidade, localizacao
-            FROM produtos
-            WHERE quantidade > 0
-            ORDER BY nome
-        """)
-        
-        produtos = cursor.fetchall()
-        conn.close()
+        with self.deposito.sessao_relatorio(data_inicio) as leitor:
+            relatorio = montar_relatorio(leitor, tipo, parametros)
+        self.relatorio_atual = (tipo, parametros or {})
+        colunas = len(relatorio.cabecalhos)
         
         # Configurar tabela
         self.tabela_relatorio.clear()
-        self.tabela_relatorio.setColumnCount(5)
-        self.tabela_relatorio.setHorizontalHeaderLabels(['ID', 'PRODUTO', 'CATEGORIA', 'QUANTIDADE', 'LOCALIZACAO'])
+        self.tabela_relatorio.setColumnCount(colunas)
+        self.tabela_relatorio.setHorizontalHeaderLabels(relatorio.cabecalhos)
         
-        if not produtos:
+        if not relatorio.linhas:
             self.tabela_relatorio.setRowCount(1)
-            item = QTableWidgetItem("Nenhum produto em estoque!")
+            item = QTableWidgetItem(relatorio.mensagem_vazia)
             item.setTextAlignment(Qt.AlignCenter)
             item.setFont(QFont("Arial", 11, QFont.Bold))
             self.tabela_relatorio.setItem(0, 0, item)
-            self.tabela_relatorio.setSpan(0, 0, 1, 5)
-            total_itens = 0
+            self.tabela_relatorio.setSpan(0, 0, 1, colunas)
         else:
-            self.tabela_relatorio.setRowCount(len(produtos))
-            total_itens = 0
+            self.tabela_relatorio.setRowCount(len(relatorio.linhas))
             
-            for i, p in enumerate(produtos):
-                # ID
-                item_id = QTableWidgetItem(str(p[0]))
-                item_id.setTextAlignment(Qt.AlignCenter)
-                self.tabela_relatorio.setItem(i, 0, item_id)
-                
-                # Nome
-                self.tabela_relatorio.setItem(i, 1, QTableWidgetItem(p[1]))
-                
-                # Categoria
-                self.tabela_relatorio.setItem(i, 2, QTableWidgetItem(p[2] or 'N/A'))
-                
-                # Quantidade (destacada em verde)
-                item_qtd = QTableWidgetItem(str(p[3]))
-                item_qtd.setTextAlignment(Qt.AlignCenter)
-                item_qtd.setForeground(Qt.darkGreen)
-                item_qtd.setFont(QFont("Arial", 10, QFont.Bold))
-                self.tabela_relatorio.setItem(i, 3, item_qtd)
-                
-                # Localização
-                self.tabela_relatorio.setItem(i, 4, QTableWidgetItem(p[4] or 'N/A'))
-                
-                total_itens += p[3]
+            for i, linha in enumerate(relatorio.linhas):
+                for j, valor in enumerate(linha):
+                    item = QTableWidgetItem(valor)
+                    
+                    # ID e valores destacados centralizados
+                    if j == 0 or j in relatorio.cores:
+                        item.setTextAlignment(Qt.AlignCenter)
+                    if j in relatorio.cores:
+                        item.setForeground(CORES_RELATORIO[relatorio.cores[j]])
+                        item.setFont(QFont("Arial", 10, QFont.Bold))
+                    
+                    self.tabela_relatorio.setItem(i, j, item)
         
-        # Configurar larguras dinâmicas das colunas
+        # Configurar larguras dinâmicas das colunas: PRODUTO ocupa o espaço livre
         header = self.tabela_relatorio.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)  # ID
-        header.setSectionResizeMode(1, QHeaderView.Stretch)  # PRODUTO
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)  # CATEGORIA
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)  # QUANTIDADE
-        header.setSectionResizeMode(4, QHeaderView.ResizeToContents)  # LOCALIZACAO
+        for col in range(colunas):
+            header.setSectionResizeMode(col, QHeaderView.Stretch if col == 1 else QHeaderView.ResizeToContents)
         
-        self.info_relatorio.setText(f"PRODUTOS EM ESTOQUE - Total: {len(produtos)} produto(s) / {total_itens} item(ns)")
+        self.info_relatorio.setText(relatorio.titulo)
+    
+    def parametros_local(self):
+        if not self.check_por_local.isChecked():
+            return {}
+        local = self.local_relatorio.text().strip()
+        return {'local': local} if local else {'por_local': True}
+    
+    def mostrar_estoque_baixo(self):
+        self.exibir_relatorio('estoque_baixo', self.parametros_local())
+    
+    def mostrar_produtos_em_estoque(self):
+        self.exibir_relatorio('em_estoque', self.parametros_local())
     
     def mostrar_movimentacoes_12_meses(self):
-        conn = self.deposito.conectar()
-        cursor = conn.cursor()
-        
-        data_limite = (date.today() - timedelta(days=365)).strftime('%Y-%m-%d')
-        
-        cursor.execute("""
-            SELECT 
-                p.id,
-                p.nome,
-                p.categoria,
-                COALESCE(SUM(CASE WHEN m.tipo = 'ENTRADA' THEN m.quantidade ELSE 0 END), 0) as total_entradas,
-                COALESCE(SUM(CASE WHEN m.tipo = 'SAIDA' THEN m.quantidade ELSE 0 END), 0) as total_saidas,
-                p.quantidade as estoque_atual
-            FROM produtos p
-            INNER JOIN movimentacoes m ON p.id = m.produto_id
-            WHERE DATE(m.data_movimentacao) >= ?
-            GROUP BY p.id, p.nome, p.categoria, p.quantidade
-            ORDER BY p.nome
-        """, (data_limite,))
-        
-        produtos = cursor.fetchall()
-        conn.close()
-        
-        # Configurar tabela
-        self.tabela_relatorio.clear()
-        self.tabela_relatorio.setColumnCount(6)
-        self.tabela_relatorio.setHorizontalHeaderLabels(['ID', 'PRODUTO', 'CATEGORIA', 'ENTRADAS', 'SAIDAS', 'SALDO ATUAL'])
-        
-        if not produtos:
-            self.tabela_relatorio.setRowCount(1)
-            item = QTableWidgetItem("Nenhuma movimentacao nos ultimos 12 meses!")
-            item.setTextAlignment(Qt.AlignCenter)
-            item.setFont(QFont("Arial", 11, QFont.Bold))
-            self.tabela_relatorio.setItem(0, 0, item)
-            self.tabela_relatorio.setSpan(0, 0, 1, 6)
-            total_entradas = total_saidas = 0
-        else:
-            self.tabela_relatorio.setRowCount(len(produtos))
-            total_entradas = 0
-            total_saidas = 0
-            
-            for i, p in enumerate(produtos):
-                # ID
-                item_id = QTableWidgetItem(str(p[0]))
-                item_id.setTextAlignment(Qt.AlignCenter)
-                self.tabela_relatorio.setItem(i, 0, item_id)
-                
-                # Nome
-                self.tabela_relatorio.setItem(i, 1, QTableWidgetItem(p[1]))
-                
-                # Categoria
-                self.tabela_relatorio.setItem(i, 2, QTableWidgetItem(p[2] or 'N/A'))
-                
-                # Entradas (verde)
-                item_ent = QTableWidgetItem(str(p[3]))
-                item_ent.setTextAlignment(Qt.AlignCenter)
-                item_ent.setForeground(Qt.darkGreen)
-                item_ent.setFont(QFont("Arial", 10, QFont.Bold))
-                self.tabela_relatorio.setItem(i, 3, item_ent)
-                
-                # Saídas (vermelho)
-                item_sai = QTableWidgetItem(str(p[4]))
-                item_sai.setTextAlignment(Qt.AlignCenter)
-                item_sai.setForeground(Qt.red)
-                item_sai.setFont(QFont("Arial", 10, QFont.Bold))
-                self.tabela_relatorio.setItem(i, 4, item_sai)
-                
-                # Saldo (azul)
-                item_saldo = QTableWidgetItem(str(p[5]))
-                item_saldo.setTextAlignment(Qt.AlignCenter)
-                item_saldo.setForeground(Qt.blue)
-                item_saldo.setFont(QFont("Arial", 10, QFont.Bold))
-                self.tabela_relatorio.setItem(i, 5, item_saldo)
-                
-                total_entradas += p[3]
-                total_saidas += p[4]
-        
-        # Configurar larguras dinâmicas das colunas
-        header = self.tabela_relatorio.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)  # ID
-        header.setSectionResizeMode(1, QHeaderView.Stretch)  # PRODUTO
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)  # CATEGORIA
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)  # ENTRADAS
-        header.setSectionResizeMode(4, QHeaderView.ResizeToContents)  # SAIDAS
-        header.setSectionResizeMode(5, QHeaderView.ResizeToContents)  # SALDO ATUAL
-        
-        periodo = f"{data_limite} ate {date.today().strftime('%Y-%m-%d')}"
-        self.info_relatorio.setText(
-            f"MOVIMENTACOES DOS ULTIMOS 12 MESES ({periodo}) - "
-            f"Produtos: {len(produtos)} | Entradas: {total_entradas} | Saidas: {total_saidas} | "
-            f"Saldo: {total_entradas - total_saidas}"
-        )
+        self.exibir_relatorio('movimentacoes_12_meses')
+    
+    def mostrar_estoque_em_data(self):
+        self.exibir_relatorio('estoque_em', {'data': self.data_estoque.date().toString("yyyy-MM-dd")})
+    
+    def mostrar_alteracoes_cadastro(self):
+        self.exibir_relatorio('alteracoes_cadastro', {'data_inicio': self.data_estoque.date().toString("yyyy-MM-dd")})
     
     def exportar_para_excel(self):
-        if self.tabela_relatorio.rowCount() == 0:
+        if self.relatorio_atual is None:
             QMessageBox.warning(self, "Atenção", "Gere um relatório antes de exportar!")
             return
         
-        try:
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        except ImportError:
+        if importlib.util.find_spec('openpyxl') is None:
             QMessageBox.critical(
                 self,
                 "Erro",
@@ -1514,130 +2129,42 @@ Licença GPLv3""")
         )
         
         if arquivo:
-            try:
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = "Relatorio"
-                
-                # Estilos
-                header_fill = PatternFill(start_color="34495e", end_color="34495e", fill_type="solid")
-                header_font = Font(bold=True, color="FFFFFF", size=12)
-                border = Border(
-                    left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin')
-                )
-                
-                # Alinhamento com quebra de linha
-                wrap_alignment = Alignment(
-                    horizontal='left',
-                    vertical='top',
-                    wrap_text=True
-                )
-                
-                center_alignment = Alignment(
-                    horizontal='center',
-                    vertical='center',
-                    wrap_text=True
-                )
-                
-                # Título do relatório
-                ws.merge_cells('A1:' + chr(64 + self.tabela_relatorio.columnCount()) + '1')
-                cell_titulo = ws['A1']
-                cell_titulo.value = self.info_relatorio.text()
-                cell_titulo.font = Font(bold=True, size=14)
-                cell_titulo.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                cell_titulo.fill = PatternFill(start_color="ecf0f1", end_color="ecf0f1", fill_type="solid")
-                ws.row_dimensions[1].height = 30
-                
-                # Cabeçalhos
-                for col in range(self.tabela_relatorio.columnCount()):
-                    cell = ws.cell(row=2, column=col+1)
-                    cell.value = self.tabela_relatorio.horizontalHeaderItem(col).text()
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                    cell.border = border
-                
-                # Altura da linha de cabeçalho
-                ws.row_dimensions[2].height = 25
-                
-                # Dados
-                max_lengths = {}  # Para calcular largura das colunas
-                
-                for row in range(self.tabela_relatorio.rowCount()):
-                    for col in range(self.tabela_relatorio.columnCount()):
-                        item = self.tabela_relatorio.item(row, col)
-                        if item:
-                            cell = ws.cell(row=row+3, column=col+1)
-                            cell.value = item.text()
-                            cell.border = border
-                            
-                            # Aplicar alinhamento com quebra de linha
-                            # Centralizar números, alinhar à esquerda textos
-                            if col == 0 or (item.text().isdigit()):  # ID ou números
-                                cell.alignment = center_alignment
-                            else:
-                                cell.alignment = wrap_alignment
-                            
-                            # Aplicar cores
-                            if item.foreground().color().name() in ['#ff0000', '#ff0000ff']:  # Vermelho
-                                cell.font = Font(bold=True, color="c0392b")
-                            elif item.foreground().color().name() in ['#006400', '#006400ff']:  # Verde escuro
-                                cell.font = Font(bold=True, color="27ae60")
-                            elif item.foreground().color().name() in ['#0000ff', '#0000ffff']:  # Azul
-                                cell.font = Font(bold=True, color="2980b9")
-                            
-                            # Calcular comprimento máximo para a coluna
-                            text_length = len(str(item.text()))
-                            if col not in max_lengths or text_length > max_lengths[col]:
-                                max_lengths[col] = text_length
-                            
-                            # Definir altura da linha baseada no conteúdo
-                            # Se o texto for muito longo, aumentar altura
-                            if text_length > 50:
-                                # Estimar altura necessária (aproximadamente 15 por linha)
-                                estimated_lines = (text_length // 50) + 1
-                                current_height = ws.row_dimensions[row+3].height or 15
-                                new_height = max(current_height, estimated_lines * 15)
-                                ws.row_dimensions[row+3].height = new_height
-                
-                # Ajustar largura das colunas baseado no conteúdo
-                for col in range(1, self.tabela_relatorio.columnCount() + 1):
-                    col_letter = chr(64 + col)
-                    
-                    # Calcular largura ideal
-                    if (col - 1) in max_lengths:
-                        # Limitar largura entre 15 e 60 caracteres
-                        optimal_width = min(max(max_lengths[col - 1] + 2, 15), 60)
-                    else:
-                        optimal_width = 20
-                    
-                    ws.column_dimensions[col_letter].width = optimal_width
-                
-                # Congelar painéis (primeira linha e cabeçalho)
-                ws.freeze_panes = 'A3'
-                
-                wb.save(arquivo)
-                
-                QMessageBox.information(self, "Sucesso", f"Relatório exportado para Excel!\n\n{arquivo}")
-            except Exception as e:
-                QMessageBox.critical(self, "Erro", f"Erro ao exportar para Excel:\n{str(e)}")
+            tipo, parametros = self.relatorio_atual
+            self.iniciar_exportacao(tipo, parametros, 'xlsx', arquivo)
+    
+    def exportar_tudo_para_excel(self):
+        """Resumo, estoque baixo, em estoque, 12 meses e as movimentações do período escolhido em um só arquivo"""
+        if importlib.util.find_spec('openpyxl') is None:
+            QMessageBox.critical(
+                self,
+                "Erro",
+                "Biblioteca openpyxl não instalada!\n\nInstale com: pip install openpyxl"
+            )
+            return
+        
+        if self.periodo_inicio.date() > self.periodo_fim.date():
+            QMessageBox.warning(self, "Atenção", "A data inicial do período é posterior à final!")
+            return
+        
+        arquivo, _ = QFileDialog.getSaveFileName(
+            self,
+            "Exportar Tudo para Excel",
+            f"relatorios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            "Arquivo Excel (*.xlsx)"
+        )
+        
+        if arquivo:
+            self.iniciar_exportacao('completo', {
+                'data_inicio': self.periodo_inicio.date().toString("yyyy-MM-dd"),
+                'data_fim': self.periodo_fim.date().toString("yyyy-MM-dd"),
+            }, 'xlsx', arquivo)
     
     def exportar_para_pdf(self):
-        if self.tabela_relatorio.rowCount() == 0:
+        if self.relatorio_atual is None:
             QMessageBox.warning(self, "Atenção", "Gere um relatório antes de exportar!")
             return
         
-        try:
-            from reportlab.lib import colors
-            from reportlab.lib.pagesizes import A4, landscape
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch
-            from reportlab.lib.enums import TA_CENTER, TA_LEFT
-        except ImportError:
+        if importlib.util.find_spec('reportlab') is None:
             QMessageBox.critical(
                 self,
                 "Erro",
@@ -1653,208 +2180,113 @@ Licença GPLv3""")
         )
         
         if arquivo:
-            try:
-                # Criar documento PDF com margens reduzidas
-                doc = SimpleDocTemplate(
-                    arquivo,
-                    pagesize=landscape(A4),
-                    rightMargin=20,
-                    leftMargin=20,
-                    topMargin=25,
-                    bottomMargin=25
-                )
-                
-                # Container para os elementos
-                elements = []
-                
-                # Estilos
-                styles = getSampleStyleSheet()
-                title_style = ParagraphStyle(
-                    'CustomTitle',
-                    parent=styles['Heading1'],
-                    fontSize=14,
-                    textColor=colors.HexColor('#2c3e50'),
-                    spaceAfter=8,
-                    alignment=TA_CENTER,
-                    fontName='Helvetica-Bold'
-                )
-                
-                info_style = ParagraphStyle(
-                    'CustomInfo',
-                    parent=styles['Normal'],
-                    fontSize=8,
-                    textColor=colors.HexColor('#34495e'),
-                    spaceAfter=10,
-                    alignment=TA_CENTER,
-                    fontName='Helvetica'
-                )
-                
-                # Estilo para células com quebra de linha - COMPACTO
-                cell_style_normal = ParagraphStyle(
-                    'CellNormal',
-                    parent=styles['Normal'],
-                    fontSize=7,
-                    leading=9,  # Espaçamento entre linhas reduzido
-                    alignment=TA_LEFT,
-                    fontName='Helvetica'
-                )
-                
-                cell_style_bold = ParagraphStyle(
-                    'CellBold',
-                    parent=styles['Normal'],
-                    fontSize=7,
-                    leading=9,
-                    alignment=TA_LEFT,
-                    fontName='Helvetica-Bold'
-                )
-                
-                cell_style_center = ParagraphStyle(
-                    'CellCenter',
-                    parent=styles['Normal'],
-                    fontSize=7,
-                    leading=9,
-                    alignment=TA_CENTER,
-                    fontName='Helvetica'
-                )
-                
-                # Título
-                titulo = Paragraph("Sistema de Gerenciamento de Depósito", title_style)
-                elements.append(titulo)
-                
-                # Info do relatório
-                info = Paragraph(self.info_relatorio.text(), info_style)
-                elements.append(info)
-                
-                # Preparar dados da tabela
-                data = []
-                
-                # Headers
-                headers = []
-                for col in range(self.tabela_relatorio.columnCount()):
-                    header_item = self.tabela_relatorio.horizontalHeaderItem(col)
-                    if header_item:
-                        # Usar Paragraph para headers também
-                        header_text = header_item.text()
-                        header_para = Paragraph(f"<b>{header_text}</b>", cell_style_center)
-                        headers.append(header_para)
-                data.append(headers)
-                
-                # Dados - usar Paragraph para quebra automática
-                for row in range(self.tabela_relatorio.rowCount()):
-                    row_data = []
-                    for col in range(self.tabela_relatorio.columnCount()):
-                        item = self.tabela_relatorio.item(row, col)
-                        if item:
-                            text = item.text()
-                            
-                            # Verificar cor do texto para aplicar estilo
-                            color = item.foreground().color()
-                            
-                            # Determinar estilo e cor
-                            if color.name() in ['#ff0000', '#ff0000ff']:  # Vermelho
-                                styled_text = f'<font color="red"><b>{text}</b></font>'
-                                para = Paragraph(styled_text, cell_style_normal)
-                            elif color.name() in ['#006400', '#006400ff']:  # Verde escuro
-                                styled_text = f'<font color="green"><b>{text}</b></font>'
-                                para = Paragraph(styled_text, cell_style_normal)
-                            elif color.name() in ['#0000ff', '#0000ffff']:  # Azul
-                                styled_text = f'<font color="blue"><b>{text}</b></font>'
-                                para = Paragraph(styled_text, cell_style_normal)
-                            else:
-                                # Verificar se é número para centralizar
-                                if col == 0 or text.isdigit():
-                                    para = Paragraph(text, cell_style_center)
-                                else:
-                                    para = Paragraph(text, cell_style_normal)
-                            
-                            row_data.append(para)
-                        else:
-                            row_data.append(Paragraph("", cell_style_normal))
-                    data.append(row_data)
-                
-                # Criar tabela PDF com larguras de coluna apropriadas
-                # Calcular larguras baseadas no número de colunas
-                num_cols = self.tabela_relatorio.columnCount()
-                page_width = landscape(A4)[0] - 40  # Largura da página menos margens reduzidas
-                
-                # Distribuir larguras de forma inteligente
-                if num_cols == 2:  # Relatório geral
-                    col_widths = [page_width * 0.6, page_width * 0.4]
-                elif num_cols == 5:  # Estoque baixo, produtos em estoque
-                    col_widths = [
-                        page_width * 0.06,  # ID
-                        page_width * 0.38,  # Nome
-                        page_width * 0.20,  # Categoria
-                        page_width * 0.10,  # Quantidade
-                        page_width * 0.26   # Localização
-                    ]
-                elif num_cols == 6:  # Movimentações 12 meses
-                    col_widths = [
-                        page_width * 0.06,  # ID
-                        page_width * 0.36,  # Produto
-                        page_width * 0.18,  # Categoria
-                        page_width * 0.13,  # Entradas
-                        page_width * 0.13,  # Saídas
-                        page_width * 0.14   # Saldo
-                    ]
-                else:
-                    # Dividir igualmente se não for um dos casos acima
-                    col_widths = [page_width / num_cols] * num_cols
-                
-                pdf_table = Table(data, colWidths=col_widths, repeatRows=1)
-                
-                # Estilo da tabela - COMPACTO
-                table_style = TableStyle([
-                    # Header - padding reduzido
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-                    ('TOPPADDING', (0, 0), (-1, 0), 6),
-                    
-                    # Corpo da tabela - padding MUITO reduzido
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                    ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Alinhamento vertical no topo
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 7),
-                    ('TOPPADDING', (0, 1), (-1, -1), 3),     # Reduzido de 8 para 3
-                    ('BOTTOMPADDING', (0, 1), (-1, -1), 3),  # Reduzido de 8 para 3
-                    ('LEFTPADDING', (0, 0), (-1, -1), 4),    # Reduzido de 6 para 4
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 4),   # Reduzido de 6 para 4
-                    
-                    # Bordas mais finas
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                    
-                    # Linhas alternadas
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-                ])
-                
-                pdf_table.setStyle(table_style)
-                elements.append(pdf_table)
-                
-                # Rodapé compacto
-                elements.append(Spacer(1, 0.15 * inch))
-                rodape_text = f"Gerado em: {datetime.now().strftime('%d/%m/%Y as %H:%M:%S')}"
-                rodape_style = ParagraphStyle(
-                    'Rodape',
-                    parent=styles['Normal'],
-                    fontSize=7,
-                    textColor=colors.grey,
-                    alignment=TA_CENTER
-                )
-                rodape = Paragraph(rodape_text, rodape_style)
-                elements.append(rodape)
-                
-                # Gerar PDF
-                doc.build(elements)
-                
-                QMessageBox.information(self, "Sucesso", f"Relatório exportado para PDF!\n\n{arquivo}")
-            except Exception as e:
-                QMessageBox.critical(self, "Erro", f"Erro ao exportar para PDF:\n{str(e)}")
+            tipo, parametros = self.relatorio_atual
+            self.iniciar_exportacao(tipo, parametros, 'pdf', arquivo)
+    
+    def gerar_etiquetas(self):
+        """Folhas de etiquetas com código de barras dos produtos filtrados (todos, sem filtro)"""
+        if importlib.util.find_spec('reportlab') is None:
+            QMessageBox.critical(
+                self,
+                "Erro",
+                "Biblioteca ReportLab não instalada!\n\nInstale com: pip install reportlab"
+            )
+            return
+        
+        arquivo, _ = QFileDialog.getSaveFileName(
+            self,
+            "Gerar Etiquetas",
+            f"etiquetas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+            "Arquivo PDF (*.pdf)"
+        )
+        
+        if arquivo:
+            parametros = {
+                'categoria': self.etiquetas_categoria.text().strip(),
+                'localizacao': self.etiquetas_local.text().strip(),
+                'busca': self.etiquetas_busca.text().strip(),
+                'copias': self.etiquetas_copias.value(),
+            }
+            self.iniciar_exportacao('etiquetas', parametros, 'pdf', arquivo)
+    
+    def iniciar_exportacao(self, tipo, parametros, formato, arquivo):
+        """Envia o relatório para o pool de exportação e acompanha na lista"""
+        if tipo == 'estoque_em':
+            # Os processos de exportação só leem; os meses pendentes são fechados aqui
+            self.deposito.fechar_meses()
+        
+        try:
+            tarefa_id = self.exportacoes.enviar(tipo, parametros, formato, arquivo)
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao iniciar exportação:\n{str(e)}")
+            return
+        
+        linha = self.tabela_exportacoes.rowCount()
+        self.tabela_exportacoes.insertRow(linha)
+        
+        item_arquivo = QTableWidgetItem(os.path.basename(arquivo))
+        item_arquivo.setData(Qt.UserRole, tarefa_id)
+        item_arquivo.setToolTip(arquivo)
+        self.tabela_exportacoes.setItem(linha, 0, item_arquivo)
+        
+        item_formato = QTableWidgetItem(formato.upper())
+        item_formato.setTextAlignment(Qt.AlignCenter)
+        self.tabela_exportacoes.setItem(linha, 1, item_formato)
+        
+        barra = QProgressBar()
+        barra.setRange(0, 100)
+        self.tabela_exportacoes.setCellWidget(linha, 2, barra)
+        self.tabela_exportacoes.setItem(linha, 3, QTableWidgetItem("Na fila"))
+        
+        self.exportacoes_pendentes[tarefa_id] = linha
+        self.timer_exportacoes.start()
+    
+    def atualizar_exportacoes(self):
+        for tarefa_id, linha in list(self.exportacoes_pendentes.items()):
+            tarefa = self.exportacoes.tarefas[tarefa_id]
+            status = tarefa.status()
+            
+            self.tabela_exportacoes.cellWidget(linha, 2).setValue(int(self.exportacoes.progresso_de(tarefa_id) * 100))
+            self.tabela_exportacoes.item(linha, 3).setText(status)
+            
+            if tarefa.futuro.done():
+                del self.exportacoes_pendentes[tarefa_id]
+                if status.startswith("Erro"):
+                    self.tabela_exportacoes.item(linha, 3).setForeground(Qt.red)
+                    QMessageBox.critical(
+                        self, "Erro", f"Erro ao exportar {tarefa.arquivo}:\n{tarefa.futuro.exception()}"
+                    )
+        
+        if not self.exportacoes_pendentes:
+            self.timer_exportacoes.stop()
+    
+    def cancelar_exportacao(self):
+        linha = self.tabela_exportacoes.currentRow()
+        if linha < 0:
+            QMessageBox.warning(self, "Atenção", "Selecione uma exportação!")
+            return
+        
+        tarefa_id = self.tabela_exportacoes.item(linha, 0).data(Qt.UserRole)
+        if tarefa_id in self.exportacoes_pendentes:
+            self.exportacoes.cancelar(tarefa_id)
+            self.atualizar_exportacoes()
+    
+    def closeEvent(self, event):
+        if self.exportacoes.ativas():
+            resposta = QMessageBox.question(
+                self,
+                "Confirmação",
+                "Há exportações em andamento, que serão canceladas.\n\nDeseja sair?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if resposta == QMessageBox.No:
+                event.ignore()
+                return
+        
+        self.timer_exportacoes.stop()
+        self.exportacoes.encerrar()
+        event.accept()
     
     def fazer_backup(self):
         arquivo, _ = QFileDialog.getSaveFileName(
@@ -1866,7 +2298,7 @@ Licença GPLv3""")
         
         if arquivo:
             try:
-                shutil.copy2(self.deposito.db_name, arquivo)
+                self.deposito.copiar_banco(arquivo)
                 QMessageBox.information(self, "Sucesso", f"Backup realizado!\n\n{arquivo}")
             except Exception as e:
                 QMessageBox.critical(self, "Erro", f"Erro ao fazer backup:\n{str(e)}")
@@ -1891,17 +2323,129 @@ Licença GPLv3""")
         )
         
         if arquivo:
-            try:
-                self.deposito.conectar().close()
-                shutil.copy2(arquivo, self.deposito.db_name)
-                
-                QMessageBox.information(self, "Sucesso", "Backup restaurado com sucesso!")
-                
-                self.atualizar_lista_produtos()
-                self.atualizar_movimentacoes()
-                
-            except Exception as e:
-                QMessageBox.critical(self, "Erro", f"Erro ao restaurar:\n{str(e)}")
+            self.btn_restaurar.setEnabled(False)
+            self.label_status_restauracao.setText("Validando backup...")
+            
+            self.worker_restauracao = WorkerRestauracao(self.deposito, arquivo)
+            self.worker_restauracao.concluido.connect(self.concluir_restauracao)
+            self.worker_restauracao.start()
+    
+    def concluir_restauracao(self, valido, resultado):
+        self.btn_restaurar.setEnabled(True)
+        self.label_status_restauracao.setText("")
+        
+        if not valido:
+            QMessageBox.critical(self, "Erro", f"Backup inválido!\n\n{resultado}")
+            return
+        
+        self.monitor.fechar()
+        try:
+            self.deposito.efetivar_restauracao(resultado)
+        except (sqlite3.Error, OSError) as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao restaurar:\n{str(e)}")
+            return
+        finally:
+            self.monitor.reabrir()
+        
+        self.recarregar_dados()
+        QMessageBox.information(self, "Sucesso", "Backup restaurado com sucesso!")
+    
+    def arquivar_movimentacoes(self):
+        meses = self.meses_arquivamento.value()
+        resposta = QMessageBox.question(
+            self,
+            "Confirmação",
+            f"Movimentações com mais de {meses} meses serão movidas para arquivos anuais.\n\nDeseja continuar?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        
+        if resposta == QMessageBox.No:
+            return
+        
+        self.btn_arquivar.setEnabled(False)
+        self.worker_arquivamento = WorkerArquivamento(self.deposito, meses)
+        self.worker_arquivamento.concluido.connect(self.concluir_arquivamento)
+        self.worker_arquivamento.start()
+    
+    def concluir_arquivamento(self, sucesso, mensagem):
+        self.btn_arquivar.setEnabled(True)
+        
+        if sucesso:
+            QMessageBox.information(self, "Sucesso", mensagem)
+        else:
+            QMessageBox.critical(self, "Erro", f"Erro ao arquivar:\n{mensagem}")
+    
+    def verificar_consistencia(self, incremental):
+        reparar = self.check_reparar.isChecked()
+        if reparar:
+            resposta = QMessageBox.question(
+                self,
+                "Confirmação",
+                "O estoque dos produtos e das localizações divergentes será substituído pelo saldo das "
+                "movimentações.\n\n"
+                "Deseja continuar?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if resposta == QMessageBox.No:
+                return
+        
+        self.btn_verificar_tudo.setEnabled(False)
+        self.btn_verificar_alteracoes.setEnabled(False)
+        self.label_consistencia.setText("Verificando...")
+        
+        self.worker_consistencia = WorkerConsistencia(self.deposito, incremental, reparar)
+        self.worker_consistencia.concluido.connect(self.concluir_verificacao)
+        self.worker_consistencia.start()
+    
+    def concluir_verificacao(self, sucesso, resultado):
+        self.btn_verificar_tudo.setEnabled(True)
+        self.btn_verificar_alteracoes.setEnabled(True)
+        
+        if not sucesso:
+            self.label_consistencia.setText("")
+            QMessageBox.critical(self, "Erro", f"Erro ao verificar:\n{resultado}")
+            return
+        
+        divergencias = resultado['divergencias']
+        locais = resultado['divergencias_locais']
+        self.label_consistencia.setText(
+            f"{resultado['verificados']} produto(s) verificado(s) em "
+            f"{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}: {len(divergencias) + len(locais)} divergência(s), "
+            f"{resultado['reparados']} corrigida(s)"
+        )
+        
+        if not divergencias and not locais:
+            QMessageBox.information(self, "Consistência", "Estoque consistente com as movimentações!")
+            return
+        
+        linhas = [f"#{produto_id} {nome}: estoque {estoque}, movimentações {saldo}"
+                  for produto_id, nome, estoque, saldo in divergencias]
+        linhas += [f"#{produto_id} {nome} em {local or 'sem localização'}: estoque {estoque}, movimentações {saldo}"
+                   for produto_id, nome, local, estoque, saldo in locais]
+        total = len(linhas)
+        if total > 20:
+            linhas = linhas[:20] + [f"... e mais {total - 20}"]
+        acao = "corrigida(s)" if resultado['reparados'] else "encontrada(s)"
+        QMessageBox.warning(self, "Consistência",
+                            f"{total} divergência(s) {acao}:\n\n" + "\n".join(linhas))
+    
+    def abrir_inventario(self):
+        dialog = DialogInventario(self)
+        dialog.exec_()
+    
+    def recarregar_dados(self):
+        """Atualiza todas as abas após o banco ser substituído"""
+        self.agregador.reiniciar()
+        self.atualizar_dashboard()
+        self.atualizar_lista_produtos()
+        self.atualizar_movimentacoes()
+        self.tabela_relatorio.clear()
+        self.tabela_relatorio.setRowCount(0)
+        self.tabela_relatorio.setColumnCount(0)
+        self.info_relatorio.setText("")
+        self.relatorio_atual = None
 
 
 def main():
@@ -0,0 +1,793 @@
+"""Relatórios e exportações para XLSX/PDF executadas fora da interface.
+
+As exportações rodam em um pool de processos: cada processo abre o banco
+somente para leitura, monta o relatório e grava o arquivo, informando o
+progresso por um dicionário compartilhado. A interface só acompanha as
+tarefas, então várias exportações grandes podem rodar em paralelo.
+
+A exportação completa ('completo') grava todos os relatórios e o razão de
+movimentações em um único XLSX, a partir de uma só transação de leitura.
+As etiquetas ('etiquetas') são folhas PDF com o código de barras de cada
+produto filtrado.
+"""
+import multiprocessing
+import os
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Callable, List, Optional
+
+from gerenciador import GerenciadorDeposito, GerenciadorLeitura
+
+
+# `cores` mapeia o índice da coluna para 'vermelho', 'verde' ou 'azul'
+Relatorio = namedtuple('Relatorio', 'titulo cabecalhos linhas cores mensagem_vazia')
+
+CABECALHOS_PRODUTO = ['ID', 'PRODUTO', 'CATEGORIA', 'QUANTIDADE', 'LOCALIZACAO']
+CABECALHOS_MOVIMENTACAO = ['ID', 'PRODUTO', 'TIPO', 'QUANTIDADE', 'DATA', 'OBSERVACAO']
+
+# Abas da exportação completa, na ordem em que são gravadas
+ABAS_COMPLETAS = (
+    ('Resumo Geral', 'geral'),
+    ('Estoque Baixo', 'estoque_baixo'),
+    ('Em Estoque', 'em_estoque'),
+    ('Movimentacoes 12 Meses', 'movimentacoes_12_meses'),
+)
+
+# Folha A4 de etiquetas ('etiquetas'), em mm: 3 x 10 etiquetas de 63,5 x 25,4
+ETIQUETAS_COLUNAS = 3
+ETIQUETAS_LINHAS = 10
+ETIQUETA_LARGURA = 63.5
+ETIQUETA_ALTURA = 25.4
+ETIQUETAS_ESPACO = 2.5
+ETIQUETAS_MARGEM_ESQUERDA = 7.25
+ETIQUETAS_MARGEM_SUPERIOR = 21.5
+
+
+class ExportacaoCancelada(Exception):
+    pass
+
+
+def _relatorio_geral(deposito: GerenciadorDeposito, parametros: dict) -> Relatorio:
+    relatorio = deposito.relatorio_estoque()
+    
+    linhas = [
+        ['Total de Produtos Cadastrados', str(relatorio['total_produtos'])],
+        ['Total de Itens em Estoque', str(relatorio['total_itens'])],
+        ['', ''],  # Linha em branco
+        ['CATEGORIA', 'PRODUTOS / ITENS'],
+    ]
+    
+    if relatorio['por_categoria']:
+        for cat in relatorio['por_categoria']:
+            categoria = cat[0] or "Sem categoria"
+            linhas.append([categoria, f"{cat[1]} produto(s) / {cat[2]} item(ns)"])
+    else:
+        linhas.append(['Sem categorias', '-'])
+    
+    return Relatorio(
+        f"RELATÓRIO GERAL DO ESTOQUE - Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}",
+        ['METRICA', 'VALOR'], linhas, {}, ""
+    )
+
+
+def _linhas_produtos(produtos) -> List[List[str]]:
+    return [[str(p[0]), p[1], p[2] or 'N/A', str(p[3]), p[4] or 'N/A'] for p in produtos]
+
+
+def _titulo_local(parametros: dict) -> str:
+    """Complemento do título dos relatórios por localização ('por_local' e 'local')"""
+    if parametros.get('local') is not None:
+        return f" - LOCAL {parametros['local'].upper() or 'SEM LOCALIZACAO'}"
+    return " POR LOCALIZACAO" if parametros.get('por_local') else ""
+
+
+def _relatorio_estoque_baixo(deposito: GerenciadorDeposito, parametros: dict) -> Relatorio:
+    # Cada produto é comparado com o próprio ponto de pedido
+    if parametros.get('por_local') or parametros.get('local') is not None:
+        produtos = deposito.estoque_baixo_por_local(local=parametros.get('local'))
+        cabecalhos, linhas = CABECALHOS_PRODUTO, _linhas_produtos(produtos)
+    else:
+        produtos = deposito.produtos_estoque_baixo()
+        cabecalhos = CABECALHOS_PRODUTO + ['MINIMO', 'PONTO PEDIDO']
+        linhas = [linha + [str(p[5]), str(p[6])] for linha, p in zip(_linhas_produtos(produtos), produtos)]
+    return Relatorio(
+        f"PRODUTOS COM ESTOQUE BAIXO (<= PONTO DE PEDIDO){_titulo_local(parametros)} - "
+        f"Total: {len(produtos)} produto(s)",
+        cabecalhos, linhas, {3: 'vermelho'},
+        "Nenhum produto com estoque baixo!"
+    )
+
+
+def _relatorio_em_estoque(deposito: GerenciadorDeposito, parametros: dict) -> Relatorio:
+    if parametros.get('por_local') or parametros.get('local') is not None:
+        produtos = deposito.em_estoque_por_local(parametros.get('local'))
+    else:
+        produtos = deposito.produtos_em_estoque()
+    total_itens = sum(p[3] for p in produtos)
+    return Relatorio(
+        f"PRODUTOS EM ESTOQUE{_titulo_local(parametros)} - Total: {len(produtos)} produto(s) / "
+        f"{total_itens} item(ns)",
+        CABECALHOS_PRODUTO, _linhas_produtos(produtos), {3: 'verde'},
+        "Nenhum produto em estoque!"
+    )
+
+
+def _inicio_12_meses() -> str:
+    return (date.today() - timedelta(days=365)).strftime('%Y-%m-%d')
+
+
+def _relatorio_movimentacoes_12_meses(deposito: GerenciadorDeposito, parametros: dict) -> Relatorio:
+    data_limite = _inicio_12_meses()
+    produtos = deposito.resumo_movimentacoes(data_limite)
+    
+    total_entradas = sum(p[3] for p in produtos)
+    total_saidas = sum(p[4] for p in produtos)
+    periodo = f"{data_limite} ate {date.today().strftime('%Y-%m-%d')}"
+    
+    return Relatorio(
+        f"MOVIMENTACOES DOS ULTIMOS 12 MESES ({periodo}) - "
+        f"Produtos: {len(produtos)} | Entradas: {total_entradas} | Saidas: {total_saidas} | "
+        f"Saldo: {total_entradas - total_saidas}",
+        ['ID', 'PRODUTO', 'CATEGORIA', 'ENTRADAS', 'SAIDAS', 'SALDO ATUAL'],
+        [[str(p[0]), p[1], p[2] or 'N/A', str(p[3]), str(p[4]), str(p[5])] for p in produtos],
+        {3: 'verde', 4: 'vermelho', 5: 'azul'},
+        "Nenhuma movimentacao nos ultimos 12 meses!"
+    )
+
+
+def _relatorio_estoque_em(deposito: GerenciadorDeposito, parametros: dict) -> Relatorio:
+    produtos = deposito.estoque_em(parametros['data'])
+    total_itens = sum(p[3] for p in produtos)
+    data = datetime.strptime(parametros['data'], '%Y-%m-%d').strftime('%d/%m/%Y')
+    return Relatorio(
+        f"ESTOQUE EM {data} - Total: {len(produtos)} produto(s) / {total_itens} item(ns)",
+        CABECALHOS_PRODUTO, _linhas_produtos(produtos), {3: 'azul'},
+        "Nenhum produto cadastrado nesta data!"
+    )
+
+
+def _relatorio_inventario(deposito: GerenciadorDeposito, parametros: dict) -> Relatorio:
+    inventario_id = parametros['inventario_id']
+    diferencas = deposito.diferencas_inventario(inventario_id)
+    total = sum(d[5] for d in diferencas)
+    return Relatorio(
+        f"DIVERGENCIAS DO INVENTARIO #{inventario_id} - Produtos: {len(diferencas)} | "
+        f"Diferenca total: {total:+d} item(ns)",
+        ['ID', 'PRODUTO', 'LOCALIZACAO', 'ESTOQUE', 'CONTADO', 'DIFERENCA'],
+        [[str(d[0]), d[1], d[2] or 'N/A', str(d[3]), str(d[4]), f"{d[5]:+d}"] for d in diferencas],
+        {4: 'azul', 5: 'vermelho'},
+        "Nenhuma divergencia no inventario!"
+    )
+
+
+def _relatorio_alteracoes_cadastro(deposito: GerenciadorDeposito, parametros: dict) -> Relatorio:
+    alteracoes = deposito.alteracoes_cadastro(parametros['data_inicio'], parametros.get('data_fim'))
+    # Uma linha por campo alterado
+    linhas = [
+        [data, str(produto_id), nome, usuario or '', campo, str(antes), str(depois)]
+        for data, produto_id, nome, usuario, campos in alteracoes
+        for campo, (antes, depois) in campos.items()
+    ]
+    data = datetime.strptime(parametros['data_inicio'], '%Y-%m-%d').strftime('%d/%m/%Y')
+    return Relatorio(
+        f"ALTERACOES DE CADASTRO DESDE {data} - Edicoes: {len(alteracoes)} | Campos: {len(linhas)}",
+        ['DATA', 'ID', 'PRODUTO', 'USUARIO', 'CAMPO', 'ANTES', 'DEPOIS'],
+        linhas, {6: 'azul'},
+        "Nenhuma alteracao de cadastro no periodo!"
+    )
+
+
+RELATORIOS = {
+    'geral': _relatorio_geral,
+    'estoque_baixo': _relatorio_estoque_baixo,
+    'em_estoque': _relatorio_em_estoque,
+    'movimentacoes_12_meses': _relatorio_movimentacoes_12_meses,
+    'estoque_em': _relatorio_estoque_em,
+    'inventario': _relatorio_inventario,
+    'alteracoes_cadastro': _relatorio_alteracoes_cadastro,
+}
+
+
+def montar_relatorio(deposito: GerenciadorDeposito, tipo: str, parametros: Optional[dict] = None) -> Relatorio:
+    return RELATORIOS[tipo](deposito, parametros or {})
+
+
+def _estilos_xlsx() -> dict:
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    
+    lado = Side(style='thin')
+    return {
+        'titulo_font': Font(bold=True, size=14),
+        'titulo_fill': PatternFill(start_color="ecf0f1", end_color="ecf0f1", fill_type="solid"),
+        'header_fill': PatternFill(start_color="34495e", end_color="34495e", fill_type="solid"),
+        'header_font': Font(bold=True, color="FFFFFF", size=12),
+        'border': Border(left=lado, right=lado, top=lado, bottom=lado),
+        'wrap': Alignment(horizontal='left', vertical='top', wrap_text=True),
+        'center': Alignment(horizontal='center', vertical='center', wrap_text=True),
+        'cores': {
+            'vermelho': Font(bold=True, color="c0392b"),
+            'verde': Font(bold=True, color="27ae60"),
+            'azul': Font(bold=True, color="2980b9"),
+        },
+    }
+
+
+def gravar_xlsx(relatorio: Relatorio, arquivo: str, informar: Callable[[float], None]):
+    import openpyxl
+    
+    colunas = len(relatorio.cabecalhos)
+    linhas = relatorio.linhas or [[relatorio.mensagem_vazia]]
+    
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Relatorio"
+    
+    estilos = _estilos_xlsx()
+    border = estilos['border']
+    wrap_alignment = estilos['wrap']
+    center_alignment = estilos['center']
+    fontes_cores = estilos['cores']
+    
+    # Título do relatório
+    ws.merge_cells('A1:' + chr(64 + colunas) + '1')
+    cell_titulo = ws['A1']
+    cell_titulo.value = relatorio.titulo
+    cell_titulo.font = estilos['titulo_font']
+    cell_titulo.alignment = center_alignment
+    cell_titulo.fill = estilos['titulo_fill']
+    ws.row_dimensions[1].height = 30
+    
+    # Cabeçalhos
+    for col, cabecalho in enumerate(relatorio.cabecalhos):
+        cell = ws.cell(row=2, column=col + 1)
+        cell.value = cabecalho
+        cell.fill = estilos['header_fill']
+        cell.font = estilos['header_font']
+        cell.alignment = center_alignment
+        cell.border = border
+    ws.row_dimensions[2].height = 25
+    
+    # Dados
+    max_lengths = {}  # Para calcular largura das colunas
+    
+    for row, linha in enumerate(linhas):
+        if row % 200 == 0:
+            informar(row / len(linhas))
+        
+        for col, texto in enumerate(linha):
+            cell = ws.cell(row=row + 3, column=col + 1)
+            cell.value = texto
+            cell.border = border
+            
+            # Centralizar números, alinhar à esquerda textos
+            if col == 0 or texto.isdigit():
+                cell.alignment = center_alignment
+            else:
+                cell.alignment = wrap_alignment
+            
+            if relatorio.linhas and col in relatorio.cores:
+                cell.font = fontes_cores[relatorio.cores[col]]
+            
+            text_length = len(texto)
+            if col not in max_lengths or text_length > max_lengths[col]:
+                max_lengths[col] = text_length
+            
+            # Textos longos: aproximadamente 15 de altura por linha
+            if text_length > 50:
+                estimated_lines = (text_length // 50) + 1
+                current_height = ws.row_dimensions[row + 3].height or 15
+                ws.row_dimensions[row + 3].height = max(current_height, estimated_lines * 15)
+    
+    # Largura das colunas entre 15 e 60 caracteres
+    for col in range(1, colunas + 1):
+        if (col - 1) in max_lengths:
+            optimal_width = min(max(max_lengths[col - 1] + 2, 15), 60)
+        else:
+            optimal_width = 20
+        ws.column_dimensions[chr(64 + col)].width = optimal_width
+    
+    # Congelar painéis (primeira linha e cabeçalho)
+    ws.freeze_panes = 'A3'
+    
+    informar(1.0)
+    wb.save(arquivo)
+
+
+def gravar_pdf(relatorio: Relatorio, arquivo: str, informar: Callable[[float], None]):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+    
+    doc = SimpleDocTemplate(
+        arquivo,
+        pagesize=landscape(A4),
+        rightMargin=20,
+        leftMargin=20,
+        topMargin=25,
+        bottomMargin=25
+    )
+    
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=14,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=8,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+    info_style = ParagraphStyle(
+        'CustomInfo',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.HexColor('#34495e'),
+        spaceAfter=10,
+        alignment=TA_CENTER,
+        fontName='Helvetica'
+    )
+    cell_style_normal = ParagraphStyle(
+        'CellNormal',
+        parent=styles['Normal'],
+        fontSize=7,
+        leading=9,
+        alignment=TA_LEFT,
+        fontName='Helvetica'
+    )
+    cell_style_center = ParagraphStyle(
+        'CellCenter',
+        parent=styles['Normal'],
+        fontSize=7,
+        leading=9,
+        alignment=TA_CENTER,
+        fontName='Helvetica'
+    )
+    cores_fonte = {'vermelho': 'red', 'verde': 'green', 'azul': 'blue'}
+    
+    elements = [
+        Paragraph("Sistema de Gerenciamento de Depósito", title_style),
+        Paragraph(relatorio.titulo, info_style),
+    ]
+    
+    colunas = len(relatorio.cabecalhos)
+    data = [[Paragraph(f"<b>{cabecalho}</b>", cell_style_center) for cabecalho in relatorio.cabecalhos]]
+    
+    # Montar as células é ~30% do trabalho; o restante é o build do documento
+    linhas = relatorio.linhas or [[relatorio.mensagem_vazia] + [""] * (colunas - 1)]
+    for row, linha in enumerate(linhas):
+        if row % 200 == 0:
+            informar(0.3 * row / len(linhas))
+        
+        row_data = []
+        for col, text in enumerate(linha):
+            if relatorio.linhas and col in relatorio.cores:
+                para = Paragraph(f'<font color="{cores_fonte[relatorio.cores[col]]}"><b>{text}</b></font>',
+                                 cell_style_normal)
+            elif col == 0 or text.isdigit():
+                para = Paragraph(text, cell_style_center)
+            else:
+                para = Paragraph(text, cell_style_normal)
+            row_data.append(para)
+        data.append(row_data)
+    
+    page_width = landscape(A4)[0] - 40  # Largura da página menos margens reduzidas
+    if colunas == 2:  # Relatório geral
+        col_widths = [page_width * 0.6, page_width * 0.4]
+    elif colunas == 5:  # Estoque baixo, produtos em estoque, estoque em data
+        col_widths = [page_width * p for p in (0.06, 0.38, 0.20, 0.10, 0.26)]
+    elif colunas == 6:  # Movimentações 12 meses
+        col_widths = [page_width * p for p in (0.06, 0.36, 0.18, 0.13, 0.13, 0.14)]
+    else:
+        col_widths = [page_width / colunas] * colunas
+    
+    pdf_table = Table(data, colWidths=col_widths, repeatRows=1)
+    pdf_table.setStyle(TableStyle([
+        # Cabeçalho
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+        ('TOPPADDING', (0, 0), (-1, 0), 6),
+        
+        # Corpo da tabela
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 7),
+        ('TOPPADDING', (0, 1), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 3),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ]))
+    elements.append(pdf_table)
+    
+    elements.append(Spacer(1, 0.15 * inch))
+    rodape_style = ParagraphStyle(
+        'Rodape',
+        parent=styles['Normal'],
+        fontSize=7,
+        textColor=colors.grey,
+        alignment=TA_CENTER
+    )
+    elements.append(Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y as %H:%M:%S')}", rodape_style))
+    
+    estimativa = {'total': None}
+    
+    def ao_progredir(tipo, valor):
+        if tipo == 'SIZE_EST':
+            estimativa['total'] = valor
+        elif tipo == 'PROGRESS' and estimativa['total']:
+            informar(0.3 + 0.7 * min(valor / estimativa['total'], 1.0))
+    
+    doc.setProgressCallBack(ao_progredir)
+    doc.build(elements)
+    informar(1.0)
+
+
+def _aba_write_only(wb, nome: str, titulo: str, cabecalhos: List[str], larguras: List[int], estilos: dict):
+    """Cria a aba com título e cabeçalho; as linhas são acrescentadas com ws.append"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+    
+    ws = wb.create_sheet(nome)
+    # No modo write-only larguras e painéis precisam ser definidos antes da primeira linha
+    for col, largura in enumerate(larguras, 1):
+        ws.column_dimensions[get_column_letter(col)].width = largura
+    ws.freeze_panes = 'A3'
+    
+    cell_titulo = WriteOnlyCell(ws, titulo)
+    cell_titulo.font = estilos['titulo_font']
+    cell_titulo.fill = estilos['titulo_fill']
+    ws.append([cell_titulo])
+    
+    linha = []
+    for cabecalho in cabecalhos:
+        cell = WriteOnlyCell(ws, cabecalho)
+        cell.fill = estilos['header_fill']
+        cell.font = estilos['header_font']
+        cell.alignment = estilos['center']
+        cell.border = estilos['border']
+        linha.append(cell)
+    ws.append(linha)
+    return ws
+
+
+def gravar_xlsx_completo(deposito: GerenciadorLeitura, arquivo: str, informar: Callable[[float], None],
+                         parametros: Optional[dict] = None):
+    """Todos os relatórios e o razão de movimentações do período em um só XLSX.
+    
+    O período vem de `data_inicio` e `data_fim` ('YYYY-MM-DD') em `parametros`;
+    sem eles, os últimos 12 meses até hoje. As consultas rodam em uma única
+    transação de leitura, então as abas são coerentes entre si. Cada aba é
+    gravada em modo write-only, e as movimentações passam do cursor direto
+    para o arquivo.
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    
+    parametros = parametros or {}
+    data_inicio = parametros.get('data_inicio') or _inicio_12_meses()
+    data_fim = parametros.get('data_fim') or date.today().strftime('%Y-%m-%d')
+    estilos = _estilos_xlsx()
+    wb = openpyxl.Workbook(write_only=True)
+    
+    with deposito.sessao(data_inicio):
+        relatorios = [(nome, montar_relatorio(deposito, tipo)) for nome, tipo in ABAS_COMPLETAS]
+        total_movimentacoes = deposito.contar_movimentacoes(data_inicio=data_inicio, data_fim=data_fim)
+        
+        total = sum(len(relatorio.linhas) for _, relatorio in relatorios) + total_movimentacoes
+        gravadas = 0
+        informar(0.0)
+        
+        for nome, relatorio in relatorios:
+            # Largura de cada coluna pelo maior texto, entre 15 e 60 caracteres
+            larguras = [
+                min(max(max((len(linha[col]) for linha in relatorio.linhas), default=0) + 2, 15), 60)
+                for col in range(len(relatorio.cabecalhos))
+            ]
+            ws = _aba_write_only(wb, nome, relatorio.titulo, relatorio.cabecalhos, larguras, estilos)
+            
+            if not relatorio.linhas:
+                ws.append([relatorio.mensagem_vazia])
+            
+            for linha in relatorio.linhas:
+                celulas = []
+                for col, texto in enumerate(linha):
+                    cell = WriteOnlyCell(ws, texto)
+                    cell.border = estilos['border']
+                    cell.alignment = estilos['center'] if col == 0 or texto.isdigit() else estilos['wrap']
+                    if col in relatorio.cores:
+                        cell.font = estilos['cores'][relatorio.cores[col]]
+                    celulas.append(cell)
+                ws.append(celulas)
+                
+                gravadas += 1
+                if gravadas % 500 == 0:
+                    informar(gravadas / total)
+        
+        periodo = f"{data_inicio} ate {data_fim}"
+        ws = _aba_write_only(
+            wb, "Movimentacoes", f"MOVIMENTACOES ({periodo}) - Total: {total_movimentacoes}",
+            CABECALHOS_MOVIMENTACAO, [10, 45, 12, 14, 20, 45], estilos
+        )
+        # Sem estilo por célula: o razão pode ter centenas de milhares de linhas
+        for movimentacao in deposito.iter_movimentacoes(data_inicio=data_inicio, data_fim=data_fim):
+            ws.append(movimentacao)
+            
+            gravadas += 1
+            if gravadas % 500 == 0:
+                informar(gravadas / total)
+    
+    informar(1.0)
+    wb.save(arquivo)
+
+
+# Codificação EAN-13: dígitos da esquerda em L ou G conforme o primeiro dígito; os da direita em R
+EAN_L = ('0001101', '0011001', '0010011', '0111101', '0100011', '0110001', '0101111', '0111011', '0110111', '0001011')
+EAN_PARIDADE = ('LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG', 'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL')
+
+
+def _ean13_valido(codigo: str) -> bool:
+    if len(codigo) != 13 or not codigo.isdigit():
+        return False
+    soma = sum(int(digito) * (3 if i % 2 else 1) for i, digito in enumerate(codigo[:12]))
+    return (10 - soma % 10) % 10 == int(codigo[12])
+
+
+def _modulos_ean13(codigo: str) -> str:
+    """Os 95 módulos ('1' = barra) de um EAN-13 válido, com as guardas"""
+    esquerda = ""
+    for paridade, digito in zip(EAN_PARIDADE[int(codigo[0])], codigo[1:7]):
+        padrao = EAN_L[int(digito)]
+        # G é o R (complemento do L) espelhado
+        esquerda += padrao if paridade == 'L' else padrao.translate(str.maketrans('01', '10'))[::-1]
+    direita = "".join(EAN_L[int(digito)].translate(str.maketrans('01', '10')) for digito in codigo[7:])
+    return "101" + esquerda + "01010" + direita + "101"
+
+
+def _trechos_barras(modulos: str) -> List[tuple]:
+    """(início, fim) de cada sequência de '1' seguidos"""
+    trechos = []
+    inicio = None
+    for i, modulo in enumerate(modulos + "0"):
+        if modulo == "1" and inicio is None:
+            inicio = i
+        elif modulo == "0" and inicio is not None:
+            trechos.append((inicio, i))
+            inicio = None
+    return trechos
+
+
+def gravar_etiquetas(deposito: GerenciadorLeitura, arquivo: str, informar: Callable[[float], None],
+                     parametros: dict):
+    """Folhas de etiquetas (nome, código de barras e localização) dos produtos filtrados.
+    
+    `parametros` aceita 'categoria', 'localizacao', 'busca' e 'copias' (por
+    produto). Os produtos vêm do cursor em lotes e cada página vai para o
+    canvas assim que fica cheia; o desenho de cada código de barras é gravado
+    uma vez como XObject do PDF e reaproveitado nas cópias. Códigos EAN-13
+    válidos saem como EAN-13 (desenhado direto em retângulos, bem mais rápido
+    que os widgets do reportlab), os demais como Code128; produtos sem código
+    ganham etiqueta só com o texto.
+    """
+    from reportlab.graphics.barcode.code128 import Code128
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+    
+    filtros = {chave: (parametros.get(chave) or "").strip().upper() or None
+               for chave in ('categoria', 'localizacao')}
+    busca = (parametros.get('busca') or "").strip() or None
+    copias = max(1, int(parametros.get('copias', 1)))
+    
+    largura, altura = ETIQUETA_LARGURA * mm, ETIQUETA_ALTURA * mm
+    margem = 2 * mm
+    largura_codigo = largura - 2 * margem
+    por_pagina = ETIQUETAS_COLUNAS * ETIQUETAS_LINHAS
+    
+    total = deposito.contar_produtos(busca=busca, **filtros) * copias
+    informar(0.0)
+    
+    pdf = canvas.Canvas(arquivo, pagesize=A4, pageCompression=1)
+    pdf.setTitle("Etiquetas")
+    # codigo_barras -> nome do XObject com o desenho já gravado no PDF
+    desenhos = {}
+    
+    def desenhar_ean13(codigo: str):
+        modulo = 0.9
+        topo = 8 + 10 * mm
+        # Barras contíguas viram um só retângulo, todos em um único caminho;
+        # as guardas descem mais que as demais
+        caminho = pdf.beginPath()
+        for inicio, fim in _trechos_barras(_modulos_ean13(codigo)):
+            base = 5 if inicio < 3 or 45 <= inicio < 50 or inicio >= 92 else 8
+            caminho.rect(inicio * modulo, base, (fim - inicio) * modulo, topo - base)
+        pdf.drawPath(caminho, stroke=0, fill=1)
+        pdf.setFont("Helvetica", 7)
+        pdf.drawCentredString(95 * modulo / 2, 1.5, codigo)
+    
+    def desenho_codigo(codigo: str) -> str:
+        nome = desenhos.get(codigo)
+        if nome is None:
+            nome = desenhos[codigo] = f"CB{len(desenhos)}"
+            pdf.beginForm(nome)
+            if _ean13_valido(codigo):
+                desenhar_ean13(codigo)
+            else:
+                barras = Code128(codigo, barHeight=10 * mm, barWidth=0.8, humanReadable=True, fontSize=7, quiet=0)
+                escala = min(1.0, largura_codigo / barras.width)
+                pdf.scale(escala, escala)
+                # Texto abaixo da origem, como o do EAN-13
+                barras.drawOn(pdf, 0, 8)
+            pdf.endForm()
+        return nome
+    
+    def texto_ajustado(texto: str, fonte: str, tamanho: float) -> str:
+        while texto and stringWidth(texto, fonte, tamanho) > largura - 2 * margem:
+            texto = texto[:-1]
+        return texto
+    
+    feitas = 0
+    for produto in deposito.iter_produtos(filtros['categoria'], localizacao=filtros['localizacao'], busca=busca):
+        for _ in range(copias):
+            posicao = feitas % por_pagina
+            if feitas and posicao == 0:
+                pdf.showPage()
+            coluna, linha = posicao % ETIQUETAS_COLUNAS, posicao // ETIQUETAS_COLUNAS
+            x = (ETIQUETAS_MARGEM_ESQUERDA + coluna * (ETIQUETA_LARGURA + ETIQUETAS_ESPACO)) * mm
+            y = A4[1] - (ETIQUETAS_MARGEM_SUPERIOR + (linha + 1) * ETIQUETA_ALTURA) * mm
+            
+            pdf.setFont("Helvetica-Bold", 8)
+            pdf.drawString(x + margem, y + altura - margem - 7, texto_ajustado(produto.nome, "Helvetica-Bold", 8))
+            pdf.setFont("Helvetica", 6)
+            pdf.drawString(x + margem, y + margem,
+                           texto_ajustado(f"ID {produto.id}  {produto.localizacao or ''}", "Helvetica", 6))
+            
+            if produto.codigo_barras:
+                pdf.saveState()
+                pdf.translate(x + margem, y + margem + 7)
+                pdf.doForm(desenho_codigo(produto.codigo_barras))
+                pdf.restoreState()
+            else:
+                pdf.drawString(x + margem, y + altura / 2, "SEM CODIGO DE BARRAS")
+            
+            feitas += 1
+            if feitas % 200 == 0:
+                informar(0.9 * feitas / total)
+    
+    if not feitas:
+        pdf.setFont("Helvetica", 12)
+        pdf.drawString(20 * mm, A4[1] - 30 * mm, "Nenhum produto encontrado para os filtros informados.")
+    pdf.save()
+    informar(1.0)
+
+
+FORMATOS = {'xlsx': gravar_xlsx, 'pdf': gravar_pdf}
+
+
+def executar_exportacao(db_name: str, tipo: str, parametros: dict, formato: str, arquivo: str,
+                        tarefa_id: int, progresso, cancelamento) -> bool:
+    """Executada no processo do pool; retorna False se a tarefa foi cancelada"""
+    def informar(fracao: float):
+        if cancelamento.is_set():
+            raise ExportacaoCancelada()
+        progresso[tarefa_id] = fracao
+    
+    deposito = GerenciadorLeitura(db_name)
+    try:
+        if tipo == 'completo':
+            gravar_xlsx_completo(deposito, arquivo, informar, parametros)
+        elif tipo == 'etiquetas':
+            gravar_etiquetas(deposito, arquivo, informar, parametros)
+        else:
+            relatorio = montar_relatorio(deposito, tipo, parametros)
+            informar(0.0)
+            FORMATOS[formato](relatorio, arquivo, informar)
+    except ExportacaoCancelada:
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+        return False
+    finally:
+        deposito.fechar()
+    
+    return True
+
+
+class TarefaExportacao:
+    __slots__ = ('id', 'tipo', 'formato', 'arquivo', 'futuro', 'cancelamento')
+    
+    def __init__(self, tarefa_id, tipo, formato, arquivo, futuro, cancelamento):
+        self.id = tarefa_id
+        self.tipo = tipo
+        self.formato = formato
+        self.arquivo = arquivo
+        self.futuro = futuro
+        self.cancelamento = cancelamento
+    
+    def status(self) -> str:
+        if self.futuro.cancelled():
+            return "Cancelada"
+        if not self.futuro.done():
+            return "Cancelando..." if self.cancelamento.is_set() else (
+                "Em andamento" if self.futuro.running() else "Na fila")
+        erro = self.futuro.exception()
+        if erro is not None:
+            return f"Erro: {erro}"
+        return "Concluída" if self.futuro.result() else "Cancelada"
+
+
+class GerenciadorExportacoes:
+    """Fila de exportações em um pool de processos.
+    
+    O pool e o Manager (dicionário de progresso e eventos de cancelamento)
+    só são criados na primeira exportação. Os processos são iniciados com
+    spawn para não herdar as threads da interface.
+    """
+    
+    def __init__(self, db_name: str, max_processos: Optional[int] = None):
+        self.db_name = db_name
+        self.max_processos = max_processos
+        self.contexto = multiprocessing.get_context('spawn')
+        self.pool = None
+        self.manager = None
+        self.progresso = None
+        self.tarefas = OrderedDict()
+        self.proximo_id = 1
+    
+    def _iniciar(self):
+        if self.pool is None:
+            self.manager = self.contexto.Manager()
+            self.progresso = self.manager.dict()
+            self.pool = ProcessPoolExecutor(self.max_processos, mp_context=self.contexto)
+    
+    def enviar(self, tipo: str, parametros: dict, formato: str, arquivo: str) -> int:
+        self._iniciar()
+        
+        tarefa_id = self.proximo_id
+        self.proximo_id += 1
+        
+        cancelamento = self.manager.Event()
+        futuro = self.pool.submit(executar_exportacao, self.db_name, tipo, parametros, formato, arquivo,
+                                  tarefa_id, self.progresso, cancelamento)
+        self.tarefas[tarefa_id] = TarefaExportacao(tarefa_id, tipo, formato, arquivo, futuro, cancelamento)
+        return tarefa_id
+    
+    def cancelar(self, tarefa_id: int):
+        tarefa = self.tarefas.get(tarefa_id)
+        if tarefa is None or tarefa.futuro.done():
+            return
+        # Na fila é descartada; em execução para na próxima atualização de progresso
+        if not tarefa.futuro.cancel():
+            tarefa.cancelamento.set()
+    
+    def progresso_de(self, tarefa_id: int) -> float:
+        tarefa = self.tarefas[tarefa_id]
+        if tarefa.futuro.done() and not tarefa.futuro.cancelled() and tarefa.futuro.exception() is None:
+            return 1.0 if tarefa.futuro.result() else self.progresso.get(tarefa_id, 0.0)
+        return self.progresso.get(tarefa_id, 0.0) if self.progresso is not None else 0.0
+    
+    def ativas(self) -> bool:
+        return any(not tarefa.futuro.done() for tarefa in self.tarefas.values())
+    
+    def encerrar(self):
+        """Cancela o que estiver pendente e finaliza os processos"""
+        if self.pool is None:
+            return
+        # As da fila são descartadas aqui mesmo: shutdown(cancel_futures=True) exigiria Python 3.9
+        for tarefa_id in list(self.tarefas):
+            self.cancelar(tarefa_id)
+        self.pool.shutdown(wait=True)
+        self.manager.shutdown()
+        self.pool = None
+        self.manager = None
@@ -0,0 +1,2873 @@
+import sqlite3
+import sys
+import csv
+import getpass
+import json
+from datetime import datetime, date, timedelta
+from typing import Iterator, List, Optional, Tuple
+import os
+import threading
+import queue
+import time
+import atexit
+import traceback
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# Registros das leituras em fluxo; continuam sendo tuplas, no formato de
+# listar_produtos e listar_movimentacoes
+Produto = namedtuple('Produto', 'id nome descricao categoria quantidade localizacao codigo_barras')
+Movimentacao = namedtuple('Movimentacao', 'id produto tipo quantidade data_movimentacao observacao')
+# Alerta de estoque gravado por trg_alerta_estoque; data no horário local, como nas views
+AlertaEstoque = namedtuple('AlertaEstoque', 'id produto_id nome tipo quantidade ponto_pedido data')
+
+
+def _usuario_sistema() -> str:
+    """Login do sistema operacional, registrado na auditoria do cadastro"""
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError):
+        return ""
+
+
+class ProdutoCache:
+    """Registro compacto de produto mantido no cache do catálogo"""
+    __slots__ = ('id', 'nome', 'descricao', 'categoria', 'quantidade', 'localizacao',
+                 'codigo_barras', 'data_cadastro')
+    
+    def __init__(self, linha: Tuple):
+        for campo, valor in zip(self.__slots__, linha):
+            setattr(self, campo, valor)
+    
+    def como_tupla(self) -> Tuple:
+        """Mesmo formato retornado por buscar_produto"""
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+
+class CacheCatalogo:
+    """Cache LRU de produtos por id, descartado quando o PRAGMA data_version acusa outra gravação"""
+    
+    def __init__(self, db_name: str, max_itens: int = 50000):
+        self.db_name = db_name
+        # Conta produtos, não bytes: cada registro ocupa algumas centenas de bytes
+        self.max_itens = max_itens
+        self.itens = OrderedDict()
+        self.lock = threading.RLock()
+        self.conexao = None
+        self.versao = None
+        self.reabrir()
+    
+    def reabrir(self):
+        with self.lock:
+            self.fechar()
+            self.conexao = sqlite3.connect(self.db_name, check_same_thread=False)
+            self.versao = self._ler_versao()
+    
+    def fechar(self):
+        with self.lock:
+            self.itens.clear()
+            if self.conexao is not None:
+                self.conexao.close()
+                self.conexao = None
+    
+    def _ler_versao(self) -> int:
+        return self.conexao.execute("PRAGMA data_version").fetchone()[0]
+    
+    def validar(self) -> int:
+        """Descarta o cache se o banco foi alterado por outra conexão"""
+        with self.lock:
+            versao = self._ler_versao()
+            if versao != self.versao:
+                self.itens.clear()
+                self.versao = versao
+            return versao
+    
+    def absorver_escrita(self, ultima_alteracao: Optional[int]):
+        """Chamado após um commit próprio; descarta o cache se outra conexão gravou depois de `ultima_alteracao`"""
+        with self.lock:
+            # Versão e log lidos no mesmo instantâneo
+            self.conexao.execute("BEGIN")
+            try:
+                maximo = self.conexao.execute("SELECT MAX(id) FROM alteracoes").fetchone()[0]
+                versao = self._ler_versao()
+            finally:
+                self.conexao.commit()
+            if maximo != ultima_alteracao:
+                self.itens.clear()
+            self.versao = versao
+    
+    def obter(self, produto_id: int) -> Optional[ProdutoCache]:
+        with self.lock:
+            produto = self.itens.get(produto_id)
+            if produto is not None:
+                self.itens.move_to_end(produto_id)
+            return produto
+    
+    def guardar(self, linha: Tuple, versao: int):
+        """Guarda uma linha lida do banco, se nada mudou desde a leitura"""
+        with self.lock:
+            if versao != self.versao:
+                return
+            self.itens[linha[0]] = ProdutoCache(linha)
+            self.itens.move_to_end(linha[0])
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+    
+    def ajustar_quantidade(self, produto_id: int, delta: int):
+        with self.lock:
+            produto = self.itens.get(produto_id)
+            if produto is not None:
+                produto.quantidade += delta
+    
+    def atualizar_campos(self, produto_id: int, campos: dict):
+        with self.lock:
+            produto = self.itens.get(produto_id)
+            if produto is not None:
+                for campo, valor in campos.items():
+                    if campo in ProdutoCache.__slots__:
+                        setattr(produto, campo, valor)
+
+
+class MonitorAlteracoes:
+    """Detecta gravações de outras estações pelo PRAGMA data_version e pelo log `alteracoes`"""
+    
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+        self.conexao = None
+        self.versao = None
+        self.marca = 0
+        self.reabrir()
+    
+    def reabrir(self):
+        self.fechar()
+        self.conexao = sqlite3.connect(self.db_name)
+        self.versao = self.conexao.execute("PRAGMA data_version").fetchone()[0]
+        self.marca = self.conexao.execute("SELECT COALESCE(MAX(id), 0) FROM alteracoes").fetchone()[0]
+    
+    def fechar(self):
+        if self.conexao is not None:
+            self.conexao.close()
+            self.conexao = None
+    
+    def verificar(self) -> Optional[Tuple[Optional[List[int]], List[int]]]:
+        """None se nada mudou, ou (produtos_ids, movimentacoes_ids); produtos_ids None pede recarga completa"""
+        versao = self.conexao.execute("PRAGMA data_version").fetchone()[0]
+        if versao == self.versao:
+            return None
+        self.versao = versao
+        
+        cursor = self.conexao.cursor()
+        cursor.execute("SELECT MIN(id), MAX(id) FROM alteracoes")
+        minimo, maximo = cursor.fetchone()
+        maximo = maximo or 0
+        # Log podado além da marca d'água, ou recomeçado por uma restauração de backup
+        if maximo < self.marca or (maximo > self.marca and minimo > self.marca + 1):
+            self.marca = maximo
+            return None, []
+        if maximo == self.marca:
+            return None
+        
+        cursor.execute(
+            "SELECT produto_id, movimentacao_id FROM alteracoes WHERE id > ? AND id <= ?",
+            (self.marca, maximo)
+        )
+        linhas = cursor.fetchall()
+        self.marca = maximo
+        
+        produtos = sorted({linha[0] for linha in linhas})
+        movimentacoes = [linha[1] for linha in linhas if linha[1] is not None]
+        return produtos, movimentacoes
+
+
+class AgregadorMovimentacoes:
+    """Totais de entradas/saídas dos últimos N dias, em baldes por dia lidos a partir de uma marca d'água"""
+    
+    def __init__(self, deposito: 'GerenciadorDeposito', dias: int = 30):
+        self.deposito = deposito
+        self.dias = dias
+        self.reiniciar()
+    
+    def reiniciar(self):
+        self.marca = None
+        self.inicio_janela = None
+        self.baldes = {}
+        self.por_produto = {}
+        self.entradas = 0
+        self.saidas = 0
+    
+    def _somar(self, dia: str, produto_id: int, entradas: int, saidas: int):
+        balde = self.baldes.setdefault(dia, {})
+        contador_dia = balde.setdefault(produto_id, [0, 0])
+        contador_dia[0] += entradas
+        contador_dia[1] += saidas
+        
+        contador = self.por_produto.setdefault(produto_id, [0, 0])
+        contador[0] += entradas
+        contador[1] += saidas
+        
+        self.entradas += entradas
+        self.saidas += saidas
+    
+    def _expirar(self, inicio: str):
+        for dia in [d for d in self.baldes if d < inicio]:
+            for produto_id, (entradas, saidas) in self.baldes.pop(dia).items():
+                contador = self.por_produto[produto_id]
+                contador[0] -= entradas
+                contador[1] -= saidas
+                if contador == [0, 0]:
+                    del self.por_produto[produto_id]
+                self.entradas -= entradas
+                self.saidas -= saidas
+    
+    def atualizar(self):
+        inicio = (date.today() - timedelta(days=self.dias)).strftime('%Y-%m-%d')
+        
+        conn = self.deposito.conectar()
+        cursor = conn.cursor()
+        
+        if self.marca is None:
+            # Primeira carga: só a janela, pelo índice de data
+            cursor.execute("""
+                SELECT id, produto_id, tipo, quantidade, DATE(data_movimentacao, 'unixepoch', 'localtime')
+                FROM movimentacoes WHERE data_movimentacao >= ?
+            """, (self.deposito.inicio_do_dia(inicio),))
+            self.marca = 0
+        else:
+            cursor.execute("""
+                SELECT id, produto_id, tipo, quantidade, DATE(data_movimentacao, 'unixepoch', 'localtime')
+                FROM movimentacoes WHERE id > ?
+            """, (self.marca,))
+        
+        for movimentacao_id, produto_id, tipo, quantidade, dia in cursor:
+            self.marca = max(self.marca, movimentacao_id)
+            if dia < inicio:
+                continue
+            if tipo == 'ENTRADA':
+                self._somar(dia, produto_id, quantidade, 0)
+            elif tipo == 'SAIDA':
+                self._somar(dia, produto_id, 0, quantidade)
+            elif tipo == 'ESTORNO':
+                # Estorno de entrada é negativo e de saída positivo: desfaz a contagem original
+                if quantidade < 0:
+                    self._somar(dia, produto_id, quantidade, 0)
+                else:
+                    self._somar(dia, produto_id, 0, -quantidade)
+        
+        if self.marca == 0:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimentacoes")
+            self.marca = cursor.fetchone()[0]
+        
+        conn.close()
+        
+        if inicio != self.inicio_janela:
+            self._expirar(inicio)
+            self.inicio_janela = inicio
+    
+    def top_produtos(self, quantidade: int = 10) -> List[Tuple]:
+        """(nome, entradas, saidas, total) dos produtos mais movimentados"""
+        maiores = heapq.nlargest(quantidade, self.por_produto.items(), key=lambda item: sum(item[1]))
+        
+        top = []
+        for produto_id, (entradas, saidas) in maiores:
+            produto = self.deposito.buscar_produto(produto_id)
+            nome = produto[1] if produto else f"#{produto_id}"
+            top.append((nome, entradas, saidas, entradas + saidas))
+        return top
+
+
+class IndiceBusca:
+    """Índice de prefixos em memória sobre as palavras do nome e o código de barras, consultado com bisect"""
+    
+    def __init__(self, deposito: 'GerenciadorDeposito'):
+        self.deposito = deposito
+        self.lock = threading.Lock()
+        self.chaves = []
+        self.ids = array('q')
+        self.registros = {}
+        self.pronto = False
+        self.pendentes = None
+        self.geracao = 0
+    
+    @staticmethod
+    def _chaves(nome: str, codigo_barras: Optional[str]) -> Tuple[str, ...]:
+        chaves = set((nome or "").upper().split())
+        if codigo_barras:
+            chaves.add(codigo_barras.upper())
+        return tuple(sys.intern(chave) for chave in chaves)
+    
+    def construir(self):
+        with self.lock:
+            self.geracao += 1
+            geracao = self.geracao
+            self.pronto = False
+            self.pendentes = set()
+        
+        conn = self.deposito.conectar()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, nome, codigo_barras FROM produtos")
+        
+        registros = {}
+        pares = []
+        for produto_id, nome, codigo_barras in cursor:
+            chaves = self._chaves(nome, codigo_barras)
+            registros[produto_id] = chaves
+            pares.extend((chave, produto_id) for chave in chaves)
+        conn.close()
+        pares.sort()
+        
+        with self.lock:
+            # Uma reconstrução iniciada depois desta já vale mais
+            if geracao != self.geracao:
+                return
+            self.chaves = [par[0] for par in pares]
+            self.ids = array('q', (par[1] for par in pares))
+            self.registros = registros
+            pendentes = self.pendentes
+            self.pendentes = None
+            self.pronto = True
+        
+        if pendentes:
+            self.atualizar(pendentes)
+    
+    def ao_alterar(self, produtos_ids: List[int], movimentacoes_ids: List[int]):
+        """Ouvinte do GerenciadorDeposito"""
+        if movimentacoes_ids:
+            # Movimentações só mudam o estoque; basta indexar produtos novos
+            produtos_ids = [i for i in produtos_ids if i not in self.registros]
+        if produtos_ids:
+            self.atualizar(produtos_ids)
+    
+    def atualizar(self, produtos_ids):
+        """Relê nome e código de barras dos produtos e reposiciona suas chaves"""
+        with self.lock:
+            if self.pendentes is not None:
+                self.pendentes.update(produtos_ids)
+                return
+        
+        produtos_ids = list(produtos_ids)
+        linhas = {}
+        conn = self.deposito.conectar()
+        cursor = conn.cursor()
+        for i in range(0, len(produtos_ids), 500):
+            lote = produtos_ids[i:i + 500]
+            cursor.execute(
+                f"SELECT id, nome, codigo_barras FROM produtos WHERE id IN ({', '.join('?' * len(lote))})",
+                lote
+            )
+            for produto_id, nome, codigo_barras in cursor:
+                linhas[produto_id] = self._chaves(nome, codigo_barras)
+        conn.close()
+        
+        with self.lock:
+            if self.pendentes is not None:
+                self.pendentes.update(produtos_ids)
+                return
+            for produto_id in produtos_ids:
+                antigas = self.registros.pop(produto_id, ())
+                novas = linhas.get(produto_id, ())
+                for chave in set(antigas) - set(novas):
+                    self._remover(chave, produto_id)
+                for chave in set(novas) - set(antigas):
+                    self._inserir(chave, produto_id)
+                if novas:
+                    self.registros[produto_id] = novas
+    
+    def _remover(self, chave: str, produto_id: int):
+        inicio = bisect_left(self.chaves, chave)
+        fim = bisect_right(self.chaves, chave, inicio)
+        posicao = bisect_left(self.ids, produto_id, inicio, fim)
+        if posicao < fim and self.ids[posicao] == produto_id:
+            del self.chaves[posicao]
+            del self.ids[posicao]
+    
+    def _inserir(self, chave: str, produto_id: int):
+        inicio = bisect_left(self.chaves, chave)
+        fim = bisect_right(self.chaves, chave, inicio)
+        posicao = bisect_left(self.ids, produto_id, inicio, fim)
+        self.chaves.insert(posicao, chave)
+        self.ids.insert(posicao, produto_id)
+    
+    def buscar(self, termo: str, limite: int = 200) -> List[int]:
+        """Ids cujos nome/código têm palavras começando por todos os termos"""
+        termos = termo.upper().split()
+        if not termos:
+            return []
+        
+        # Percorre o intervalo do termo mais seletivo e filtra pelos demais
+        principal = max(termos, key=len)
+        outros = [t for t in termos if t is not principal]
+        
+        encontrados = []
+        vistos = set()
+        with self.lock:
+            inicio = bisect_left(self.chaves, principal)
+            fim = bisect_left(self.chaves, principal + chr(0x10FFFF), inicio)
+            for posicao in range(inicio, fim):
+                produto_id = self.ids[posicao]
+                if produto_id in vistos:
+                    continue
+                vistos.add(produto_id)
+                
+                if outros:
+                    chaves = self.registros[produto_id]
+                    if not all(any(c.startswith(t) for c in chaves) for t in outros):
+                        continue
+                
+                encontrados.append(produto_id)
+                if len(encontrados) >= limite:
+                    break
+        
+        return encontrados
+
+
+class GerenciadorDeposito:
+    VERSAO_SCHEMA = 9
+    # UPDATE ... FROM (estornos, inventário) exige 3.33; UPSERT (estoque_local, saldos, contagens) 3.24
+    SQLITE_MINIMO = (3, 33, 0)
+    # O log de alterações guarda as últimas LIMITE_LOG_ALTERACOES entradas; as escritas
+    # o podam a cada PODA_LOG_ALTERACOES entradas novas, na mesma transação
+    LIMITE_LOG_ALTERACOES = 200000
+    PODA_LOG_ALTERACOES = 50000
+    # Efeito de uma movimentação no estoque, para somas em SQL; AJUSTE (inventário),
+    # TRANSFERENCIA (uma linha negativa na origem e outra positiva no destino) e
+    # ESTORNO (o efeito contrário da movimentação estornada) já têm sinal
+    SALDO_MOVIMENTACAO = ("CASE WHEN tipo = 'ENTRADA' THEN quantidade WHEN tipo = 'SAIDA' THEN -quantidade "
+                          "WHEN tipo IN ('AJUSTE', 'TRANSFERENCIA', 'ESTORNO') THEN quantidade ELSE 0 END")
+    # Tipos que podem ser estornados
+    TIPOS_ESTORNAVEIS = ('ENTRADA', 'SAIDA')
+    # Ponto de pedido efetivo de cada produto: o próprio, o estoque mínimo ou o padrão.
+    # CONDICAO_ESTOQUE_BAIXO é também a condição do índice parcial idx_produtos_estoque_baixo,
+    # então as consultas que a repetem ao pé da letra só leem os produtos em alerta
+    PONTO_PEDIDO_PADRAO = 10
+    PONTO_PEDIDO = f"COALESCE(ponto_pedido, estoque_minimo, {PONTO_PEDIDO_PADRAO})"
+    CONDICAO_ESTOQUE_BAIXO = f"quantidade <= {PONTO_PEDIDO}"
+    # local_id do estoque de produtos sem localização
+    SEM_LOCALIZACAO = 0
+    # (produto_id, local_id, quantidade) do efeito no seu local de cada movimentação lida por
+    # `origem` (cláusula FROM), como no trigger trg_estoque_local: sem local_id conta na
+    # localização do produto. O primeiro parâmetro é SEM_LOCALIZACAO
+    _SALDOS_POR_LOCAL = ("SELECT m.produto_id, COALESCE(m.local_id, p.localizacao_id, ?) AS local_id, "
+                         "{sinal}m.efeito AS quantidade "
+                         f"FROM (SELECT produto_id, local_id, {SALDO_MOVIMENTACAO} AS efeito {{origem}}) m "
+                         "LEFT JOIN produtos p ON p.id = m.produto_id")
+    COLUNAS_MOVIMENTACAO = "id, produto_id, tipo, quantidade, data_movimentacao, observacao"
+    DICIONARIOS = {'categoria': 'categorias', 'localizacao': 'localizacoes'}
+    # Os relatórios da interface olham no máximo 12 meses para trás
+    MESES_MINIMOS_ARQUIVAMENTO = 13
+    # Modos de journal aceitos por definir_modo_journal; o padrão do SQLite (DELETE) é mantido
+    # até alguém optar por WAL, que não funciona com o banco em compartilhamento de rede
+    MODOS_JOURNAL = ('DELETE', 'WAL')
+    # Colunas comuns ao formato antigo (texto) e ao atual, que criar_tabelas migra
+    TABELAS_OBRIGATORIAS = {
+        'produtos': {'id', 'nome', 'descricao', 'quantidade', 'data_cadastro'},
+        'movimentacoes': {'id', 'produto_id', 'tipo', 'quantidade', 'data_movimentacao', 'observacao'},
+    }
+    
+    def __init__(self, db_name: str = "deposito.db", max_produtos_cache: int = 50000):
+        if sqlite3.sqlite_version_info < self.SQLITE_MINIMO:
+            raise RuntimeError(f"É necessário o SQLite {'.'.join(map(str, self.SQLITE_MINIMO))} ou superior; "
+                               f"este Python usa o {sqlite3.sqlite_version}")
+        self.db_name = db_name
+        self.fila_movimentacoes = None
+        self.ouvintes = []
+        self.ouvintes_alertas = []
+        self.trava_alertas = threading.Lock()
+        self.marca_alertas = 0
+        self.proxima_poda = 0
+        self.indice = None
+        self.leitor = None
+        self.usuario = _usuario_sistema()
+        self.criar_tabelas()
+        self.cache = CacheCatalogo(db_name, max_produtos_cache)
+    
+    def conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_name)
+    
+    def _confirmar(self, conn: sqlite3.Connection, movimentacoes: List[Tuple] = (),
+                   produto_alterado: Optional[Tuple[int, dict]] = None):
+        """Faz o commit mantendo o cache coerente; `movimentacoes` traz (produto_id, tipo, quantidade, id)"""
+        # O lock do cache fica retido do início ao fim: uma leitura de outra thread
+        # não guarda uma linha já confirmada antes de o ajuste abaixo ser aplicado
+        with self.cache.lock:
+            # Com o lock de escrita retido, nenhum outro processo grava entre a
+            # verificação e o commit; alterações anteriores invalidam o cache aqui
+            self.cache.validar()
+            ultima_alteracao = conn.execute("SELECT MAX(id) FROM alteracoes").fetchone()[0]
+            if ultima_alteracao and ultima_alteracao >= self.proxima_poda:
+                # Estações cuja marca d'água ficar aquém da poda recarregam as telas por completo
+                conn.execute("DELETE FROM alteracoes WHERE id <= ?",
+                             (ultima_alteracao - self.LIMITE_LOG_ALTERACOES,))
+                self.proxima_poda = ultima_alteracao + self.PODA_LOG_ALTERACOES
+            with self.trava_alertas:
+                # Os alertas que os triggers gravaram nesta transação (e os de outras
+                # estações ainda não publicados) saem pela chave primária, sem varredura
+                alertas = self._alertas_novos(conn) if movimentacoes else []
+                conn.commit()
+                if alertas:
+                    self.marca_alertas = alertas[-1].id
+            
+            for produto_id, tipo, quantidade, _ in movimentacoes:
+                self.cache.ajustar_quantidade(produto_id, -quantidade if tipo == 'SAIDA' else quantidade)
+            if produto_alterado:
+                self.cache.atualizar_campos(*produto_alterado)
+            
+            self.cache.absorver_escrita(ultima_alteracao)
+        
+        # A edição sai em notificação própria: junto das movimentações (a transferência de
+        # uma mudança de localização), os ouvintes a tomariam por mudança só de estoque
+        if produto_alterado:
+            self._notificar([produto_alterado[0]], [])
+        if movimentacoes:
+            self._notificar(sorted({m[0] for m in movimentacoes}), [m[3] for m in movimentacoes])
+        if alertas:
+            self._notificar_alertas(alertas)
+    
+    def adicionar_ouvinte(self, ouvinte):
+        """Registra ouvinte(produtos_ids, movimentacoes_ids), chamado após cada escrita (também pela fila)"""
+        self.ouvintes.append(ouvinte)
+    
+    def remover_ouvinte(self, ouvinte):
+        if ouvinte in self.ouvintes:
+            self.ouvintes.remove(ouvinte)
+    
+    def _notificar(self, produtos_ids: List[int], movimentacoes_ids: List[int]):
+        for ouvinte in list(self.ouvintes):
+            try:
+                ouvinte(produtos_ids, movimentacoes_ids)
+            except Exception:
+                # Um ouvinte com erro não pode desfazer uma escrita já confirmada
+                traceback.print_exc()
+    
+    def adicionar_ouvinte_alertas(self, ouvinte):
+        """Registra ouvinte(alertas), chamado com os alertas novos após cada escrita (também pela fila)"""
+        self.ouvintes_alertas.append(ouvinte)
+    
+    def remover_ouvinte_alertas(self, ouvinte):
+        if ouvinte in self.ouvintes_alertas:
+            self.ouvintes_alertas.remove(ouvinte)
+    
+    def _notificar_alertas(self, alertas: List[AlertaEstoque]):
+        for ouvinte in list(self.ouvintes_alertas):
+            try:
+                ouvinte(alertas)
+            except Exception:
+                traceback.print_exc()
+    
+    def _alertas_novos(self, conn: sqlite3.Connection) -> List[AlertaEstoque]:
+        return self._consultar_alertas(conn, "a.id > ?", (self.marca_alertas,), "a.id")
+    
+    @staticmethod
+    def _consultar_alertas(conn: sqlite3.Connection, condicao: str, parametros: tuple, ordem: str,
+                           limite: Optional[int] = None) -> List[AlertaEstoque]:
+        if limite is not None:
+            ordem += " LIMIT ?"
+            parametros += (limite,)
+        cursor = conn.execute(f"""
+            SELECT a.id, a.produto_id, COALESCE(p.nome, ''), a.tipo, a.quantidade, a.ponto_pedido,
+                   DATETIME(a.data, 'unixepoch', 'localtime')
+            FROM alertas_estoque a
+            LEFT JOIN produtos p ON p.id = a.produto_id
+            WHERE {condicao}
+            ORDER BY {ordem}
+        """, parametros)
+        return [AlertaEstoque(*linha) for linha in cursor]
+    
+    def publicar_alertas(self) -> List[AlertaEstoque]:
+        """Publica aos ouvintes os alertas gravados por outras estações; chame após o MonitorAlteracoes"""
+        conn = self.conectar()
+        with self.trava_alertas:
+            alertas = self._alertas_novos(conn)
+            if alertas:
+                self.marca_alertas = alertas[-1].id
+        conn.close()
+        
+        if alertas:
+            self._notificar_alertas(alertas)
+        return alertas
+    
+    def alertas_desde(self, alerta_id: int = 0, limite: Optional[int] = 1000) -> List[AlertaEstoque]:
+        """Alertas com id maior que `alerta_id`, do mais antigo para o mais novo (para acompanhar o log)"""
+        conn = self.conectar()
+        alertas = self._consultar_alertas(conn, "a.id > ?", (alerta_id,), "a.id", limite)
+        conn.close()
+        return alertas
+    
+    def alertas_recentes(self, limite: int = 100) -> List[AlertaEstoque]:
+        conn = self.conectar()
+        alertas = self._consultar_alertas(conn, "1", (), "a.id DESC", limite)
+        conn.close()
+        return alertas
+    
+    def criar_tabelas(self):
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        # Categorias e localizações ficam em tabelas de dicionário; as datas são
+        # segundos desde a época (UTC), exibidas no horário local pelas views
+        for tabela in self.DICIONARIOS.values():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabela} (
+                    id INTEGER PRIMARY KEY,
+                    nome TEXT NOT NULL UNIQUE
+                )
+            """)
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS produtos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                descricao TEXT,
+                categoria_id INTEGER REFERENCES categorias(id),
+                quantidade INTEGER NOT NULL DEFAULT 0,
+                localizacao_id INTEGER REFERENCES localizacoes(id),
+                codigo_barras TEXT,
+                data_cadastro INTEGER NOT NULL
+            )
+        """)
+        
+        # Migração: adicionar coluna codigo_barras se não existir
+        cursor.execute("PRAGMA table_info(produtos)")
+        colunas = [coluna[1] for coluna in cursor.fetchall()]
+        if 'codigo_barras' not in colunas:
+            cursor.execute("ALTER TABLE produtos ADD COLUMN codigo_barras TEXT")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS movimentacoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                produto_id INTEGER NOT NULL,
+                tipo TEXT NOT NULL,
+                quantidade INTEGER NOT NULL,
+                data_movimentacao INTEGER NOT NULL,
+                observacao TEXT,
+                FOREIGN KEY (produto_id) REFERENCES produtos(id)
+            )
+        """)
+        
+        # Migração: bancos antigos guardam datas e categorias/localizações como texto
+        if 'categoria' in colunas:
+            self._migrar_formato_compacto(conn)
+        
+        # Limites de reposição por produto (NULL: usa PONTO_PEDIDO_PADRAO)
+        cursor.execute("PRAGMA table_info(produtos)")
+        colunas = [coluna[1] for coluna in cursor.fetchall()]
+        for coluna in ('estoque_minimo', 'ponto_pedido'):
+            if coluna not in colunas:
+                cursor.execute(f"ALTER TABLE produtos ADD COLUMN {coluna} INTEGER")
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_produtos_estoque_baixo ON produtos(quantidade)
+            WHERE {self.CONDICAO_ESTOQUE_BAIXO}
+        """)
+        
+        cursor.execute("""
+            CREATE VIEW IF NOT EXISTS vw_produtos AS
+            SELECT p.id, p.nome, p.descricao, COALESCE(c.nome, '') AS categoria, p.quantidade,
+                   COALESCE(l.nome, '') AS localizacao, p.codigo_barras,
+                   DATETIME(p.data_cadastro, 'unixepoch', 'localtime') AS data_cadastro
+            FROM produtos p
+            LEFT JOIN categorias c ON c.id = p.categoria_id
+            LEFT JOIN localizacoes l ON l.id = p.localizacao_id
+        """)
+        cursor.execute("""
+            CREATE VIEW IF NOT EXISTS vw_movimentacoes AS
+            SELECT id, produto_id, tipo, quantidade,
+                   DATETIME(data_movimentacao, 'unixepoch', 'localtime') AS data_movimentacao, observacao
+            FROM movimentacoes
+        """)
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_codigo_barras ON produtos(codigo_barras)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_movimentacoes_data ON movimentacoes(data_movimentacao)")
+        # Cobre o saldo por produto (SALDO_MOVIMENTACAO) sem ler a tabela
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_movimentacoes_produto ON movimentacoes(produto_id, tipo, quantidade)
+        """)
+        
+        # local_id: localização da movimentação; lote_id: id da primeira movimentação
+        # gravada pelo mesmo registrar_movimentacoes_lote; estorno_de: movimentação
+        # que esta estorna, no máximo um estorno por movimentação
+        cursor.execute("PRAGMA table_info(movimentacoes)")
+        colunas_movimentacao = {coluna[1] for coluna in cursor.fetchall()}
+        for coluna in ('local_id', 'lote_id', 'estorno_de'):
+            if coluna not in colunas_movimentacao:
+                cursor.execute(f"ALTER TABLE movimentacoes ADD COLUMN {coluna} INTEGER")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_movimentacoes_lote ON movimentacoes(lote_id)
+            WHERE lote_id IS NOT NULL
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_movimentacoes_estorno ON movimentacoes(estorno_de)
+            WHERE estorno_de IS NOT NULL
+        """)
+        
+        # Estoque por localização (local_id = localizacoes.id, ou SEM_LOCALIZACAO);
+        # a soma por produto é sempre produtos.quantidade
+        
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'estoque_local'")
+        estoque_local_novo = cursor.fetchone() is None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS estoque_local (
+                produto_id INTEGER NOT NULL,
+                local_id INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                PRIMARY KEY (produto_id, local_id)
+            ) WITHOUT ROWID
+        """)
+        # Consultas por local (relatórios com milhares de localizações) sem tocar na tabela
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_estoque_local_local
+            ON estoque_local(local_id, produto_id, quantidade)
+        """)
+        if estoque_local_novo:
+            cursor.execute("""
+                INSERT INTO estoque_local (produto_id, local_id, quantidade)
+                SELECT id, COALESCE(localizacao_id, ?), quantidade FROM produtos WHERE quantidade <> 0
+            """, (self.SEM_LOCALIZACAO,))
+        
+        # Movimentações sem local_id (estações antigas) contam na localização do produto
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_estoque_local AFTER INSERT ON movimentacoes
+            BEGIN
+                INSERT INTO estoque_local (produto_id, local_id, quantidade)
+                VALUES (NEW.produto_id,
+                        COALESCE(NEW.local_id, (SELECT localizacao_id FROM produtos WHERE id = NEW.produto_id),
+                                 {self.SEM_LOCALIZACAO}),
+                        CASE NEW.tipo WHEN 'SAIDA' THEN -NEW.quantidade ELSE NEW.quantidade END)
+                ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade;
+            END
+        """)
+        
+        # Log de alterações preenchido por triggers, para que outras estações
+        # (inclusive versões antigas do programa) também registrem o que mudaram
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alteracoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                produto_id INTEGER NOT NULL,
+                movimentacao_id INTEGER
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_alteracoes_produto_inserido AFTER INSERT ON produtos
+            BEGIN
+                INSERT INTO alteracoes (produto_id) VALUES (NEW.id);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_alteracoes_produto_alterado AFTER UPDATE ON produtos
+            BEGIN
+                INSERT INTO alteracoes (produto_id) VALUES (NEW.id);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_alteracoes_movimentacao AFTER INSERT ON movimentacoes
+            BEGIN
+                INSERT INTO alteracoes (produto_id, movimentacao_id) VALUES (NEW.produto_id, NEW.id);
+            END
+        """)
+        # Saldos de fechamento mensal (mes = 'AAAA-MM'); saldos zerados não são gravados
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fechamentos (
+                mes TEXT PRIMARY KEY,
+                data_fechamento TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS saldos_fechamento (
+                mes TEXT NOT NULL,
+                produto_id INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                PRIMARY KEY (mes, produto_id)
+            ) WITHOUT ROWID
+        """)
+        
+        # Movimentações antigas ficam em arquivos anuais; `ate` é a data (exclusiva)
+        # até onde o ano foi arquivado e saldos_abertura guarda o saldo do que saiu
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS arquivos_movimentacoes (
+                ano INTEGER PRIMARY KEY,
+                arquivo TEXT NOT NULL,
+                ate TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS saldos_abertura (
+                produto_id INTEGER PRIMARY KEY,
+                quantidade INTEGER NOT NULL
+            )
+        """)
+        # O mesmo saldo por localização, para a verificação de consistência refazer
+        # estoque_local; nos bancos antigos parte do estoque_local atual
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'saldos_abertura_local'")
+        saldos_abertura_local_novo = cursor.fetchone() is None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS saldos_abertura_local (
+                produto_id INTEGER NOT NULL,
+                local_id INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                PRIMARY KEY (produto_id, local_id)
+            ) WITHOUT ROWID
+        """)
+        if saldos_abertura_local_novo:
+            cursor.execute(f"""
+                INSERT INTO saldos_abertura_local (produto_id, local_id, quantidade)
+                SELECT produto_id, local_id, SUM(quantidade) FROM (
+                    SELECT produto_id, local_id, quantidade FROM estoque_local
+                    UNION ALL
+                    {self._SALDOS_POR_LOCAL.format(sinal="-", origem="FROM movimentacoes")}
+                )
+                GROUP BY produto_id, local_id
+                HAVING SUM(quantidade) <> 0
+            """, (self.SEM_LOCALIZACAO,))
+        
+        # Inventários físicos: as contagens ficam em área de preparação até serem
+        # efetivadas; estoque_sistema é o estoque no momento da efetivação
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS inventarios (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                descricao TEXT,
+                situacao TEXT NOT NULL DEFAULT 'ABERTO',
+                data_abertura INTEGER NOT NULL,
+                data_fechamento INTEGER
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS contagens_inventario (
+                inventario_id INTEGER NOT NULL,
+                produto_id INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                estoque_sistema INTEGER,
+                PRIMARY KEY (inventario_id, produto_id)
+            ) WITHOUT ROWID
+        """)
+        
+        # Auditoria do cadastro: só os campos alterados em cada edição, como JSON
+        # {"campo": [antes, depois]}; fica fora de produtos para não pesar na listagem
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS auditoria_produtos (
+                id INTEGER PRIMARY KEY,
+                produto_id INTEGER NOT NULL,
+                data INTEGER NOT NULL,
+                usuario TEXT,
+                alteracoes TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_auditoria_produto ON auditoria_produtos(produto_id, data)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_auditoria_data ON auditoria_produtos(data)")
+        
+        # Histórico das verificações de consistência; ultima_movimentacao é a
+        # marca d'água usada pela verificação incremental
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS verificacoes_consistencia (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data INTEGER NOT NULL,
+                incremental INTEGER NOT NULL,
+                ultima_movimentacao INTEGER NOT NULL,
+                verificados INTEGER NOT NULL,
+                divergencias INTEGER NOT NULL,
+                reparados INTEGER NOT NULL
+            )
+        """)
+        
+        # Alertas de estoque: gravados quando uma baixa de quantidade cruza o ponto
+        # de pedido, o estoque mínimo ou zera; só o nível mais grave cruzado entra
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alertas_estoque (
+                id INTEGER PRIMARY KEY,
+                produto_id INTEGER NOT NULL,
+                data INTEGER NOT NULL,
+                tipo TEXT NOT NULL,
+                quantidade INTEGER NOT NULL,
+                ponto_pedido INTEGER NOT NULL
+            )
+        """)
+        ponto_pedido = f"COALESCE(NEW.ponto_pedido, NEW.estoque_minimo, {self.PONTO_PEDIDO_PADRAO})"
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_alerta_estoque AFTER UPDATE OF quantidade ON produtos
+            WHEN NEW.quantidade < OLD.quantidade AND NEW.quantidade <= {ponto_pedido}
+                 AND (OLD.quantidade > {ponto_pedido} OR NEW.quantidade <= 0
+                      OR (NEW.quantidade < NEW.estoque_minimo AND OLD.quantidade >= NEW.estoque_minimo))
+            BEGIN
+                INSERT INTO alertas_estoque (produto_id, data, tipo, quantidade, ponto_pedido)
+                VALUES (NEW.id, CAST(strftime('%s', 'now') AS INTEGER),
+                        CASE WHEN NEW.quantidade <= 0 THEN 'SEM_ESTOQUE'
+                             WHEN NEW.quantidade < NEW.estoque_minimo THEN 'ABAIXO_MINIMO'
+                             ELSE 'ESTOQUE_BAIXO' END,
+                        NEW.quantidade, {ponto_pedido});
+            END
+        """)
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM alertas_estoque")
+        self.marca_alertas = cursor.fetchone()[0]
+        
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] < self.VERSAO_SCHEMA:
+            cursor.execute(f"PRAGMA user_version = {self.VERSAO_SCHEMA}")
+        
+        conn.commit()
+        conn.close()
+    
+    def _migrar_formato_compacto(self, conn: sqlite3.Connection):
+        """Reescreve produtos e movimentacoes no formato com datas inteiras e dicionários"""
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("DROP VIEW IF EXISTS vw_produtos")
+            cursor.execute("DROP VIEW IF EXISTS vw_movimentacoes")
+            
+            for campo, tabela in self.DICIONARIOS.items():
+                cursor.execute(f"""
+                    INSERT OR IGNORE INTO {tabela} (nome)
+                    SELECT DISTINCT {campo} FROM produtos WHERE COALESCE({campo}, '') <> ''
+                """)
+            
+            cursor.execute("""
+                CREATE TABLE produtos_novo (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nome TEXT NOT NULL,
+                    descricao TEXT,
+                    categoria_id INTEGER REFERENCES categorias(id),
+                    quantidade INTEGER NOT NULL DEFAULT 0,
+                    localizacao_id INTEGER REFERENCES localizacoes(id),
+                    codigo_barras TEXT,
+                    data_cadastro INTEGER NOT NULL
+                )
+            """)
+            cursor.execute("""
+                INSERT INTO produtos_novo
+                SELECT p.id, p.nome, p.descricao, c.id, p.quantidade, l.id, p.codigo_barras,
+                       CAST(STRFTIME('%s', p.data_cadastro, 'utc') AS INTEGER)
+                FROM produtos p
+                LEFT JOIN categorias c ON c.nome = p.categoria
+                LEFT JOIN localizacoes l ON l.nome = p.localizacao
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE movimentacoes_novo (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    produto_id INTEGER NOT NULL,
+                    tipo TEXT NOT NULL,
+                    quantidade INTEGER NOT NULL,
+                    data_movimentacao INTEGER NOT NULL,
+                    observacao TEXT,
+                    FOREIGN KEY (produto_id) REFERENCES produtos(id)
+                )
+            """)
+            cursor.execute("""
+                INSERT INTO movimentacoes_novo
+                SELECT id, produto_id, tipo, quantidade,
+                       CAST(STRFTIME('%s', data_movimentacao, 'utc') AS INTEGER), observacao
+                FROM movimentacoes
+            """)
+            
+            # Índices e triggers das tabelas antigas são recriados por criar_tabelas
+            for tabela in ('produtos', 'movimentacoes'):
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabela,))
+                sequencia = cursor.fetchone()
+                cursor.execute(f"DROP TABLE {tabela}")
+                cursor.execute(f"ALTER TABLE {tabela}_novo RENAME TO {tabela}")
+                if sequencia:
+                    cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                                   (sequencia[0], tabela))
+            
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        
+        # Arquivos anuais já criados passam para o mesmo formato
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'arquivos_movimentacoes'")
+        if cursor.fetchone():
+            cursor.execute("SELECT arquivo FROM arquivos_movimentacoes")
+            for (arquivo,) in cursor.fetchall():
+                caminho = self._caminho_arquivo(arquivo)
+                if os.path.isfile(caminho):
+                    self._criar_arquivo_anual(caminho)
+    
+    @staticmethod
+    def inicio_do_dia(data: str) -> int:
+        """Segundos desde a época da meia-noite local de `data` (AAAA-MM-DD)"""
+        return int(datetime.strptime(data[:10], '%Y-%m-%d').timestamp())
+    
+    @staticmethod
+    def fim_do_dia(data: str) -> int:
+        """Início do dia seguinte a `data`, para intervalos com fim exclusivo"""
+        return int((datetime.strptime(data[:10], '%Y-%m-%d') + timedelta(days=1)).timestamp())
+    
+    def _id_dicionario(self, cursor: sqlite3.Cursor, campo: str, valor: Optional[str]) -> Optional[int]:
+        """Id de uma categoria/localização, cadastrando-a se for nova"""
+        if not valor:
+            return None
+        tabela = self.DICIONARIOS[campo]
+        cursor.execute(f"INSERT OR IGNORE INTO {tabela} (nome) VALUES (?)", (valor,))
+        cursor.execute(f"SELECT id FROM {tabela} WHERE nome = ?", (valor,))
+        return cursor.fetchone()[0]
+    
+    def _id_local(self, cursor: sqlite3.Cursor, local: Optional[str], criar: bool = False) -> Optional[int]:
+        """local_id da localização (vazia é SEM_LOCALIZACAO); sem `criar`, None se não cadastrada"""
+        if not local:
+            return self.SEM_LOCALIZACAO
+        if criar:
+            return self._id_dicionario(cursor, 'localizacao', local)
+        cursor.execute("SELECT id FROM localizacoes WHERE nome = ?", (local,))
+        linha = cursor.fetchone()
+        return linha[0] if linha else None
+    
+    def adicionar_produto(self, nome: str, quantidade: int = 0, 
+                         descricao: str = "", categoria: str = "", 
+                         localizacao: str = "", codigo_barras: str = "",
+                         estoque_minimo: Optional[int] = None, ponto_pedido: Optional[int] = None) -> int:
+        self._validar_limites(estoque_minimo, ponto_pedido)
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        data_atual = int(time.time())
+        
+        cursor.execute("""
+            INSERT INTO produtos (nome, descricao, categoria_id, quantidade, localizacao_id, codigo_barras, data_cadastro,
+                                  estoque_minimo, ponto_pedido)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (nome.upper(), descricao.upper(), self._id_dicionario(cursor, 'categoria', categoria.upper()),
+              quantidade, self._id_dicionario(cursor, 'localizacao', localizacao.upper()), codigo_barras, data_atual,
+              estoque_minimo, ponto_pedido))
+        
+        produto_id = cursor.lastrowid
+        movimentacoes = []
+        
+        if quantidade > 0:
+            cursor.execute("""
+                INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao, local_id)
+                SELECT id, 'ENTRADA', ?, ?, 'Estoque inicial', COALESCE(localizacao_id, ?) FROM produtos WHERE id = ?
+            """, (quantidade, data_atual, self.SEM_LOCALIZACAO, produto_id))
+            movimentacoes.append((produto_id, 'ENTRADA', quantidade, cursor.lastrowid))
+        
+        self._confirmar(conn, movimentacoes, produto_alterado=(produto_id, {}))
+        conn.close()
+        
+        return produto_id
+    
+    def listar_produtos(self, categoria: Optional[str] = None) -> List[Tuple]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        if categoria:
+            cursor.execute("""
+                SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras
+                FROM vw_produtos WHERE categoria = ?
+                ORDER BY nome
+            """, (categoria,))
+        else:
+            cursor.execute("""
+                SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras
+                FROM vw_produtos ORDER BY nome
+            """)
+        
+        produtos = cursor.fetchall()
+        conn.close()
+        
+        return produtos
+    
+    @staticmethod
+    def _filtro_produtos(categoria: Optional[str], localizacao: Optional[str],
+                         busca: Optional[str]) -> Tuple[str, tuple]:
+        """WHERE de vw_produtos para os filtros informados; busca é parte do nome ou o código de barras"""
+        condicoes = []
+        parametros = ()
+        if categoria:
+            condicoes.append("categoria = ?")
+            parametros += (categoria,)
+        if localizacao:
+            condicoes.append("localizacao = ?")
+            parametros += (localizacao,)
+        if busca:
+            condicoes.append("(nome LIKE ? OR codigo_barras = ?)")
+            parametros += (f"%{busca.upper()}%", busca)
+        return (f"WHERE {' AND '.join(condicoes)}" if condicoes else ""), parametros
+    
+    def contar_produtos(self, categoria: Optional[str] = None, localizacao: Optional[str] = None,
+                        busca: Optional[str] = None) -> int:
+        filtro, parametros = self._filtro_produtos(categoria, localizacao, busca)
+        conn = self.conectar()
+        total = conn.execute(f"SELECT COUNT(*) FROM vw_produtos {filtro}", parametros).fetchone()[0]
+        conn.close()
+        return total
+    
+    def iter_produtos(self, categoria: Optional[str] = None, lote: int = 500, localizacao: Optional[str] = None,
+                      busca: Optional[str] = None) -> Iterator[Produto]:
+        """Como listar_produtos, mas lendo do cursor em lotes de `lote` linhas"""
+        filtro, parametros = self._filtro_produtos(categoria, localizacao, busca)
+        conn = self.conectar()
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute(f"""
+                SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras
+                FROM vw_produtos {filtro}
+                ORDER BY nome
+            """, parametros)
+            
+            while True:
+                linhas = cursor.fetchmany(lote)
+                if not linhas:
+                    break
+                yield from map(Produto._make, linhas)
+        finally:
+            conn.close()
+    
+    def buscar_produto(self, produto_id: int) -> Optional[Tuple]:
+        versao = self.cache.validar()
+        em_cache = self.cache.obter(produto_id)
+        if em_cache is not None:
+            return em_cache.como_tupla()
+        
+        produto = self._ler_produto(produto_id)
+        if produto:
+            self.cache.guardar(produto, versao)
+        
+        return produto
+    
+    def _ler_produto(self, produto_id: int) -> Optional[Tuple]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras, data_cadastro
+            FROM vw_produtos WHERE id = ?
+        """, (produto_id,))
+        
+        produto = cursor.fetchone()
+        conn.close()
+        
+        return produto
+    
+    def buscar_produto_por_nome(self, termo: str, limite: Optional[int] = None) -> List[Tuple]:
+        """Busca produtos por nome ou código de barras"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        query = """
+            SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras
+            FROM vw_produtos 
+            WHERE nome LIKE ? OR codigo_barras LIKE ?
+            ORDER BY nome
+        """
+        params = [f"%{termo}%", f"%{termo}%"]
+        
+        if limite:
+            query += " LIMIT ?"
+            params.append(limite)
+        
+        cursor.execute(query, params)
+        
+        produtos = cursor.fetchall()
+        conn.close()
+        
+        return produtos
+    
+    def iniciar_indice_busca(self) -> 'IndiceBusca':
+        """(Re)constrói o índice de busca em segundo plano e o mantém nas escritas"""
+        if self.indice is None:
+            self.indice = IndiceBusca(self)
+            self.adicionar_ouvinte(self.indice.ao_alterar)
+        threading.Thread(target=self.indice.construir, daemon=True).start()
+        return self.indice
+    
+    def buscar_produtos_prefixo(self, termo: str, limite: int = 200) -> List[Tuple]:
+        """Busca enquanto o usuário digita, pelo índice em memória (LIKE até ele ficar pronto)"""
+        if self.indice is None or not self.indice.pronto:
+            return self.buscar_produto_por_nome(termo, limite)
+        
+        ids = self.indice.buscar(termo, limite)
+        if not ids:
+            return []
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras
+            FROM vw_produtos WHERE id IN ({', '.join('?' * len(ids))})
+            ORDER BY nome
+        """, ids)
+        
+        produtos = cursor.fetchall()
+        conn.close()
+        
+        return produtos
+    
+    def buscar_produto_por_codigo_barras(self, codigo_barras: str) -> Optional[Tuple]:
+        """Busca exata pelo código de barras, usada pelos leitores"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, nome, descricao, categoria, quantidade, localizacao, codigo_barras, data_cadastro
+            FROM vw_produtos WHERE codigo_barras = ?
+        """, (codigo_barras,))
+        
+        produto = cursor.fetchone()
+        conn.close()
+        
+        return produto
+    
+    @staticmethod
+    def _validar_limites(estoque_minimo: Optional[int], ponto_pedido: Optional[int]):
+        for limite in (estoque_minimo, ponto_pedido):
+            if limite is not None and limite < 0:
+                raise ValueError("Estoque mínimo e ponto de pedido não podem ser negativos")
+        if estoque_minimo is not None and ponto_pedido is not None and ponto_pedido < estoque_minimo:
+            raise ValueError("O ponto de pedido não pode ser menor que o estoque mínimo")
+    
+    def limites_estoque(self, produto_id: int) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """(estoque_minimo, ponto_pedido) próprios do produto; None onde vale o padrão"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT estoque_minimo, ponto_pedido FROM produtos WHERE id = ?", (produto_id,))
+        limites = cursor.fetchone()
+        conn.close()
+        
+        return limites
+    
+    def atualizar_produto(self, produto_id: int, **kwargs):
+        """Altera o cadastro; os campos que mudaram vão para a auditoria na mesma transação"""
+        campos_permitidos = ['nome', 'descricao', 'categoria', 'localizacao', 'codigo_barras',
+                             'estoque_minimo', 'ponto_pedido']
+        campos = []
+        valores = []
+        alterados = {}
+        diferencas = {}
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        # Com o lock de escrita desde a leitura, o diff é exatamente o que o UPDATE muda
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            SELECT p.nome, p.descricao, c.nome, l.nome, p.codigo_barras, p.estoque_minimo, p.ponto_pedido,
+                   COALESCE(p.localizacao_id, ?)
+            FROM produtos p
+            LEFT JOIN categorias c ON c.id = p.categoria_id
+            LEFT JOIN localizacoes l ON l.id = p.localizacao_id
+            WHERE p.id = ?
+        """, (self.SEM_LOCALIZACAO, produto_id))
+        linha = cursor.fetchone()
+        if linha is None:
+            conn.rollback()
+            conn.close()
+            return False
+        anteriores = dict(zip(campos_permitidos, linha))
+        local_anterior = linha[7]
+        
+        limites = {campo: kwargs.get(campo, anteriores[campo]) for campo in ('estoque_minimo', 'ponto_pedido')}
+        try:
+            self._validar_limites(limites['estoque_minimo'], limites['ponto_pedido'])
+        except ValueError:
+            conn.rollback()
+            conn.close()
+            raise
+        
+        for campo, valor in kwargs.items():
+            if campo in self.DICIONARIOS:
+                campos.append(f"{campo}_id = ?")
+                valores.append(self._id_dicionario(cursor, campo, valor))
+            elif campo in campos_permitidos:
+                campos.append(f"{campo} = ?")
+                valores.append(valor)
+            else:
+                continue
+            alterados[campo] = valor
+            # Vazio e NULL são o mesmo valor; 0 não
+            antes = "" if anteriores[campo] is None else anteriores[campo]
+            depois = "" if valor is None else valor
+            if antes != depois:
+                diferencas[campo] = [antes, depois]
+        
+        if not campos:
+            conn.rollback()
+            conn.close()
+            return False
+        
+        valores.append(produto_id)
+        
+        query = f"UPDATE produtos SET {', '.join(campos)} WHERE id = ?"
+        cursor.execute(query, valores)
+        linhas_afetadas = cursor.rowcount
+        
+        if diferencas:
+            cursor.execute(
+                "INSERT INTO auditoria_produtos (produto_id, data, usuario, alteracoes) VALUES (?, ?, ?, ?)",
+                (produto_id, int(time.time()), self.usuario,
+                 json.dumps(diferencas, ensure_ascii=False, separators=(',', ':')))
+            )
+        
+        # Mudar a localização do produto leva junto o estoque que estava na antiga
+        movimentacoes = []
+        if 'localizacao' in diferencas:
+            local_novo = self._id_local(cursor, kwargs['localizacao'], criar=True)
+            cursor.execute("SELECT quantidade FROM estoque_local WHERE produto_id = ? AND local_id = ?",
+                           (produto_id, local_anterior))
+            linha = cursor.fetchone()
+            if local_novo != local_anterior and linha and linha[0] > 0:
+                movimentacoes = self._mover_estoque(cursor, produto_id, local_anterior, local_novo, linha[0],
+                                                    "Mudança de localização", int(time.time()))
+        
+        self._confirmar(conn, movimentacoes, produto_alterado=(produto_id, alterados))
+        conn.close()
+        
+        return linhas_afetadas > 0
+    
+    def historico_produto(self, produto_id: int, limite: Optional[int] = None) -> List[Tuple]:
+        """(data, usuario, {campo: [antes, depois]}) das edições do produto, da mais recente à mais antiga"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT DATETIME(data, 'unixepoch', 'localtime'), usuario, alteracoes
+            FROM auditoria_produtos
+            WHERE produto_id = ?
+            ORDER BY data DESC, id DESC
+            LIMIT ?
+        """, (produto_id, -1 if limite is None else limite))
+        
+        historico = [(data, usuario, json.loads(alteracoes)) for data, usuario, alteracoes in cursor]
+        conn.close()
+        
+        return historico
+    
+    def alteracoes_cadastro(self, data_inicio: str, data_fim: Optional[str] = None) -> List[Tuple]:
+        """(data, produto_id, nome, usuario, alteracoes) das edições de cadastro no período"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        query = """
+            SELECT DATETIME(a.data, 'unixepoch', 'localtime'), a.produto_id, COALESCE(p.nome, ''),
+                   a.usuario, a.alteracoes
+            FROM auditoria_produtos a
+            LEFT JOIN produtos p ON p.id = a.produto_id
+            WHERE a.data >= ?
+        """
+        params = [self.inicio_do_dia(data_inicio)]
+        if data_fim:
+            query += " AND a.data < ?"
+            params.append(self.fim_do_dia(data_fim))
+        cursor.execute(query + " ORDER BY a.data, a.id", params)
+        
+        alteracoes = [linha[:4] + (json.loads(linha[4]),) for linha in cursor]
+        conn.close()
+        
+        return alteracoes
+    
+    def _aplicar_movimentacao(self, cursor: sqlite3.Cursor, produto_id: int, tipo: str,
+                              quantidade: int, observacao: str, data: int,
+                              local: Optional[str] = None) -> Optional[int]:
+        """Atualiza o estoque e grava a movimentação no cursor; retorna o id, ou None se recusada"""
+        local_id = None
+        if local:
+            local_id = self._id_local(cursor, local, criar=tipo == 'ENTRADA')
+            if local_id is None:
+                return None
+        
+        if tipo == 'ENTRADA':
+            cursor.execute("UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?",
+                           (quantidade, produto_id))
+        elif local_id is None:
+            cursor.execute("""
+                UPDATE produtos SET quantidade = quantidade - ?
+                WHERE id = ? AND quantidade >= ?
+                  AND (SELECT SUM(e.quantidade) FROM estoque_local e
+                       WHERE e.produto_id = produtos.id AND e.quantidade > 0) >= ?
+            """, (quantidade, produto_id, quantidade, quantidade))
+        else:
+            cursor.execute("""
+                UPDATE produtos SET quantidade = quantidade - ?
+                WHERE id = ? AND quantidade >= ?
+                  AND (SELECT e.quantidade FROM estoque_local e
+                       WHERE e.produto_id = produtos.id AND e.local_id = ?) >= ?
+            """, (quantidade, produto_id, quantidade, local_id, quantidade))
+        
+        if cursor.rowcount == 0:
+            return None
+        
+        if tipo == 'SAIDA' and local_id is None:
+            self._reunir_estoque(cursor, produto_id, quantidade, data)
+        
+        cursor.execute("""
+            INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao, local_id)
+            SELECT id, ?, ?, ?, ?, COALESCE(?, localizacao_id, ?) FROM produtos WHERE id = ?
+        """, (tipo, quantidade, data, observacao, local_id, self.SEM_LOCALIZACAO, produto_id))
+        
+        return cursor.lastrowid
+    
+    def _reunir_estoque(self, cursor: sqlite3.Cursor, produto_id: int, quantidade: int, data: int):
+        """Transfere para a localização do produto o que falta ali para uma saída, maiores sobras primeiro"""
+        # O cursor já retém o lock de escrita e o saldo somado das localizações já foi conferido
+        cursor.execute("SELECT COALESCE(localizacao_id, ?) FROM produtos WHERE id = ?",
+                       (self.SEM_LOCALIZACAO, produto_id))
+        destino_id = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT local_id, quantidade FROM estoque_local
+            WHERE produto_id = ? AND quantidade > 0
+            ORDER BY local_id = ? DESC, quantidade DESC, local_id
+        """, (produto_id, destino_id))
+        
+        falta = quantidade
+        for local_id, saldo in cursor.fetchall():
+            if falta <= 0:
+                break
+            if local_id != destino_id:
+                self._mover_estoque(cursor, produto_id, local_id, destino_id, min(saldo, falta),
+                                    "Reunido para saída sem localização", data)
+            falta -= saldo
+    
+    def _mover_estoque(self, cursor: sqlite3.Cursor, produto_id: int, origem_id: int, destino_id: int,
+                       quantidade: int, observacao: str, data: int) -> List[Tuple]:
+        """Grava as duas pernas de uma transferência no cursor; lista vazia se a origem não tem o saldo"""
+        # O cursor já retém o lock de escrita; o retorno está no formato de _confirmar
+        cursor.execute("SELECT quantidade FROM estoque_local WHERE produto_id = ? AND local_id = ?",
+                       (produto_id, origem_id))
+        linha = cursor.fetchone()
+        if not linha or linha[0] < quantidade:
+            return []
+        
+        movimentacoes = []
+        for local_id, sinal in ((origem_id, -1), (destino_id, 1)):
+            cursor.execute("""
+                INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao, local_id)
+                VALUES (?, 'TRANSFERENCIA', ?, ?, ?, ?)
+            """, (produto_id, sinal * quantidade, data, observacao, local_id))
+            movimentacoes.append((produto_id, 'TRANSFERENCIA', sinal * quantidade, cursor.lastrowid))
+        
+        return movimentacoes
+    
+    def transferir(self, produto_id: int, origem: str, destino: str, quantidade: int,
+                   observacao: str = "") -> bool:
+        """Move estoque entre duas localizações (vazia é sem localização) em uma transação; False se recusada"""
+        if quantidade <= 0:
+            return False
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("BEGIN IMMEDIATE")
+        origem_id = self._id_local(cursor, (origem or "").upper())
+        destino_id = self._id_local(cursor, (destino or "").upper(), criar=True)
+        movimentacoes = []
+        if origem_id is not None and origem_id != destino_id:
+            movimentacoes = self._mover_estoque(cursor, produto_id, origem_id, destino_id, quantidade,
+                                                observacao, int(time.time()))
+        
+        if movimentacoes:
+            self._confirmar(conn, movimentacoes)
+        else:
+            conn.rollback()
+        conn.close()
+        
+        return bool(movimentacoes)
+    
+    def locais_do_produto(self, produto_id: int) -> List[Tuple[str, int]]:
+        """(localizacao, quantidade) das localizações com saldo do produto"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT COALESCE(l.nome, ''), e.quantidade
+            FROM estoque_local e
+            LEFT JOIN localizacoes l ON l.id = e.local_id
+            WHERE e.produto_id = ? AND e.quantidade <> 0
+            ORDER BY 1
+        """, (produto_id,))
+        
+        locais = cursor.fetchall()
+        conn.close()
+        
+        return locais
+    
+    def _registrar_movimentacao(self, produto_id: int, tipo: str, quantidade: int,
+                                observacao: str, local: Optional[str] = None) -> bool:
+        if local:
+            local = local.upper()
+        if self.fila_movimentacoes is not None:
+            return self.fila_movimentacoes.enfileirar(produto_id, tipo, quantidade, observacao, local).result()
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        data_atual = int(time.time())
+        try:
+            movimentacao_id = self._aplicar_movimentacao(cursor, produto_id, tipo, quantidade, observacao,
+                                                         data_atual, local)
+            self._confirmar(conn, [(produto_id, tipo, quantidade, movimentacao_id)] if movimentacao_id else [])
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return movimentacao_id is not None
+    
+    def registrar_entrada(self, produto_id: int, quantidade: int, 
+                         observacao: str = "", local: Optional[str] = None) -> bool:
+        return self._registrar_movimentacao(produto_id, 'ENTRADA', quantidade, observacao, local)
+    
+    def registrar_saida(self, produto_id: int, quantidade: int, 
+                       observacao: str = "", local: Optional[str] = None) -> bool:
+        return self._registrar_movimentacao(produto_id, 'SAIDA', quantidade, observacao, local)
+    
+    def registrar_movimentacoes_lote(self, itens: List[Tuple], tamanhos_lotes: Optional[List[int]] = None,
+                                     local: Optional[str] = None, atomico: bool = False) -> List[bool]:
+        """Grava (produto_id, tipo, quantidade, observacao) em uma transação, como lote estornável"""
+        if local:
+            local = local.upper()
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        data_atual = int(time.time())
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            ids = [
+                self._aplicar_movimentacao(cursor, produto_id, tipo, quantidade, observacao, data_atual, local)
+                for produto_id, tipo, quantidade, observacao in itens
+            ]
+            
+            # Com `atomico`, basta um item recusado para nada ser gravado
+            if atomico and None in ids:
+                conn.rollback()
+                return [movimentacao_id is not None for movimentacao_id in ids]
+            
+            lotes = []
+            inicio = 0
+            # `tamanhos_lotes` divide os itens, em ordem, em vários lotes
+            for tamanho in tamanhos_lotes or [len(itens)]:
+                gravados = [movimentacao_id for movimentacao_id in ids[inicio:inicio + tamanho] if movimentacao_id]
+                # Uma movimentação sozinha já é o próprio lote
+                if len(gravados) > 1:
+                    lotes.extend((gravados[0], movimentacao_id) for movimentacao_id in gravados)
+                inicio += tamanho
+            if lotes:
+                cursor.executemany("UPDATE movimentacoes SET lote_id = ? WHERE id = ?", lotes)
+            
+            self._confirmar(conn, [
+                (produto_id, tipo, quantidade, movimentacao_id)
+                for (produto_id, tipo, quantidade, _), movimentacao_id in zip(itens, ids) if movimentacao_id
+            ])
+        except Exception:
+            # Sem isto o lock de escrita ficaria retido até a conexão ser coletada
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return [movimentacao_id is not None for movimentacao_id in ids]
+    
+    def estornar_movimentacoes(self, ids: List[int], observacao: str = "") -> List[int]:
+        """Estorna as movimentações em uma transação, todas ou nenhuma; retorna os ids dos estornos"""
+        ids = sorted(set(ids))
+        if not ids:
+            return []
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        data_atual = int(time.time())
+        
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS estornos_pendentes (movimentacao_id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM estornos_pendentes")
+            cursor.executemany("INSERT INTO estornos_pendentes VALUES (?)", [(i,) for i in ids])
+            
+            tipos = ", ".join(f"'{tipo}'" for tipo in self.TIPOS_ESTORNAVEIS)
+            problemas = []
+            
+            cursor.execute(f"""
+                SELECT e.movimentacao_id FROM estornos_pendentes e
+                LEFT JOIN movimentacoes m ON m.id = e.movimentacao_id
+                WHERE m.id IS NULL OR m.tipo NOT IN ({tipos})
+            """)
+            invalidas = [linha[0] for linha in cursor.fetchall()]
+            if invalidas:
+                problemas.append(f"movimentações que não podem ser estornadas: {self._resumo_ids(invalidas)}")
+            
+            cursor.execute("""
+                SELECT m.estorno_de FROM movimentacoes m
+                JOIN estornos_pendentes e ON e.movimentacao_id = m.estorno_de
+            """)
+            estornadas = [linha[0] for linha in cursor.fetchall()]
+            if estornadas:
+                problemas.append(f"movimentações já estornadas: {self._resumo_ids(estornadas)}")
+            
+            if not problemas:
+                # Estornar entradas tira estoque: o saldo final do produto e do local não pode ficar negativo
+                cursor.execute(f"""
+                    SELECT p.id, p.nome FROM (
+                        SELECT m.produto_id, COALESCE(m.local_id, p.localizacao_id, ?) AS local_id,
+                               SUM(CASE m.tipo WHEN 'SAIDA' THEN m.quantidade ELSE -m.quantidade END) AS efeito
+                        FROM estornos_pendentes e
+                        JOIN movimentacoes m ON m.id = e.movimentacao_id
+                        JOIN produtos p ON p.id = m.produto_id
+                        WHERE m.tipo IN ({tipos})
+                        GROUP BY 1, 2
+                    ) d
+                    JOIN produtos p ON p.id = d.produto_id
+                    LEFT JOIN estoque_local l ON l.produto_id = d.produto_id AND l.local_id = d.local_id
+                    GROUP BY p.id
+                    HAVING p.quantidade + SUM(d.efeito) < 0 OR MIN(COALESCE(l.quantidade, 0) + d.efeito) < 0
+                """, (self.SEM_LOCALIZACAO,))
+                sem_estoque = [f"#{produto_id} {nome}" for produto_id, nome in cursor.fetchall()]
+                if sem_estoque:
+                    problemas.append(f"estoque insuficiente para estornar: {self._resumo_ids(sem_estoque)}")
+            
+            if problemas:
+                conn.rollback()
+                conn.close()
+                raise ValueError("Estorno recusado: " + "; ".join(problemas))
+            
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimentacoes")
+            ultimo_id = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO movimentacoes
+                    (produto_id, tipo, quantidade, data_movimentacao, observacao, local_id, estorno_de)
+                SELECT m.produto_id, 'ESTORNO',
+                       CASE m.tipo WHEN 'SAIDA' THEN m.quantidade ELSE -m.quantidade END, ?,
+                       'Estorno #' || m.id || CASE WHEN ? <> '' THEN ' - ' || ? ELSE '' END,
+                       COALESCE(m.local_id, p.localizacao_id, ?), m.id
+                FROM estornos_pendentes e
+                JOIN movimentacoes m ON m.id = e.movimentacao_id
+                JOIN produtos p ON p.id = m.produto_id
+                ORDER BY m.id
+            """, (data_atual, observacao, observacao, self.SEM_LOCALIZACAO))
+            
+            cursor.execute("""
+                UPDATE produtos SET quantidade = quantidade + d.efeito
+                FROM (SELECT produto_id, SUM(quantidade) AS efeito FROM movimentacoes
+                      WHERE id > ? GROUP BY produto_id) d
+                WHERE d.produto_id = produtos.id
+            """, (ultimo_id,))
+            
+            cursor.execute("SELECT produto_id, tipo, quantidade, id FROM movimentacoes WHERE id > ? ORDER BY id",
+                           (ultimo_id,))
+            estornos = cursor.fetchall()
+            cursor.execute("DELETE FROM estornos_pendentes")
+        except sqlite3.Error:
+            conn.rollback()
+            conn.close()
+            raise
+        
+        self._confirmar(conn, estornos)
+        conn.close()
+        
+        return [estorno[3] for estorno in estornos]
+    
+    def estornar_movimentacao(self, movimentacao_id: int, observacao: str = "") -> int:
+        """Estorna uma movimentação; veja estornar_movimentacoes. Retorna o id do estorno"""
+        return self.estornar_movimentacoes([movimentacao_id], observacao)[0]
+    
+    def movimentacoes_do_lote(self, movimentacao_id: int) -> List[int]:
+        """Ids ainda não estornados do lote da movimentação (fora de lote, só ela)"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT m.id
+            FROM (SELECT id, lote_id FROM movimentacoes WHERE id = ?) alvo
+            JOIN movimentacoes m ON m.lote_id = alvo.lote_id OR m.id = alvo.id
+            WHERE m.tipo IN ({', '.join('?' * len(self.TIPOS_ESTORNAVEIS))})
+              AND NOT EXISTS (SELECT 1 FROM movimentacoes e WHERE e.estorno_de = m.id)
+            ORDER BY m.id
+        """, (movimentacao_id, *self.TIPOS_ESTORNAVEIS))
+        pendentes = [linha[0] for linha in cursor.fetchall()]
+        conn.close()
+        
+        return pendentes
+    
+    @staticmethod
+    def _resumo_ids(itens: list, limite: int = 10) -> str:
+        texto = ", ".join(str(item) if isinstance(item, str) else f"#{item}" for item in itens[:limite])
+        return texto + (f" e mais {len(itens) - limite}" if len(itens) > limite else "")
+    
+    def ativar_escrita_em_lote(self, intervalo_ms: int = 20, max_itens: int = 500):
+        """Passa a gravar movimentações por uma fila com commit em grupo"""
+        if self.fila_movimentacoes is None:
+            self.fila_movimentacoes = FilaMovimentacoes(self, intervalo_ms, max_itens)
+    
+    def desativar_escrita_em_lote(self):
+        """Grava o que estiver na fila e volta ao commit por movimentação"""
+        fila = self.fila_movimentacoes
+        if fila is not None:
+            self.fila_movimentacoes = None
+            fila.encerrar()
+    
+    def enfileirar_movimentacao(self, produto_id: int, tipo: str, quantidade: int,
+                                observacao: str = "", local: Optional[str] = None) -> Future:
+        """Agenda uma movimentação; o Future resolve para True/False após o commit"""
+        if self.fila_movimentacoes is None:
+            futuro = Future()
+            futuro.set_result(self._registrar_movimentacao(produto_id, tipo, quantidade, observacao, local))
+            return futuro
+        
+        return self.fila_movimentacoes.enfileirar(produto_id, tipo, quantidade, observacao,
+                                                  local.upper() if local else None)
+    
+    def listar_movimentacoes(self, produto_id: Optional[int] = None, 
+                            data_inicio: Optional[str] = None, 
+                            data_fim: Optional[str] = None) -> List[Tuple]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        # Sem data inicial os arquivos só são lidos se o banco vivo não tiver 500 linhas
+        fonte = self._fonte_movimentacoes(conn, data_inicio) if data_inicio else "movimentacoes"
+        query, params = self._sql_movimentacoes(fonte, produto_id, data_inicio, data_fim)
+        cursor.execute(query + " ORDER BY m.data_movimentacao DESC LIMIT 500", params)
+        movimentacoes = cursor.fetchall()
+        
+        if not data_inicio and len(movimentacoes) < 500:
+            fonte = self._fonte_movimentacoes(conn)
+            if fonte != "movimentacoes":
+                query, params = self._sql_movimentacoes(fonte, produto_id, data_inicio, data_fim)
+                cursor.execute(query + " ORDER BY m.data_movimentacao DESC LIMIT 500", params)
+                movimentacoes = cursor.fetchall()
+        
+        conn.close()
+        
+        return movimentacoes
+    
+    def iter_movimentacoes(self, produto_id: Optional[int] = None,
+                           data_inicio: Optional[str] = None,
+                           data_fim: Optional[str] = None,
+                           lote: int = 500) -> Iterator[Movimentacao]:
+        """Todas as movimentações do filtro, em ordem cronológica, lidas do cursor em lotes de `lote` linhas"""
+        conn = self.conectar()
+        try:
+            cursor = conn.cursor()
+            fonte = self._fonte_movimentacoes(conn, data_inicio or "")
+            query, params = self._sql_movimentacoes(fonte, produto_id, data_inicio, data_fim)
+            cursor.execute(query + " ORDER BY m.data_movimentacao, m.id", params)
+            
+            while True:
+                linhas = cursor.fetchmany(lote)
+                if not linhas:
+                    break
+                yield from map(Movimentacao._make, linhas)
+        finally:
+            conn.close()
+    
+    def contar_movimentacoes(self, produto_id: Optional[int] = None,
+                             data_inicio: Optional[str] = None,
+                             data_fim: Optional[str] = None) -> int:
+        """Quantidade de linhas que iter_movimentacoes produziria com o mesmo filtro"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        fonte = self._fonte_movimentacoes(conn, data_inicio or "")
+        query, params = self._sql_movimentacoes(fonte, produto_id, data_inicio, data_fim)
+        cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
+        total = cursor.fetchone()[0]
+        conn.close()
+        
+        return total
+    
+    def _sql_movimentacoes(self, fonte: str, produto_id: Optional[int],
+                           data_inicio: Optional[str], data_fim: Optional[str]) -> Tuple[str, list]:
+        query = f"""
+            SELECT m.id, p.nome, m.tipo, m.quantidade,
+                   DATETIME(m.data_movimentacao, 'unixepoch', 'localtime'), m.observacao
+            FROM {fonte} m
+            JOIN produtos p ON m.produto_id = p.id
+            WHERE 1=1
+        """
+        params = []
+        
+        if produto_id:
+            query += " AND m.produto_id = ?"
+            params.append(produto_id)
+        
+        if data_inicio:
+            query += " AND m.data_movimentacao >= ?"
+            params.append(self.inicio_do_dia(data_inicio))
+        
+        if data_fim:
+            query += " AND m.data_movimentacao < ?"
+            params.append(self.fim_do_dia(data_fim))
+        
+        return query, params
+    
+    def buscar_movimentacoes(self, ids: List[int]) -> List[Tuple]:
+        """Movimentações pelos ids, no mesmo formato de listar_movimentacoes"""
+        if not ids:
+            return []
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        marcadores = ", ".join("?" * len(ids))
+        cursor.execute(f"""
+            SELECT m.id, p.nome, m.tipo, m.quantidade, m.data_movimentacao, m.observacao
+            FROM vw_movimentacoes m
+            JOIN produtos p ON m.produto_id = p.id
+            WHERE m.id IN ({marcadores})
+            ORDER BY m.data_movimentacao DESC, m.id DESC
+        """, list(ids))
+        
+        movimentacoes = cursor.fetchall()
+        conn.close()
+        
+        return movimentacoes
+    
+    def sessao_relatorio(self, data_inicio: Optional[str] = None):
+        """Leitura consistente para relatórios com várias consultas; veja GerenciadorLeitura.sessao"""
+        if self.leitor is None:
+            self.leitor = GerenciadorLeitura(self.db_name)
+        return self.leitor.sessao(data_inicio)
+    
+    def criar_monitor(self) -> 'MonitorAlteracoes':
+        return MonitorAlteracoes(self.db_name)
+    
+    def produtos_estoque_baixo(self, limite: Optional[int] = None) -> List[Tuple]:
+        """(id, nome, categoria, quantidade, localizacao, estoque_minimo, ponto_pedido) em alerta"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        # Sem `limite` cada produto usa o seu ponto de pedido (índice parcial); com ele, um limite único
+        condicao, parametros = (self.CONDICAO_ESTOQUE_BAIXO, ()) if limite is None else ("quantidade <= ?", (limite,))
+        cursor.execute(f"""
+            SELECT p.id, p.nome, COALESCE(c.nome, ''), p.quantidade, COALESCE(l.nome, ''),
+                   COALESCE(p.estoque_minimo, 0), {self.PONTO_PEDIDO}
+            FROM produtos p
+            LEFT JOIN categorias c ON c.id = p.categoria_id
+            LEFT JOIN localizacoes l ON l.id = p.localizacao_id
+            WHERE {condicao}
+            ORDER BY p.quantidade ASC
+        """, parametros)
+        
+        produtos = cursor.fetchall()
+        conn.close()
+        
+        return produtos
+    
+    def produtos_em_estoque(self) -> List[Tuple]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, nome, categoria, quantidade, localizacao
+            FROM vw_produtos
+            WHERE quantidade > 0
+            ORDER BY nome
+        """)
+        
+        produtos = cursor.fetchall()
+        conn.close()
+        
+        return produtos
+    
+    def _estoque_por_local(self, condicao: str, parametros: tuple, local: Optional[str],
+                           ordem: str) -> List[Tuple]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        if local is not None:
+            local_id = self._id_local(cursor, local.upper())
+            if local_id is None:
+                conn.close()
+                return []
+            condicao += " AND e.local_id = ?"
+            parametros += (local_id,)
+        
+        cursor.execute(f"""
+            SELECT p.id, p.nome, COALESCE(c.nome, ''), e.quantidade, COALESCE(l.nome, '')
+            FROM estoque_local e
+            JOIN produtos p ON p.id = e.produto_id
+            LEFT JOIN categorias c ON c.id = p.categoria_id
+            LEFT JOIN localizacoes l ON l.id = e.local_id
+            WHERE {condicao}
+            ORDER BY {ordem}
+        """, parametros)
+        
+        produtos = cursor.fetchall()
+        conn.close()
+        
+        return produtos
+    
+    def estoque_baixo_por_local(self, limite: Optional[int] = None, local: Optional[str] = None) -> List[Tuple]:
+        """(id, nome, categoria, quantidade, localizacao) de cada saldo baixo por localização"""
+        if limite is None:
+            ponto_pedido = f"COALESCE(p.ponto_pedido, p.estoque_minimo, {self.PONTO_PEDIDO_PADRAO})"
+            return self._estoque_por_local(f"e.quantidade <= {ponto_pedido}", (), local, "e.quantidade, p.nome")
+        return self._estoque_por_local("e.quantidade <= ?", (limite,), local, "e.quantidade, p.nome")
+    
+    def em_estoque_por_local(self, local: Optional[str] = None) -> List[Tuple]:
+        """(id, nome, categoria, quantidade, localizacao) com saldo positivo, por localização"""
+        return self._estoque_por_local("e.quantidade > 0", (), local, "COALESCE(l.nome, ''), p.nome")
+    
+    def resumo_movimentacoes(self, data_inicio: str) -> List[Tuple]:
+        """(id, nome, categoria, entradas, saidas, estoque_atual) dos produtos movimentados desde a data"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT 
+                p.id,
+                p.nome,
+                c.nome,
+                COALESCE(SUM(CASE WHEN m.tipo = 'ENTRADA' THEN m.quantidade
+                                  WHEN m.tipo = 'ESTORNO' AND m.quantidade < 0 THEN m.quantidade
+                                  ELSE 0 END), 0) as total_entradas,
+                COALESCE(SUM(CASE WHEN m.tipo = 'SAIDA' THEN m.quantidade
+                                  WHEN m.tipo = 'ESTORNO' AND m.quantidade > 0 THEN -m.quantidade
+                                  ELSE 0 END), 0) as total_saidas,
+                p.quantidade as estoque_atual
+            FROM produtos p
+            INNER JOIN movimentacoes m ON p.id = m.produto_id
+            LEFT JOIN categorias c ON c.id = p.categoria_id
+            WHERE m.data_movimentacao >= ?
+            GROUP BY p.id
+            ORDER BY p.nome
+        """, (self.inicio_do_dia(data_inicio),))
+        
+        produtos = cursor.fetchall()
+        conn.close()
+        
+        return produtos
+    
+    def relatorio_estoque(self) -> dict:
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM produtos")
+        total_produtos = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT SUM(quantidade) FROM produtos")
+        total_itens = cursor.fetchone()[0] or 0
+        
+        cursor.execute("""
+            SELECT COALESCE(c.nome, ''), COUNT(*), SUM(p.quantidade)
+            FROM produtos p
+            LEFT JOIN categorias c ON c.id = p.categoria_id
+            GROUP BY p.categoria_id
+        """)
+        por_categoria = cursor.fetchall()
+        
+        conn.close()
+        
+        return {
+            'total_produtos': total_produtos,
+            'total_itens': total_itens,
+            'por_categoria': por_categoria
+        }
+    
+    @staticmethod
+    def _proximo_mes(mes: str) -> str:
+        ano, numero = int(mes[:4]), int(mes[5:7])
+        return f"{ano + numero // 12:04d}-{numero % 12 + 1:02d}"
+    
+    def fechar_meses(self) -> int:
+        """Grava o saldo de fechamento dos meses encerrados ainda sem um; retorna quantos foram fechados"""
+        # Um dia de folga para movimentações gravadas com atraso por outra estação
+        limite = (date.today() - timedelta(days=1)).strftime('%Y-%m')
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT MAX(mes) FROM fechamentos")
+        anterior = cursor.fetchone()[0]
+        if anterior is None:
+            cursor.execute("SELECT STRFTIME('%Y-%m', MIN(data_movimentacao), 'unixepoch', 'localtime') "
+                           "FROM movimentacoes")
+            mes = cursor.fetchone()[0]
+            if mes is None:
+                conn.close()
+                return 0
+        else:
+            mes = self._proximo_mes(anterior)
+        
+        fechados = 0
+        while mes < limite:
+            proximo = self._proximo_mes(mes)
+            
+            cursor.execute(
+                "INSERT OR IGNORE INTO fechamentos (mes, data_fechamento) VALUES (?, ?)",
+                (mes, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            # Outra estação pode ter fechado o mesmo mês
+            if cursor.rowcount:
+                cursor.execute(f"""
+                    INSERT INTO saldos_fechamento (mes, produto_id, quantidade)
+                    SELECT ?, produto_id, SUM(quantidade) FROM (
+                        SELECT produto_id, quantidade FROM saldos_fechamento WHERE mes = ?
+                        UNION ALL
+                        SELECT produto_id, {self.SALDO_MOVIMENTACAO} FROM movimentacoes
+                        WHERE data_movimentacao >= ? AND data_movimentacao < ?
+                    )
+                    GROUP BY produto_id
+                    HAVING SUM(quantidade) <> 0
+                """, (mes, anterior, self.inicio_do_dia(f"{mes}-01"), self.inicio_do_dia(f"{proximo}-01")))
+                fechados += 1
+            conn.commit()
+            
+            anterior = mes
+            mes = proximo
+        
+        conn.close()
+        return fechados
+    
+    def estoque_em(self, data: str) -> List[Tuple]:
+        """Estoque de cada produto ao final do dia `data` (AAAA-MM-DD), a partir do último fechamento"""
+        # Só lê: quem grava fecha os meses pendentes antes (fechar_meses)
+        fim = (datetime.strptime(data, '%Y-%m-%d').date() + timedelta(days=1)).strftime('%Y-%m-%d')
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT MAX(mes) FROM fechamentos WHERE mes < ?", (fim[:7],))
+        fechamento = cursor.fetchone()[0]
+        inicio = f"{self._proximo_mes(fechamento)}-01" if fechamento else ""
+        fonte = self._fonte_movimentacoes(conn, inicio)
+        
+        cursor.execute(f"""
+            WITH saldos AS (
+                SELECT produto_id, SUM(quantidade) AS quantidade FROM (
+                    SELECT produto_id, quantidade FROM saldos_fechamento WHERE mes = ?
+                    UNION ALL
+                    SELECT produto_id, {self.SALDO_MOVIMENTACAO} FROM {fonte}
+                    WHERE data_movimentacao >= ? AND data_movimentacao < ?
+                )
+                GROUP BY produto_id
+            )
+            SELECT p.id, p.nome, COALESCE(c.nome, ''), COALESCE(s.quantidade, 0), COALESCE(l.nome, '')
+            FROM produtos p
+            LEFT JOIN saldos s ON s.produto_id = p.id
+            LEFT JOIN categorias c ON c.id = p.categoria_id
+            LEFT JOIN localizacoes l ON l.id = p.localizacao_id
+            WHERE p.data_cadastro < ?
+            ORDER BY p.nome
+        """, (fechamento, self.inicio_do_dia(inicio) if inicio else 0, self.inicio_do_dia(fim),
+              self.inicio_do_dia(fim)))
+        
+        produtos = cursor.fetchall()
+        conn.close()
+        
+        return produtos
+    
+    def _caminho_arquivo(self, arquivo: str) -> str:
+        """Arquivos anuais ficam na mesma pasta do banco"""
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_name)), arquivo)
+    
+    def _fonte_movimentacoes(self, conn: sqlite3.Connection, data_inicio: str = "") -> str:
+        """Anexa os arquivos anuais a partir de `data_inicio`; retorna a fonte a usar no FROM"""
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT ano, arquivo FROM arquivos_movimentacoes WHERE ate > ? ORDER BY ano",
+            (data_inicio or "",)
+        )
+        arquivos = cursor.fetchall()
+        if not arquivos:
+            return "movimentacoes"
+        
+        cursor.execute("PRAGMA database_list")
+        anexados = {linha[1] for linha in cursor.fetchall()}
+        
+        partes = [f"SELECT {self.COLUNAS_MOVIMENTACAO} FROM main.movimentacoes"]
+        for ano, arquivo in arquivos:
+            esquema = f"arquivo_{ano}"
+            if esquema not in anexados:
+                caminho = self._caminho_arquivo(arquivo)
+                # ATTACH criaria um arquivo vazio e a consulta omitiria o ano em silêncio
+                if not os.path.isfile(caminho):
+                    raise FileNotFoundError(f"Arquivo de movimentações de {ano} não encontrado: {caminho}")
+                cursor.execute(f"ATTACH DATABASE ? AS {esquema}", (caminho,))
+            partes.append(f"SELECT {self.COLUNAS_MOVIMENTACAO} FROM {esquema}.movimentacoes")
+        
+        return "(" + " UNION ALL ".join(partes) + ")"
+    
+    @staticmethod
+    def _criar_arquivo_anual(caminho: str):
+        """Cria o arquivo anual, ou converte um do formato antigo com datas em texto"""
+        conn = sqlite3.connect(caminho)
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(movimentacoes)")
+        tipos = {coluna[1]: coluna[2] for coluna in cursor.fetchall()}
+        cursor.execute("BEGIN IMMEDIATE")
+        if tipos.get('data_movimentacao') == 'TEXT':
+            cursor.execute("ALTER TABLE movimentacoes RENAME TO movimentacoes_texto")
+            cursor.execute("DROP INDEX IF EXISTS idx_movimentacoes_data")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS movimentacoes (
+                id INTEGER PRIMARY KEY,
+                produto_id INTEGER NOT NULL,
+                tipo TEXT NOT NULL,
+                quantidade INTEGER NOT NULL,
+                data_movimentacao INTEGER NOT NULL,
+                observacao TEXT
+            )
+        """)
+        
+        if tipos.get('data_movimentacao') == 'TEXT':
+            cursor.execute("""
+                INSERT INTO movimentacoes
+                SELECT id, produto_id, tipo, quantidade,
+                       CAST(STRFTIME('%s', data_movimentacao, 'utc') AS INTEGER), observacao
+                FROM movimentacoes_texto
+            """)
+            cursor.execute("DROP TABLE movimentacoes_texto")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_movimentacoes_data ON movimentacoes(data_movimentacao)")
+        conn.commit()
+        conn.close()
+    
+    def arquivar_movimentacoes(self, meses: int = 24, compactar: bool = True) -> int:
+        """Move para arquivos anuais as movimentações de antes de `meses` atrás; retorna quantas"""
+        if meses < self.MESES_MINIMOS_ARQUIVAMENTO:
+            raise ValueError(f"O horizonte de arquivamento deve ser de pelo menos "
+                             f"{self.MESES_MINIMOS_ARQUIVAMENTO} meses")
+        
+        hoje = date.today()
+        indice_mes = hoje.year * 12 + hoje.month - 1 - meses
+        corte = f"{indice_mes // 12:04d}-{indice_mes % 12 + 1:02d}-01"
+        
+        self.fechar_meses()
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "SELECT STRFTIME('%Y', MIN(data_movimentacao), 'unixepoch', 'localtime') "
+            "FROM movimentacoes WHERE data_movimentacao < ?",
+            (self.inicio_do_dia(corte),)
+        )
+        primeiro_ano = cursor.fetchone()[0]
+        if primeiro_ano is None:
+            conn.close()
+            return 0
+        
+        arquivadas = 0
+        for ano in range(int(primeiro_ano), int(corte[:4]) + 1):
+            ate = min(corte, f"{ano + 1:04d}-01-01")
+            inicio = self.inicio_do_dia(f"{ano:04d}-01-01")
+            fim = self.inicio_do_dia(ate)
+            
+            cursor.execute(
+                "SELECT 1 FROM movimentacoes WHERE data_movimentacao >= ? AND data_movimentacao < ? LIMIT 1",
+                (inicio, fim)
+            )
+            if cursor.fetchone() is None:
+                continue
+            
+            arquivo = f"{Path(self.db_name).stem}_movimentacoes_{ano}.db"
+            self._criar_arquivo_anual(self._caminho_arquivo(arquivo))
+            cursor.execute("ATTACH DATABASE ? AS destino", (self._caminho_arquivo(arquivo),))
+            
+            try:
+                # Primeiro a cópia, confirmada à parte: com WAL o commit entre
+                # bancos anexados não é atômico
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(f"""
+                    INSERT OR IGNORE INTO destino.movimentacoes ({self.COLUNAS_MOVIMENTACAO})
+                    SELECT {self.COLUNAS_MOVIMENTACAO} FROM main.movimentacoes
+                    WHERE data_movimentacao >= ? AND data_movimentacao < ?
+                """, (inicio, fim))
+                conn.commit()
+                
+                # Depois remove do banco vivo só o que já está no arquivo
+                cursor.execute("BEGIN IMMEDIATE")
+                filtro = """
+                    FROM main.movimentacoes
+                    WHERE data_movimentacao >= ? AND data_movimentacao < ?
+                    AND id IN (SELECT id FROM destino.movimentacoes)
+                """
+                cursor.execute(f"""
+                    INSERT INTO saldos_abertura (produto_id, quantidade)
+                    SELECT produto_id, SUM({self.SALDO_MOVIMENTACAO}) {filtro}
+                    GROUP BY produto_id
+                    ON CONFLICT (produto_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+                """, (inicio, fim))
+                cursor.execute(f"""
+                    INSERT INTO saldos_abertura_local (produto_id, local_id, quantidade)
+                    SELECT produto_id, local_id, SUM(quantidade) FROM (
+                        {self._SALDOS_POR_LOCAL.format(sinal="", origem=filtro)}
+                    )
+                    GROUP BY produto_id, local_id
+                    ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+                """, (self.SEM_LOCALIZACAO, inicio, fim))
+                cursor.execute(f"DELETE {filtro}", (inicio, fim))
+                arquivadas += cursor.rowcount
+                cursor.execute("""
+                    INSERT INTO arquivos_movimentacoes (ano, arquivo, ate) VALUES (?, ?, ?)
+                    ON CONFLICT (ano) DO UPDATE SET ate = MAX(ate, excluded.ate)
+                """, (ano, arquivo, ate))
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.execute("DETACH DATABASE destino")
+        
+        if arquivadas and compactar:
+            cursor.execute("VACUUM")
+        
+        conn.close()
+        return arquivadas
+    
+    def abrir_inventario(self, descricao: str = "") -> int:
+        """Inicia um inventário físico; só pode haver um aberto por vez"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT id FROM inventarios WHERE situacao = 'ABERTO'")
+        if cursor.fetchone():
+            conn.rollback()
+            conn.close()
+            raise ValueError("Já existe um inventário aberto")
+        
+        cursor.execute("INSERT INTO inventarios (descricao, data_abertura) VALUES (?, ?)",
+                       (descricao, int(time.time())))
+        inventario_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        
+        return inventario_id
+    
+    def inventario_aberto(self) -> Optional[Tuple]:
+        """(id, descricao, data_abertura, produtos_contados) do inventário em andamento"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT i.id, i.descricao, DATETIME(i.data_abertura, 'unixepoch', 'localtime'),
+                   (SELECT COUNT(*) FROM contagens_inventario c WHERE c.inventario_id = i.id)
+            FROM inventarios i
+            WHERE i.situacao = 'ABERTO'
+        """)
+        inventario = cursor.fetchone()
+        conn.close()
+        
+        return inventario
+    
+    def registrar_contagens(self, inventario_id: int, itens: List[Tuple[int, int]], somar: bool = False):
+        """Grava as contagens (produto_id, quantidade); com `somar`, acrescenta à já contada"""
+        atualizacao = "quantidade + excluded.quantidade" if somar else "excluded.quantidade"
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.executemany(f"""
+            INSERT INTO contagens_inventario (inventario_id, produto_id, quantidade)
+            VALUES (?, ?, ?)
+            ON CONFLICT (inventario_id, produto_id) DO UPDATE SET quantidade = {atualizacao}
+        """, [(inventario_id, produto_id, quantidade) for produto_id, quantidade in itens])
+        
+        conn.commit()
+        conn.close()
+    
+    def contar_codigo_barras(self, inventario_id: int, codigo_barras: str, quantidade: int = 1) -> Optional[Tuple]:
+        """Soma uma leitura do coletor; retorna o produto lido ou None se o código não existe"""
+        produto = self.buscar_produto_por_codigo_barras(codigo_barras)
+        if produto:
+            self.registrar_contagens(inventario_id, [(produto[0], quantidade)], somar=True)
+        return produto
+    
+    def importar_contagens(self, inventario_id: int, arquivo: str) -> Tuple[int, List[str]]:
+        """Importa um CSV de código de barras e quantidade; retorna (contados, não encontrados)"""
+        with open(arquivo, newline='', encoding='utf-8-sig') as f:
+            amostra = f.read(4096)
+            f.seek(0)
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t') if amostra else csv.excel
+            linhas = []
+            for linha in csv.reader(f, dialeto):
+                if len(linha) < 2 or not linha[0].strip():
+                    continue
+                try:
+                    linhas.append((linha[0].strip(), int(linha[1])))
+                except ValueError:
+                    # Cabeçalho ou quantidade inválida
+                    continue
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS leituras_importadas (codigo TEXT, quantidade INTEGER)")
+        cursor.execute("DELETE FROM leituras_importadas")
+        cursor.executemany("INSERT INTO leituras_importadas VALUES (?, ?)", linhas)
+        
+        cursor.execute("""
+            INSERT INTO contagens_inventario (inventario_id, produto_id, quantidade)
+            SELECT ?, p.id, SUM(l.quantidade)
+            FROM leituras_importadas l
+            JOIN produtos p ON p.codigo_barras = l.codigo
+            WHERE 1
+            GROUP BY p.id
+            ON CONFLICT (inventario_id, produto_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+        """, (inventario_id,))
+        contados = cursor.rowcount
+        
+        cursor.execute("""
+            SELECT DISTINCT l.codigo FROM leituras_importadas l
+            WHERE NOT EXISTS (SELECT 1 FROM produtos p WHERE p.codigo_barras = l.codigo)
+            ORDER BY l.codigo
+        """)
+        nao_encontrados = [linha[0] for linha in cursor.fetchall()]
+        
+        cursor.execute("DELETE FROM leituras_importadas")
+        conn.commit()
+        conn.close()
+        
+        return contados, nao_encontrados
+    
+    def diferencas_inventario(self, inventario_id: int, apenas_divergentes: bool = True,
+                              incluir_nao_contados: bool = False) -> List[Tuple]:
+        """(id, nome, localizacao, estoque, contado, diferenca) de cada produto do inventário"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT id, nome, localizacao, estoque, contado, contado - estoque AS diferenca
+            FROM (
+                SELECT p.id, p.nome, COALESCE(l.nome, '') AS localizacao,
+                       COALESCE(c.estoque_sistema, p.quantidade) AS estoque,
+                       COALESCE(c.quantidade, 0) AS contado
+                FROM produtos p
+                LEFT JOIN contagens_inventario c ON c.inventario_id = ? AND c.produto_id = p.id
+                LEFT JOIN localizacoes l ON l.id = p.localizacao_id
+                WHERE c.produto_id IS NOT NULL OR ?
+            )
+            {"WHERE contado <> estoque" if apenas_divergentes else ""}
+            ORDER BY ABS(contado - estoque) DESC, nome
+        """, (inventario_id, incluir_nao_contados))
+        
+        diferencas = cursor.fetchall()
+        conn.close()
+        
+        return diferencas
+    
+    def efetivar_inventario(self, inventario_id: int, zerar_nao_contados: bool = False) -> int:
+        """Lança as diferenças como movimentações AJUSTE e fecha o inventário; retorna quantos ajustes"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        data_atual = int(time.time())
+        
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT situacao FROM inventarios WHERE id = ?", (inventario_id,))
+        inventario = cursor.fetchone()
+        if not inventario or inventario[0] != 'ABERTO':
+            conn.rollback()
+            conn.close()
+            raise ValueError("Inventário não encontrado ou já encerrado")
+        
+        cursor.execute("SELECT COUNT(*) FROM contagens_inventario WHERE inventario_id = ? AND quantidade < 0",
+                       (inventario_id,))
+        if cursor.fetchone()[0]:
+            conn.rollback()
+            conn.close()
+            raise ValueError("Há contagens com quantidade negativa")
+        
+        if zerar_nao_contados:
+            cursor.execute("""
+                INSERT INTO contagens_inventario (inventario_id, produto_id, quantidade)
+                SELECT ?, id, 0 FROM produtos WHERE 1
+                ON CONFLICT (inventario_id, produto_id) DO NOTHING
+            """, (inventario_id,))
+        
+        # Estoque no instante do ajuste: com o lock de escrita nada muda até o commit
+        cursor.execute("""
+            UPDATE contagens_inventario SET estoque_sistema = p.quantidade
+            FROM produtos p
+            WHERE contagens_inventario.inventario_id = ? AND p.id = contagens_inventario.produto_id
+        """, (inventario_id,))
+        # Contagens de produtos excluídos desde então não geram ajuste
+        cursor.execute("DELETE FROM contagens_inventario WHERE inventario_id = ? AND estoque_sistema IS NULL",
+                       (inventario_id,))
+        
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimentacoes")
+        ultimo_id = cursor.fetchone()[0]
+        observacao = f"Inventário #{inventario_id}"
+        cursor.execute("""
+            INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao, local_id)
+            SELECT produto_id, 'AJUSTE', quantidade - estoque_sistema, ?, ?,
+                   (SELECT COALESCE(p.localizacao_id, ?) FROM produtos p
+                    WHERE p.id = contagens_inventario.produto_id)
+            FROM contagens_inventario
+            WHERE inventario_id = ? AND quantidade > estoque_sistema
+            ORDER BY produto_id
+        """, (data_atual, observacao, self.SEM_LOCALIZACAO, inventario_id))
+        
+        # As sobras saem das localizações como em _reunir_estoque, sem deixar saldo negativo
+        cursor.execute("""
+            SELECT c.produto_id, c.estoque_sistema - c.quantidade, COALESCE(p.localizacao_id, ?)
+            FROM contagens_inventario c JOIN produtos p ON p.id = c.produto_id
+            WHERE c.inventario_id = ? AND c.quantidade < c.estoque_sistema
+            ORDER BY c.produto_id
+        """, (self.SEM_LOCALIZACAO, inventario_id))
+        for produto_id, falta, principal_id in cursor.fetchall():
+            cursor.execute("""
+                SELECT local_id, quantidade FROM estoque_local
+                WHERE produto_id = ? AND quantidade > 0
+                ORDER BY local_id = ? DESC, quantidade DESC, local_id
+            """, (produto_id, principal_id))
+            baixas = []
+            for local_id, saldo in cursor.fetchall():
+                if falta <= 0:
+                    break
+                baixas.append((local_id, min(saldo, falta)))
+                falta -= saldo
+            if falta > 0:
+                # estoque_local abaixo do total: o que sobra fica na localização principal
+                baixas.append((principal_id, falta))
+            cursor.executemany("""
+                INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao, local_id)
+                VALUES (?, 'AJUSTE', ?, ?, ?, ?)
+            """, [(produto_id, -quantidade, data_atual, observacao, local_id) for local_id, quantidade in baixas])
+        
+        cursor.execute("""
+            UPDATE produtos SET quantidade = c.quantidade
+            FROM contagens_inventario c
+            WHERE c.inventario_id = ? AND c.produto_id = produtos.id AND c.quantidade <> c.estoque_sistema
+        """, (inventario_id,))
+        
+        cursor.execute("UPDATE inventarios SET situacao = 'EFETIVADO', data_fechamento = ? WHERE id = ?",
+                       (data_atual, inventario_id))
+        
+        cursor.execute(
+            "SELECT produto_id, tipo, quantidade, id FROM movimentacoes WHERE id > ? AND tipo = 'AJUSTE'",
+            (ultimo_id,)
+        )
+        ajustes = cursor.fetchall()
+        
+        self._confirmar(conn, ajustes)
+        conn.close()
+        
+        return len(ajustes)
+    
+    def cancelar_inventario(self, inventario_id: int):
+        """Descarta as contagens de um inventário aberto, sem alterar o estoque"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM contagens_inventario WHERE inventario_id = ?", (inventario_id,))
+        cursor.execute(
+            "UPDATE inventarios SET situacao = 'CANCELADO', data_fechamento = ? WHERE id = ? AND situacao = 'ABERTO'",
+            (int(time.time()), inventario_id)
+        )
+        
+        conn.commit()
+        conn.close()
+    
+    def verificar_consistencia(self, incremental: bool = False, reparar: bool = False) -> dict:
+        """Compara o estoque e estoque_local com o saldo das movimentações (mais o arquivado)"""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        # A leitura e o reparo enxergam o mesmo estado: com o lock de escrita
+        # nenhuma movimentação entra entre a agregação e o UPDATE
+        cursor.execute("BEGIN IMMEDIATE" if reparar else "BEGIN")
+        try:
+            cursor.execute("SELECT MAX(ultima_movimentacao) FROM verificacoes_consistencia")
+            anterior = cursor.fetchone()[0]
+            marca = anterior if incremental else None
+            
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimentacoes")
+            ultima_movimentacao = cursor.fetchone()[0]
+            
+            # Incremental: só os produtos movimentados depois da última verificação sem pendências
+            if marca is None:
+                fonte, filtro, filtro_local, parametros = "movimentacoes", "", "", ()
+                cursor.execute("SELECT COUNT(*) FROM produtos")
+            else:
+                tocados = "SELECT produto_id FROM movimentacoes WHERE id > ?"
+                fonte = f"movimentacoes WHERE produto_id IN ({tocados})"
+                filtro = f"AND p.id IN ({tocados})"
+                filtro_local = f"WHERE produto_id IN ({tocados})"
+                parametros = (marca,)
+                cursor.execute("SELECT COUNT(DISTINCT produto_id) FROM movimentacoes WHERE id > ?", (marca,))
+            verificados = cursor.fetchone()[0]
+            
+            cursor.execute(f"""
+                SELECT p.id, p.nome, p.quantidade, COALESCE(a.quantidade, 0) + COALESCE(s.saldo, 0)
+                FROM produtos p
+                LEFT JOIN saldos_abertura a ON a.produto_id = p.id
+                LEFT JOIN (
+                    SELECT produto_id, SUM({self.SALDO_MOVIMENTACAO}) AS saldo FROM {fonte} GROUP BY produto_id
+                ) s ON s.produto_id = p.id
+                WHERE p.quantidade <> COALESCE(a.quantidade, 0) + COALESCE(s.saldo, 0) {filtro}
+                ORDER BY p.id
+            """, parametros * 2)
+            divergencias = cursor.fetchall()
+            
+            cursor.execute(f"""
+                SELECT d.produto_id, d.local_id, p.nome, COALESCE(l.nome, ''), d.estoque, d.saldo
+                FROM (
+                    SELECT produto_id, local_id, SUM(estoque) AS estoque, SUM(saldo) AS saldo FROM (
+                        SELECT produto_id, local_id, quantidade AS estoque, 0 AS saldo
+                        FROM estoque_local {filtro_local}
+                        UNION ALL
+                        SELECT produto_id, local_id, 0, quantidade FROM (
+                            SELECT produto_id, local_id, quantidade FROM saldos_abertura_local {filtro_local}
+                            UNION ALL
+                            {self._SALDOS_POR_LOCAL.format(sinal="", origem=f"FROM {fonte}")}
+                        )
+                    )
+                    GROUP BY produto_id, local_id
+                    HAVING SUM(estoque) <> SUM(saldo)
+                ) d
+                JOIN produtos p ON p.id = d.produto_id
+                LEFT JOIN localizacoes l ON l.id = d.local_id
+                ORDER BY d.produto_id, d.local_id
+            """, parametros * 2 + (self.SEM_LOCALIZACAO,) + parametros)
+            locais = cursor.fetchall()
+            divergencias_locais = [linha[:1] + linha[2:] for linha in locais]
+            
+            total = len(divergencias) + len(divergencias_locais)
+            if reparar:
+                cursor.executemany("UPDATE produtos SET quantidade = ? WHERE id = ?",
+                                   [(saldo, produto_id) for produto_id, _, _, saldo in divergencias])
+                # estoque_local é refeito a partir das movimentações de cada local
+                cursor.executemany("""
+                    INSERT INTO estoque_local (produto_id, local_id, quantidade) VALUES (?, ?, ?)
+                    ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = excluded.quantidade
+                """, [(produto_id, local_id, saldo) for produto_id, local_id, _, _, _, saldo in locais])
+            else:
+                conn.commit()
+            reparados = total if reparar else 0
+            
+            # A marca d'água só avança sem divergências pendentes: senão a próxima
+            # verificação incremental deixaria de conferir os produtos divergentes
+            cursor.execute("""
+                INSERT INTO verificacoes_consistencia
+                    (data, incremental, ultima_movimentacao, verificados, divergencias, reparados)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (int(time.time()), marca is not None,
+                  ultima_movimentacao if reparados == total else (anterior or 0),
+                  verificados, total, reparados))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            conn.close()
+            raise
+        conn.close()
+        
+        if reparar and total:
+            # Escrita feita fora de _confirmar: o cache é descartado pela mudança de versão
+            self.cache.validar()
+            self._notificar(sorted({d[0] for d in divergencias} | {d[0] for d in locais}), [])
+        
+        # divergencias: (id, nome, estoque, saldo); divergencias_locais: (id, nome, local, estoque, saldo)
+        return {
+            'divergencias': divergencias,
+            'divergencias_locais': divergencias_locais,
+            'verificados': verificados,
+            'reparados': reparados,
+            'pendentes': total - reparados,
+            'incremental': marca is not None,
+            'ultima_movimentacao': ultima_movimentacao,
+        }
+    
+    def validar_backup(self, arquivo: str) -> Tuple[bool, str]:
+        """Verifica versão do schema e integridade de um arquivo de backup"""
+        if not os.path.isfile(arquivo):
+            return False, "Arquivo de backup não encontrado!"
+        
+        if os.path.abspath(arquivo) == os.path.abspath(self.db_name):
+            return False, "O arquivo selecionado é o próprio banco de dados em uso!"
+        
+        try:
+            conn = sqlite3.connect(f"{Path(arquivo).resolve().as_uri()}?mode=ro", uri=True)
+        except sqlite3.Error as e:
+            return False, f"Não foi possível abrir o backup: {e}"
+        
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute("PRAGMA user_version")
+            versao = cursor.fetchone()[0]
+            if versao > self.VERSAO_SCHEMA:
+                return False, f"Backup criado por uma versão mais nova do sistema (schema {versao})."
+            
+            for tabela, colunas_obrigatorias in self.TABELAS_OBRIGATORIAS.items():
+                cursor.execute(f"PRAGMA table_info({tabela})")
+                colunas = {coluna[1] for coluna in cursor.fetchall()}
+                if not colunas:
+                    return False, f"Tabela '{tabela}' não encontrada no backup."
+                faltando = colunas_obrigatorias - colunas
+                if faltando:
+                    return False, f"Tabela '{tabela}' sem as colunas: {', '.join(sorted(faltando))}."
+            
+            cursor.execute("PRAGMA integrity_check")
+            resultado = [linha[0] for linha in cursor.fetchall()]
+            if resultado != ['ok']:
+                return False, "Falha na verificação de integridade:\n" + "\n".join(resultado[:10])
+        except sqlite3.DatabaseError as e:
+            return False, f"Arquivo não é um banco de dados válido: {e}"
+        finally:
+            conn.close()
+        
+        return True, "Backup válido."
+    
+    def modo_journal(self) -> str:
+        conn = self.conectar()
+        modo = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        conn.close()
+        return modo.upper()
+    
+    def definir_modo_journal(self, modo: str) -> str:
+        """Troca o modo de journal do banco (vale para todas as estações) e retorna o modo em vigor"""
+        # WAL exige todas as estações na mesma máquina; com outras conectadas, sqlite3.OperationalError
+        modo = modo.upper()
+        if modo not in self.MODOS_JOURNAL:
+            raise ValueError(f"Modo de journal inválido: {modo} (use {' ou '.join(self.MODOS_JOURNAL)})")
+        
+        # A conexão persistente do cache também impediria sair do WAL
+        self.cache.fechar()
+        conn = self.conectar()
+        try:
+            em_vigor = conn.execute(f"PRAGMA journal_mode={modo}").fetchone()[0]
+        finally:
+            conn.close()
+            self.cache.reabrir()
+        return em_vigor.upper()
+    
+    def copiar_banco(self, arquivo: str):
+        """Backup consistente do banco em uso, incluindo o que ainda está no arquivo -wal"""
+        origem = self.conectar()
+        destino = sqlite3.connect(arquivo)
+        try:
+            origem.backup(destino)
+            # O backup é um arquivo único, sem -wal ao lado, mesmo que o banco use WAL
+            destino.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            destino.close()
+            origem.close()
+    
+    def preparar_restauracao(self, arquivo: str) -> str:
+        """Copia o backup para um arquivo temporário ao lado do banco em uso"""
+        preparado = self.db_name + ".restaurar"
+        if os.path.exists(preparado):
+            os.remove(preparado)
+        
+        origem = sqlite3.connect(f"{Path(arquivo).resolve().as_uri()}?mode=ro", uri=True)
+        destino = sqlite3.connect(preparado)
+        try:
+            origem.backup(destino)
+            destino.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            destino.close()
+            origem.close()
+        
+        with open(preparado, 'rb+') as f:
+            os.fsync(f.fileno())
+        
+        return preparado
+    
+    def efetivar_restauracao(self, preparado: str):
+        """Grava o arquivo preparado sobre o banco em uso pela API de backup, em uma transação"""
+        fila = self.fila_movimentacoes
+        self.desativar_escrita_em_lote()
+        self.cache.fechar()
+        if self.leitor is not None:
+            self.leitor.fechar()
+            self.leitor = None
+        
+        try:
+            origem = sqlite3.connect(f"{Path(preparado).resolve().as_uri()}?mode=ro", uri=True)
+            destino = self.conectar()
+            try:
+                origem.backup(destino)
+            finally:
+                destino.close()
+                origem.close()
+            
+            os.remove(preparado)
+            self.criar_tabelas()
+        finally:
+            self.cache.reabrir()
+            if self.indice is not None:
+                self.iniciar_indice_busca()
+            if fila is not None:
+                self.ativar_escrita_em_lote(fila.intervalo_ms, fila.max_itens)
+
+
+class ConexaoLeitura:
+    """Conexão persistente de uma thread: close() só encerra a transação de leitura, fora de uma sessão"""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self.em_sessao = False
+    
+    def __getattr__(self, nome):
+        return getattr(self._conn, nome)
+    
+    def close(self):
+        if not self.em_sessao:
+            self._conn.rollback()
+
+
+class GerenciadorLeitura(GerenciadorDeposito):
+    """Acesso somente leitura (mode=ro), com uma conexão persistente por thread; não cria tabelas nem grava"""
+    
+    def __init__(self, db_name: str = "deposito.db", max_produtos_cache: int = 1000):
+        self.local = threading.local()
+        self.conexoes = []
+        super().__init__(db_name, max_produtos_cache)
+    
+    def criar_tabelas(self):
+        # O schema é criado/migrado pelo GerenciadorDeposito do escritor
+        pass
+    
+    def conectar(self) -> ConexaoLeitura:
+        conexao = getattr(self.local, 'conexao', None)
+        if conexao is None:
+            # Cada conexão só é usada pela sua thread; fechar() apenas a fecha no final
+            conn = sqlite3.connect(f"{Path(self.db_name).resolve().as_uri()}?mode=ro", uri=True,
+                                   check_same_thread=False)
+            conexao = self.local.conexao = ConexaoLeitura(conn)
+            self.conexoes.append(conn)
+        return conexao
+    
+    def buscar_produto(self, produto_id: int) -> Optional[Tuple]:
+        # O cache acompanha o banco atual, não o instante fixado pela sessão
+        conexao = getattr(self.local, 'conexao', None)
+        if conexao is not None and conexao.em_sessao:
+            return self._ler_produto(produto_id)
+        return super().buscar_produto(produto_id)
+    
+    @contextmanager
+    def sessao(self, data_inicio: Optional[str] = None):
+        """Executa as consultas do bloco, na mesma thread, em uma única transação de leitura"""
+        conn = self.conectar()
+        if conn.em_sessao:
+            # Sessão aninhada: continua na transação já aberta
+            yield self
+            return
+        
+        try:
+            # ATTACH não é permitido dentro da transação: os arquivos anuais a partir de
+            # `data_inicio` ("" para todos) são anexados antes
+            if data_inicio is not None:
+                self._fonte_movimentacoes(conn, data_inicio)
+            conn.execute("BEGIN")
+            # O instante lido só é fixado na primeira leitura da transação
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            conn.em_sessao = True
+            yield self
+        finally:
+            conn.em_sessao = False
+            conn.rollback()
+    
+    sessao_relatorio = sessao
+    
+    def fechar_meses(self) -> int:
+        return 0
+    
+    def fechar(self):
+        for conn in self.conexoes:
+            conn.close()
+        self.conexoes.clear()
+        self.cache.fechar()
+
+
+class FilaMovimentacoes:
+    """Fila write-behind: uma única thread grava as movimentações em lotes, uma transação por lote"""
+    
+    def __init__(self, deposito: GerenciadorDeposito, intervalo_ms: int = 20, max_itens: int = 500):
+        self.deposito = deposito
+        self.intervalo_ms = intervalo_ms
+        self.max_itens = max_itens
+        self.fila = queue.Queue()
+        self.lock = threading.Lock()
+        self.ativa = True
+        
+        self.thread = threading.Thread(target=self._executar, name="FilaMovimentacoes", daemon=True)
+        self.thread.start()
+        atexit.register(self.encerrar)
+    
+    def enfileirar(self, produto_id: int, tipo: str, quantidade: int, observacao: str = "",
+                   local: Optional[str] = None) -> Future:
+        futuro = Future()
+        data_atual = int(time.time())
+        
+        with self.lock:
+            if not self.ativa:
+                raise RuntimeError("Fila de movimentações encerrada")
+            self.fila.put((produto_id, tipo, quantidade, observacao, data_atual, local, futuro))
+        
+        return futuro
+    
+    def encerrar(self):
+        """Grava os itens pendentes e finaliza a thread de escrita"""
+        with self.lock:
+            if not self.ativa:
+                return
+            self.ativa = False
+            self.fila.put(None)
+        
+        self.thread.join()
+        atexit.unregister(self.encerrar)
+    
+    def _executar(self):
+        conn = self.deposito.conectar()
+        intervalo = self.intervalo_ms / 1000
+        encerrando = False
+        
+        while not encerrando:
+            item = self.fila.get()
+            if item is None:
+                break
+            
+            lote = [item]
+            prazo = time.monotonic() + intervalo
+            
+            while len(lote) < self.max_itens:
+                restante = prazo - time.monotonic()
+                try:
+                    item = self.fila.get(timeout=restante) if restante > 0 else self.fila.get_nowait()
+                except queue.Empty:
+                    break
+                
+                if item is None:
+                    encerrando = True
+                    break
+                lote.append(item)
+            
+            self._gravar_lote(conn, lote)
+        
+        conn.close()
+    
+    def _gravar_lote(self, conn: sqlite3.Connection, lote: list):
+        ids = []
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for produto_id, tipo, quantidade, observacao, data, local, _ in lote:
+                ids.append(
+                    self.deposito._aplicar_movimentacao(cursor, produto_id, tipo, quantidade, observacao,
+                                                        data, local)
+                )
+            self.deposito._confirmar(conn, [
+                (produto_id, tipo, quantidade, movimentacao_id)
+                for (produto_id, tipo, quantidade, *_), movimentacao_id in zip(lote, ids) if movimentacao_id
+            ])
+        except Exception as e:
+            # Qualquer erro (inclusive dados inválidos de um chamador) resolve os
+            # Futures do lote em vez de derrubar a thread e deixá-los pendentes
+            revertido = conn.in_transaction
+            if revertido:
+                conn.rollback()
+            # Depois do commit (falha ao atualizar o cache) o lote já está gravado e não pode ser repetido
+            if revertido and not isinstance(e, sqlite3.OperationalError) and len(lote) > 1:
+                # Um item inválido não pode recusar os dos outros chamadores; só erros do
+                # banco em si (travado, disco cheio) recusam o lote inteiro de uma vez
+                for item in lote:
+                    self._gravar_lote(conn, [item])
+                return
+            for *_, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        
+        for (*_, futuro), movimentacao_id in zip(lote, ids):
+            futuro.set_result(movimentacao_id is not None)
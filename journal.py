@@ -0,0 +1,51 @@
+"""Consulta e troca o modo de journal do banco.
+
+Sem opções só mostra o modo atual. --wal faz as leituras longas (sessões
+de relatório, exportações) deixarem de bloquear as gravações, mas exige
+que todas as estações abram o banco na mesma máquina: WAL não funciona
+com o arquivo em compartilhamento de rede. --delete volta ao modo padrão
+do SQLite. O modo fica gravado no arquivo; feche as outras estações antes
+de trocá-lo.
+
+Uso:
+    python journal.py --banco deposito.db [--wal | --delete]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from gerenciador import GerenciadorDeposito
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta e troca o modo de journal do banco")
+    parser.add_argument("--banco", default="deposito.db")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--wal", dest="modo", action="store_const", const="WAL",
+                      help="Leituras longas não bloqueiam as gravações (não use em compartilhamento de rede)")
+    modo.add_argument("--delete", dest="modo", action="store_const", const="DELETE",
+                      help="Volta ao modo padrão do SQLite")
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.banco):
+        parser.error(f"{args.banco} não existe")
+    
+    deposito = GerenciadorDeposito(args.banco)
+    if args.modo is None:
+        print(f"Modo de journal: {deposito.modo_journal()}")
+        return
+    
+    try:
+        em_vigor = deposito.definir_modo_journal(args.modo)
+    except sqlite3.OperationalError as e:
+        print(f"Não foi possível trocar o modo ({e}); feche as outras estações e tente de novo")
+        sys.exit(1)
+    
+    print(f"Modo de journal: {em_vigor}")
+    if em_vigor != args.modo:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""API HTTP/JSON local para os coletores de código de barras.
+
+Uso:
+    python servidor_api.py servir --porta 8080 --banco deposito.db
+    python servidor_api.py carga --url http://127.0.0.1:8080 --conexoes 20 --requisicoes 5000
+
+Rotas:
+    GET  /produtos/<id>
+    GET  /produtos/codigo/<codigo_barras>
+    GET  /produtos?busca=<termo>&limite=<n>
+    GET  /estoque-baixo[?limite=<n>]   (sem limite: ponto de pedido de cada produto)
+    GET  /alertas?desde=<id>&limite=<n>   (alertas de estoque com id > desde)
+    POST /movimentacoes        {"produto_id" | "codigo_barras", "tipo", "quantidade", "observacao"}
+    POST /movimentacoes/lote   {"itens": [...]}
+
+Só usa a biblioteca padrão. As escritas passam por uma única tarefa
+escritora (que agrupa as movimentações pendentes em uma transação) e as
+leituras usam um pool de conexões somente leitura.
+"""
+import argparse
+import asyncio
+import json
+import signal
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from gerenciador import GerenciadorDeposito, GerenciadorLeitura
+
+
+CAMPOS_PRODUTO = ('id', 'nome', 'descricao', 'categoria', 'quantidade', 'localizacao',
+                  'codigo_barras', 'data_cadastro')
+CAMPOS_ESTOQUE_BAIXO = ('id', 'nome', 'categoria', 'quantidade', 'localizacao', 'estoque_minimo', 'ponto_pedido')
+TIPOS_MOVIMENTACAO = ('ENTRADA', 'SAIDA')
+
+TAMANHO_MAXIMO_CORPO = 1024 * 1024
+MAX_ITENS_LOTE = 1000
+MAX_ALERTAS = 1000
+MAX_RESULTADOS_BUSCA = 200
+MAX_MOVIMENTACOES_TRANSACAO = 500
+TEMPO_OCIOSO = 60
+MAXIMO_INTEIRO = 2 ** 63 - 1  # INTEGER do SQLite
+
+MENSAGENS_STATUS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class ErroHTTP(Exception):
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def _produto_para_dict(produto: Optional[Tuple]) -> Optional[dict]:
+    return dict(zip(CAMPOS_PRODUTO, produto)) if produto else None
+
+
+def _inteiro(valor, campo: str, minimo: int = 1) -> int:
+    if isinstance(valor, str):
+        try:
+            valor = int(valor)
+        except ValueError:
+            raise ErroHTTP(400, f"'{campo}' deve ser um número inteiro")
+    # Números com fração (1.7, 1e400) são recusados, não truncados
+    if isinstance(valor, bool) or not isinstance(valor, int):
+        raise ErroHTTP(400, f"'{campo}' deve ser um número inteiro")
+    if valor < minimo:
+        raise ErroHTTP(400, f"'{campo}' deve ser maior ou igual a {minimo}")
+    if valor > MAXIMO_INTEIRO:
+        raise ErroHTTP(400, f"'{campo}' deve ser menor ou igual a {MAXIMO_INTEIRO}")
+    return valor
+
+
+class ServidorDeposito:
+    def __init__(self, db_name: str = "deposito.db", leitores: int = 4):
+        self.deposito = GerenciadorDeposito(db_name)
+        self.leitor = GerenciadorLeitura(db_name, max_produtos_cache=50000)
+        self.pool_leitura = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix="leitura")
+        self.executor_escrita = ThreadPoolExecutor(max_workers=1, thread_name_prefix="escrita")
+        self.fila_escrita = None
+        self.tarefa_escrita = None
+        self.servidor = None
+    
+    async def iniciar(self, host: str, porta: int):
+        self.fila_escrita = asyncio.Queue()
+        self.tarefa_escrita = asyncio.create_task(self._escritor())
+        self.servidor = await asyncio.start_server(self._atender_cliente, host, porta)
+        return self.servidor
+    
+    async def parar(self):
+        if self.servidor is not None:
+            self.servidor.close()
+        
+        # Garante que as movimentações já aceitas cheguem ao disco
+        await self.fila_escrita.join()
+        self.tarefa_escrita.cancel()
+        
+        self.pool_leitura.shutdown(wait=True)
+        self.executor_escrita.shutdown(wait=True)
+        self.leitor.fechar()
+    
+    # ==================== ESCRITA / LEITURA ====================
+    
+    async def _escritor(self):
+        """Única tarefa que grava no banco; junta os pedidos pendentes em uma transação"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            pedidos = [await self.fila_escrita.get()]
+            total = len(pedidos[0][0])
+            while not self.fila_escrita.empty() and total < MAX_MOVIMENTACOES_TRANSACAO:
+                pedido = self.fila_escrita.get_nowait()
+                pedidos.append(pedido)
+                total += len(pedido[0])
+            
+            itens = [item for pedido_itens, _ in pedidos for item in pedido_itens]
+            try:
+                # Cada pedido continua sendo um lote próprio (estornável de uma vez)
+                resultados = await loop.run_in_executor(
+                    self.executor_escrita, self.deposito.registrar_movimentacoes_lote, itens,
+                    [len(pedido_itens) for pedido_itens, _ in pedidos]
+                )
+            except Exception as e:
+                for _, futuro in pedidos:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+            else:
+                inicio = 0
+                for pedido_itens, futuro in pedidos:
+                    fim = inicio + len(pedido_itens)
+                    if not futuro.done():
+                        futuro.set_result(resultados[inicio:fim])
+                    inicio = fim
+            finally:
+                for _ in pedidos:
+                    self.fila_escrita.task_done()
+    
+    async def escrever(self, itens: List[Tuple]) -> List[bool]:
+        futuro = asyncio.get_running_loop().create_future()
+        await self.fila_escrita.put((itens, futuro))
+        return await futuro
+    
+    async def ler(self, funcao, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool_leitura, funcao, *args)
+    
+    # ==================== PROTOCOLO HTTP ====================
+    
+    async def _ler_requisicao(self, reader: asyncio.StreamReader):
+        linha = await asyncio.wait_for(reader.readline(), TEMPO_OCIOSO)
+        if not linha:
+            return None
+        
+        try:
+            metodo, alvo, versao = linha.decode('latin-1').split()
+        except ValueError:
+            raise ErroHTTP(400, "Linha de requisição inválida")
+        
+        cabecalhos = {}
+        while True:
+            linha = await asyncio.wait_for(reader.readline(), TEMPO_OCIOSO)
+            if linha in (b"\r\n", b"\n", b""):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(":")
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        
+        tamanho = _inteiro(cabecalhos.get('content-length', 0), 'Content-Length', minimo=0)
+        if tamanho > TAMANHO_MAXIMO_CORPO:
+            raise ErroHTTP(413, "Corpo da requisição muito grande")
+        corpo = await reader.readexactly(tamanho) if tamanho else b""
+        
+        manter_conexao = versao == "HTTP/1.1" and cabecalhos.get('connection', '').lower() != 'close'
+        return metodo.upper(), alvo, corpo, manter_conexao
+    
+    def _responder(self, writer: asyncio.StreamWriter, status: int, dados, manter_conexao: bool):
+        corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        cabecalho = (
+            f"HTTP/1.1 {status} {MENSAGENS_STATUS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            f"Connection: {'keep-alive' if manter_conexao else 'close'}\r\n\r\n"
+        )
+        writer.write(cabecalho.encode('latin-1') + corpo)
+    
+    async def _atender_cliente(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    requisicao = await self._ler_requisicao(reader)
+                except ErroHTTP as e:
+                    self._responder(writer, e.status, {'erro': e.mensagem}, False)
+                    await writer.drain()
+                    break
+                
+                if requisicao is None:
+                    break
+                
+                metodo, alvo, corpo, manter_conexao = requisicao
+                try:
+                    status, dados = await self._rotear(metodo, alvo, corpo)
+                except ErroHTTP as e:
+                    status, dados = e.status, {'erro': e.mensagem}
+                except sqlite3.Error as e:
+                    status, dados = 500, {'erro': f"Erro no banco de dados: {e}"}
+                except Exception as e:
+                    status, dados = 500, {'erro': f"Erro interno: {e}"}
+                
+                self._responder(writer, status, dados, manter_conexao)
+                await writer.drain()
+                
+                if not manter_conexao:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+    
+    # ==================== ROTAS ====================
+    
+    async def _rotear(self, metodo: str, alvo: str, corpo: bytes):
+        url = urlsplit(alvo)
+        partes = [unquote(parte) for parte in url.path.strip("/").split("/") if parte]
+        parametros = {chave: valores[0] for chave, valores in parse_qs(url.query).items()}
+        
+        if metodo == "GET":
+            if partes == ["produtos"]:
+                return await self._buscar_produtos(parametros)
+            if len(partes) == 2 and partes[0] == "produtos":
+                produto = await self.ler(self.leitor.buscar_produto, _inteiro(partes[1], 'id'))
+                return self._produto_ou_404(produto)
+            if len(partes) == 3 and partes[:2] == ["produtos", "codigo"]:
+                produto = await self.ler(self.leitor.buscar_produto_por_codigo_barras, partes[2])
+                return self._produto_ou_404(produto)
+            if partes == ["estoque-baixo"]:
+                limite = parametros.get('limite')
+                if limite is not None:
+                    limite = _inteiro(limite, 'limite', minimo=0)
+                produtos = await self.ler(self.leitor.produtos_estoque_baixo, limite)
+                return 200, [dict(zip(CAMPOS_ESTOQUE_BAIXO, p)) for p in produtos]
+            if partes == ["alertas"]:
+                desde = _inteiro(parametros.get('desde', 0), 'desde', minimo=0)
+                limite = min(_inteiro(parametros.get('limite', MAX_ALERTAS), 'limite'), MAX_ALERTAS)
+                alertas = await self.ler(self.leitor.alertas_desde, desde, limite)
+                return 200, [alerta._asdict() for alerta in alertas]
+        
+        elif metodo == "POST":
+            dados = self._ler_json(corpo)
+            if partes == ["movimentacoes"]:
+                return await self._movimentar(dados)
+            if partes == ["movimentacoes", "lote"]:
+                return await self._movimentar_lote(dados)
+        
+        else:
+            raise ErroHTTP(405, f"Método {metodo} não suportado")
+        
+        raise ErroHTTP(404, "Rota não encontrada")
+    
+    def _produto_ou_404(self, produto: Optional[Tuple]):
+        if not produto:
+            raise ErroHTTP(404, "Produto não encontrado")
+        return 200, _produto_para_dict(produto)
+    
+    def _ler_json(self, corpo: bytes):
+        try:
+            return json.loads(corpo or b"{}")
+        except ValueError:
+            raise ErroHTTP(400, "JSON inválido")
+    
+    async def _buscar_produtos(self, parametros: dict):
+        termo = parametros.get('busca', '').strip()
+        limite = min(_inteiro(parametros.get('limite', MAX_RESULTADOS_BUSCA), 'limite'), MAX_RESULTADOS_BUSCA)
+        produtos = await self.ler(self.leitor.buscar_produto_por_nome, termo, limite)
+        return 200, [_produto_para_dict(p) for p in produtos]
+    
+    async def _validar_item(self, item) -> Tuple:
+        if not isinstance(item, dict):
+            raise ErroHTTP(400, "Cada movimentação deve ser um objeto JSON")
+        
+        tipo = str(item.get('tipo', '')).upper().replace('Í', 'I')
+        if tipo not in TIPOS_MOVIMENTACAO:
+            raise ErroHTTP(400, "'tipo' deve ser ENTRADA ou SAIDA")
+        
+        quantidade = _inteiro(item.get('quantidade'), 'quantidade')
+        observacao = str(item.get('observacao', '') or '')
+        
+        if item.get('produto_id') is not None:
+            produto_id = _inteiro(item['produto_id'], 'produto_id')
+        elif item.get('codigo_barras'):
+            produto = await self.ler(self.leitor.buscar_produto_por_codigo_barras, str(item['codigo_barras']))
+            if not produto:
+                raise ErroHTTP(404, f"Código de barras não cadastrado: {item['codigo_barras']}")
+            produto_id = produto[0]
+        else:
+            raise ErroHTTP(400, "Informe 'produto_id' ou 'codigo_barras'")
+        
+        return produto_id, tipo, quantidade, observacao
+    
+    async def _movimentar(self, dados):
+        item = await self._validar_item(dados)
+        sucesso, = await self.escrever([item])
+        
+        if not sucesso:
+            raise ErroHTTP(409, "Produto inexistente ou quantidade insuficiente em estoque")
+        return 200, {'sucesso': True, 'produto_id': item[0]}
+    
+    async def _movimentar_lote(self, dados):
+        itens = dados.get('itens') if isinstance(dados, dict) else None
+        if not isinstance(itens, list) or not itens:
+            raise ErroHTTP(400, "Informe a lista 'itens'")
+        if len(itens) > MAX_ITENS_LOTE:
+            raise ErroHTTP(413, f"Máximo de {MAX_ITENS_LOTE} itens por lote")
+        
+        validados = [await self._validar_item(item) for item in itens]
+        resultados = await self.escrever(validados)
+        
+        return 200, {
+            'sucesso': all(resultados),
+            'resultados': [
+                {'produto_id': item[0], 'sucesso': sucesso}
+                for item, sucesso in zip(validados, resultados)
+            ],
+        }
+
+
+# ==================== CLIENTE DE CARGA ====================
+
+async def _requisitar(reader, writer, host: str, metodo: str, caminho: str,
+                      corpo: Optional[dict]) -> Tuple[int, bytes]:
+    dados = json.dumps(corpo).encode('utf-8') if corpo is not None else b""
+    writer.write(
+        f"{metodo} {caminho} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(dados)}\r\n\r\n".encode('latin-1') + dados
+    )
+    await writer.drain()
+    
+    status = int((await reader.readline()).split()[1])
+    tamanho = 0
+    while True:
+        linha = await reader.readline()
+        if linha in (b"\r\n", b""):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(":")
+        if nome.strip().lower() == 'content-length':
+            tamanho = int(valor)
+    
+    return status, await reader.readexactly(tamanho)
+
+
+async def _cliente_carga(host: str, porta: int, operacoes: list, quantidade: int,
+                         latencias: list, status: dict):
+    reader, writer = await asyncio.open_connection(host, porta)
+    try:
+        for i in range(quantidade):
+            metodo, caminho, corpo = operacoes[i % len(operacoes)]
+            inicio = time.perf_counter()
+            codigo, _ = await _requisitar(reader, writer, host, metodo, caminho, corpo)
+            latencias.append(time.perf_counter() - inicio)
+            status[codigo] = status.get(codigo, 0) + 1
+    finally:
+        writer.close()
+
+
+async def executar_carga(url: str, conexoes: int, requisicoes: int, escritas: float):
+    """Mede requisições/segundo com conexões keep-alive simultâneas"""
+    destino = urlsplit(url)
+    host, porta = destino.hostname or "127.0.0.1", destino.port or 8080
+    
+    reader, writer = await asyncio.open_connection(host, porta)
+    _, resposta = await _requisitar(reader, writer, host, "GET", f"/produtos?limite={MAX_RESULTADOS_BUSCA}", None)
+    writer.close()
+    
+    produtos = json.loads(resposta)
+    if not produtos:
+        print("Cadastre produtos antes de executar o teste de carga.")
+        return
+    
+    # Entradas e saídas de 1 unidade se alternam, mantendo o estoque final igual
+    operacoes = []
+    passo_escrita = int(1 / escritas) if escritas > 0 else 0
+    for i in range(max(len(produtos), 100)):
+        produto = produtos[i % len(produtos)]
+        if passo_escrita and i % passo_escrita == 0:
+            tipo = 'ENTRADA' if (i // passo_escrita) % 2 == 0 else 'SAIDA'
+            operacoes.append(("POST", "/movimentacoes", {
+                'produto_id': produto['id'], 'tipo': tipo, 'quantidade': 1, 'observacao': 'TESTE DE CARGA'
+            }))
+        elif produto.get('codigo_barras') and i % 3 == 0:
+            operacoes.append(("GET", f"/produtos/codigo/{produto['codigo_barras']}", None))
+        else:
+            operacoes.append(("GET", f"/produtos/{produto['id']}", None))
+    
+    latencias = []
+    status = {}
+    por_conexao = max(1, requisicoes // conexoes)
+    
+    inicio = time.perf_counter()
+    await asyncio.gather(*[
+        _cliente_carga(host, porta, operacoes[i:] + operacoes[:i], por_conexao, latencias, status)
+        for i in range(conexoes)
+    ])
+    duracao = time.perf_counter() - inicio
+    
+    latencias.sort()
+    
+    def percentil(p):
+        return latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000
+    
+    print(f"Requisições: {len(latencias)} em {duracao:.2f}s ({conexoes} conexões)")
+    print(f"Vazão: {len(latencias) / duracao:.0f} req/s")
+    print(f"Latência p50: {percentil(0.50):.2f} ms | p95: {percentil(0.95):.2f} ms | p99: {percentil(0.99):.2f} ms")
+    print(f"Status: {dict(sorted(status.items()))}")
+
+
+async def servir(host: str, porta: int, db_name: str, leitores: int):
+    servidor = ServidorDeposito(db_name, leitores)
+    await servidor.iniciar(host, porta)
+    print(f"API do depósito em http://{host}:{porta} (banco: {db_name})")
+    
+    parada = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, parada.set)
+    except (NotImplementedError, AttributeError):
+        # Windows: apenas Ctrl+C encerra o servidor
+        pass
+    
+    try:
+        await parada.wait()
+    finally:
+        await servidor.parar()
+        print("Servidor encerrado.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP do Sistema de Gerenciamento de Depósito")
+    subparsers = parser.add_subparsers(dest="comando")
+    
+    parser_servir = subparsers.add_parser("servir", help="Inicia o servidor HTTP")
+    parser_servir.add_argument("--host", default="0.0.0.0")
+    parser_servir.add_argument("--porta", type=int, default=8080)
+    parser_servir.add_argument("--banco", default="deposito.db")
+    parser_servir.add_argument("--leitores", type=int, default=4, help="Conexões de leitura no pool")
+    
+    parser_carga = subparsers.add_parser("carga", help="Mede requisições/segundo de um servidor local")
+    parser_carga.add_argument("--url", default="http://127.0.0.1:8080")
+    parser_carga.add_argument("--conexoes", type=int, default=20)
+    parser_carga.add_argument("--requisicoes", type=int, default=5000)
+    parser_carga.add_argument("--escritas", type=float, default=0.0,
+                              help="Fração de requisições que registram movimentações (0 a 1)")
+    
+    args = parser.parse_args()
+    
+    try:
+        if args.comando == "carga":
+            asyncio.run(executar_carga(args.url, args.conexoes, args.requisicoes, args.escritas))
+        elif args.comando == "servir":
+            asyncio.run(servir(args.host, args.porta, args.banco, args.leitores))
+        else:
+            parser.print_help()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Os módulos ficam na raiz do repositório, sem pacote instalável
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gerenciador import GerenciadorDeposito  # noqa: E402
+
+
+@pytest.fixture
+def deposito(tmp_path):
+    deposito = GerenciadorDeposito(str(tmp_path / "deposito.db"))
+    yield deposito
+    deposito.cache.fechar()
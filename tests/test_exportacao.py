@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+import pytest
+
+from exportacao import gravar_xlsx_completo
+from gerenciador import GerenciadorLeitura
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+def _linhas_do_razao(caminho) -> int:
+    # Título e cabeçalho ocupam as duas primeiras linhas
+    return sum(1 for _ in openpyxl.load_workbook(caminho)["Movimentacoes"].iter_rows()) - 2
+
+
+def test_exportacao_completa_filtra_o_razao_pelo_periodo(deposito, tmp_path):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 10)
+    assert deposito.registrar_saida(produto_id, 3)
+    hoje = date.today()
+    leitor = GerenciadorLeitura(deposito.db_name)
+    
+    try:
+        gravar_xlsx_completo(leitor, str(tmp_path / "hoje.xlsx"), lambda fracao: None,
+                             {'data_inicio': hoje.isoformat(), 'data_fim': hoje.isoformat()})
+        ontem = (hoje - timedelta(days=1)).isoformat()
+        gravar_xlsx_completo(leitor, str(tmp_path / "ontem.xlsx"), lambda fracao: None,
+                             {'data_inicio': ontem, 'data_fim': ontem})
+    finally:
+        leitor.fechar()
+    
+    assert _linhas_do_razao(tmp_path / "hoje.xlsx") == 2
+    assert _linhas_do_razao(tmp_path / "ontem.xlsx") == 0
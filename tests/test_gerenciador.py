@@ -0,0 +1,232 @@
+import sqlite3
+import time
+from datetime import date
+
+import pytest
+
+from gerenciador import GerenciadorDeposito
+
+
+def test_saida_sem_local_completa_com_as_demais_localizacoes(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 25, localizacao="A1")
+    assert deposito.registrar_entrada(produto_id, 10, local="B9")
+    
+    assert deposito.registrar_saida(produto_id, 30)
+    
+    assert deposito.buscar_produto(produto_id)[4] == 5
+    assert deposito.locais_do_produto(produto_id) == [("B9", 5)]
+    assert deposito.verificar_consistencia()['divergencias'] == []
+
+
+def test_saida_sem_local_recusa_alem_do_total(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 25, localizacao="A1")
+    assert deposito.registrar_entrada(produto_id, 10, local="B9")
+    
+    assert not deposito.registrar_saida(produto_id, 36)
+    
+    assert deposito.buscar_produto(produto_id)[4] == 35
+    assert deposito.locais_do_produto(produto_id) == [("A1", 25), ("B9", 10)]
+
+
+def test_saida_com_local_usa_so_o_saldo_do_local(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 25, localizacao="A1")
+    assert deposito.registrar_entrada(produto_id, 10, local="B9")
+    
+    assert not deposito.registrar_saida(produto_id, 11, local="B9")
+    assert deposito.registrar_saida(produto_id, 10, local="b9")
+    
+    assert deposito.locais_do_produto(produto_id) == [("A1", 25)]
+
+
+def test_reparo_refaz_estoque_local_pelas_movimentacoes(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 25, localizacao="A1")
+    assert deposito.registrar_entrada(produto_id, 10, local="B9")
+    conn = deposito.conectar()
+    conn.execute("UPDATE estoque_local SET quantidade = 99 WHERE produto_id = ?", (produto_id,))
+    conn.commit()
+    conn.close()
+    
+    resultado = deposito.verificar_consistencia()
+    assert resultado['divergencias'] == []
+    assert resultado['divergencias_locais'] == [(produto_id, "PARAFUSO", "A1", 99, 25),
+                                                (produto_id, "PARAFUSO", "B9", 99, 10)]
+    assert resultado['pendentes'] == 2
+    
+    resultado = deposito.verificar_consistencia(reparar=True)
+    assert resultado['reparados'] == 2
+    assert resultado['pendentes'] == 0
+    assert deposito.locais_do_produto(produto_id) == [("A1", 25), ("B9", 10)]
+    assert deposito.verificar_consistencia()['divergencias_locais'] == []
+
+
+def test_marca_dagua_nao_avanca_com_divergencias_pendentes(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 25)
+    assert deposito.verificar_consistencia()['pendentes'] == 0
+    
+    assert deposito.registrar_entrada(produto_id, 5)
+    conn = deposito.conectar()
+    conn.execute("UPDATE produtos SET quantidade = 0 WHERE id = ?", (produto_id,))
+    conn.commit()
+    conn.close()
+    
+    # Sem reparo, as verificações incrementais seguintes continuam conferindo o produto
+    for _ in range(2):
+        resultado = deposito.verificar_consistencia(incremental=True)
+        assert resultado['verificados'] == 1
+        assert resultado['pendentes'] == 1
+    
+    assert deposito.verificar_consistencia(incremental=True, reparar=True)['reparados'] == 1
+    assert deposito.verificar_consistencia(incremental=True)['verificados'] == 0
+
+
+def test_lote_atomico_nao_grava_nada_se_um_item_for_recusado(deposito):
+    primeiro = deposito.adicionar_produto("PARAFUSO", 10)
+    segundo = deposito.adicionar_produto("PORCA", 1)
+    
+    resultados = deposito.registrar_movimentacoes_lote(
+        [(primeiro, 'SAIDA', 5, ""), (segundo, 'SAIDA', 2, "")], atomico=True
+    )
+    
+    assert resultados == [True, False]
+    assert deposito.buscar_produto(primeiro)[4] == 10
+    assert deposito.contar_movimentacoes(primeiro) == 1
+
+
+def test_estorno_recusa_segundo_estorno(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 10, localizacao="A1")
+    assert deposito.registrar_saida(produto_id, 4)
+    saida_id = max(movimentacao[0] for movimentacao in deposito.listar_movimentacoes(produto_id))
+    
+    assert deposito.estornar_movimentacao(saida_id)
+    with pytest.raises(ValueError):
+        deposito.estornar_movimentacao(saida_id)
+    
+    assert deposito.buscar_produto(produto_id)[4] == 10
+    assert deposito.locais_do_produto(produto_id) == [("A1", 10)]
+
+
+def test_migra_banco_da_versao_original(tmp_path):
+    caminho = str(tmp_path / "antigo.db")
+    conn = sqlite3.connect(caminho)
+    conn.executescript("""
+        CREATE TABLE produtos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            descricao TEXT,
+            categoria TEXT,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            localizacao TEXT,
+            codigo_barras TEXT,
+            data_cadastro TEXT NOT NULL
+        );
+        CREATE TABLE movimentacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            data_movimentacao TEXT NOT NULL,
+            observacao TEXT
+        );
+        INSERT INTO produtos VALUES (1, 'PARAFUSO', 'SEXTAVADO', 'FIXADORES', 12, 'A1', '789', '2024-05-01 10:00:00');
+        INSERT INTO movimentacoes VALUES (1, 1, 'ENTRADA', 15, '2024-05-01 10:00:00', 'Estoque inicial');
+        INSERT INTO movimentacoes VALUES (2, 1, 'SAIDA', 3, '2024-05-02 08:30:00', '');
+    """)
+    conn.close()
+    
+    deposito = GerenciadorDeposito(caminho)
+    try:
+        produto = deposito.buscar_produto(1)
+        assert produto[1:6] == ("PARAFUSO", "SEXTAVADO", "FIXADORES", 12, "A1")
+        assert produto[7] == "2024-05-01 10:00:00"
+        assert deposito.locais_do_produto(1) == [("A1", 12)]
+        assert deposito.contar_movimentacoes(1) == 2
+        
+        resultado = deposito.verificar_consistencia()
+        assert resultado['divergencias'] == []
+        assert resultado['divergencias_locais'] == []
+        
+        conn = sqlite3.connect(caminho)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == GerenciadorDeposito.VERSAO_SCHEMA
+        conn.close()
+    finally:
+        deposito.cache.fechar()
+
+
+def test_efetivar_inventario_lanca_ajustes(deposito):
+    contado = deposito.adicionar_produto("PARAFUSO", 10, localizacao="A1")
+    nao_contado = deposito.adicionar_produto("PORCA", 4, localizacao="A2")
+    inventario_id = deposito.abrir_inventario("Balanço")
+    deposito.registrar_contagens(inventario_id, [(contado, 7)])
+    
+    assert deposito.efetivar_inventario(inventario_id) == 1
+    
+    assert deposito.buscar_produto(contado)[4] == 7
+    assert deposito.locais_do_produto(contado) == [("A1", 7)]
+    assert deposito.buscar_produto(nao_contado)[4] == 4
+    assert deposito.verificar_consistencia()['divergencias'] == []
+    with pytest.raises(ValueError):
+        deposito.efetivar_inventario(inventario_id)
+
+
+def test_inventario_baixa_sobras_sem_deixar_local_negativo(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 25, localizacao="A1")
+    assert deposito.registrar_entrada(produto_id, 10, local="B9")
+    inventario_id = deposito.abrir_inventario()
+    deposito.registrar_contagens(inventario_id, [(produto_id, 5)])
+    
+    assert deposito.efetivar_inventario(inventario_id) == 2
+    
+    assert deposito.buscar_produto(produto_id)[4] == 5
+    assert deposito.locais_do_produto(produto_id) == [("B9", 5)]
+    conn = deposito.conectar()
+    assert conn.execute("SELECT COUNT(*) FROM estoque_local WHERE quantidade < 0").fetchone()[0] == 0
+    conn.close()
+    resultado = deposito.verificar_consistencia()
+    assert resultado['divergencias'] == []
+    assert resultado['divergencias_locais'] == []
+    assert deposito.registrar_saida(produto_id, 5, local="B9")
+
+
+def test_lote_com_erro_desfaz_a_transacao_e_libera_o_banco(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 10)
+    
+    with pytest.raises(OverflowError):
+        deposito.registrar_movimentacoes_lote([(produto_id, 'ENTRADA', 5, ""), (produto_id, 'ENTRADA', 2 ** 63, "")])
+    
+    assert deposito.registrar_entrada(produto_id, 1)
+    assert deposito.buscar_produto(produto_id)[4] == 11
+    assert deposito.contar_movimentacoes(produto_id) == 2
+
+
+def test_indice_reindexa_produto_renomeado_com_mudanca_de_localizacao(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO SEXTAVADO", 10, localizacao="A1")
+    indice = deposito.iniciar_indice_busca()
+    for _ in range(100):
+        if indice.pronto:
+            break
+        time.sleep(0.05)
+    assert indice.pronto
+    
+    assert deposito.atualizar_produto(produto_id, nome="ARRUELA LISA", localizacao="B2")
+    
+    assert deposito.locais_do_produto(produto_id) == [("B2", 10)]
+    assert [p[0] for p in deposito.buscar_produtos_prefixo("ARRU")] == [produto_id]
+    assert deposito.buscar_produtos_prefixo("PARAF") == []
+
+
+def test_estoque_em_so_le_e_usa_os_fechamentos_gravados(deposito):
+    produto_id = deposito.adicionar_produto("PARAFUSO", 10)
+    assert deposito.registrar_saida(produto_id, 3)
+    conn = deposito.conectar()
+    conn.execute("UPDATE movimentacoes SET data_movimentacao = data_movimentacao - 90 * 86400")
+    conn.commit()
+    conn.close()
+    hoje = date.today().isoformat()
+    
+    assert [linha[3] for linha in deposito.estoque_em(hoje)] == [7]
+    conn = deposito.conectar()
+    assert conn.execute("SELECT COUNT(*) FROM fechamentos").fetchone()[0] == 0
+    conn.close()
+    
+    assert deposito.fechar_meses() > 0
+    assert [linha[3] for linha in deposito.estoque_em(hoje)] == [7]
@@ -0,0 +1,40 @@
+import asyncio
+
+from servidor_api import ServidorDeposito
+
+
+async def _postar(porta: int, corpo: bytes) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", porta)
+    writer.write(
+        f"POST /movimentacoes HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+        f"Content-Length: {len(corpo)}\r\n\r\n".encode('latin-1') + corpo
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    writer.close()
+    return status
+
+
+def test_api_recusa_quantidades_fora_do_intervalo(tmp_path):
+    servidor = ServidorDeposito(str(tmp_path / "deposito.db"))
+    produto_id = servidor.deposito.adicionar_produto("PARAFUSO", 10)
+    
+    async def cenario():
+        porta = (await servidor.iniciar("127.0.0.1", 0)).sockets[0].getsockname()[1]
+        try:
+            corpos = [b'1e400', b'1.7', str(2 ** 63).encode(), b'"dez"', b'true']
+            invalidos = [
+                await _postar(porta, b'{"produto_id": %d, "tipo": "SAIDA", "quantidade": %s}' % (produto_id, corpo))
+                for corpo in corpos
+            ]
+            valido = await _postar(porta, b'{"produto_id": %d, "tipo": "SAIDA", "quantidade": 3}' % produto_id)
+        finally:
+            await servidor.parar()
+        return invalidos, valido
+    
+    invalidos, valido = asyncio.run(cenario())
+    
+    assert invalidos == [400] * 5
+    assert valido == 200
+    assert servidor.deposito.buscar_produto(produto_id)[4] == 7
+    servidor.deposito.cache.fechar()